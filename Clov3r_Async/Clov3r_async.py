@@ -2,32 +2,56 @@ import asyncio
 import base64
 import configparser
 import datetime
-import html
 import ipaddress
 import json
 import pytz
 import random
 import re
 import io
+import os
+import sys
 import irctokens
-import ssl
-import time
 from typing import Optional
 from collections import deque
 from gentoo_bugs import get_bug_details
-from sed import handle_sed_command
+from sed import handle_sed_command, SED_SEPARATORS
 from weather import WeatherSnag
 from colorfetch import handle_color_command
 from help import get_available_commands
-from title_scrape import Titlescraper
-from google_api import Googlesearch
 from duckduckgo import duck_search, duck_translate
 from reddit_urls import parse_reddit_url
+from line_framer import LineFramer
+from irc_writer import IRCWriter
+from flood_control import OutboundScheduler, PRIORITY_ADMIN, PRIORITY_BULK
+from irc_encoder import LineEncoder
+from irc_preparse import peek_command
+from chathistory import ChatHistory
+from reconnect import ReconnectPolicy
+from event_loop import install_event_loop
+from shared_services import SharedServices
+from lag_monitor import LagMonitor
+from command_registry import CommandRegistry, Command, OUTPUT_QUEUE, OUTPUT_LINE, OUTPUT_PRIVMSG, OUTPUT_NONE
+from channel_joins import ChannelJoins
+from task_supervisor import TaskSupervisor
+from executors import run_blocking, executors
+from rate_limit import RateLimiter, LIMIT_API, LIMIT_CHEAP
+from state_store import open_store
+from persistence import persistence
+from message_log import MessageLog
 
 class IRCBot:
-    def __init__(self, nickname, channels, server, port=6697, use_ssl=True, admin_list=None, nickserv_password=None, channels_features=None, ignore_list_file=None):
+    # Verbs worth a full tokenise; anything else is dropped after peek_command
+    REGISTRATION_COMMANDS = frozenset({"CAP", "AUTHENTICATE", "900", "903", "904", "905", "376", "422", "433", "513", "PING"})
+    HANDLED_COMMANDS = frozenset({"PING", "PONG", "PRIVMSG", "332", "BATCH"})
+
+    def __init__(self, nickname, channels, server, port=6697, use_ssl=True, admin_list=None, nickserv_password=None, channels_features=None, ignore_list_file=None, flood_burst=5, flood_rate=2.0, use_uvloop=False, services=None, data_dir='', features_file='channels_features.json', max_tasks=32, max_tasks_per_user=2, command_timeout=20.0, rate_limiter=None, state_db='', max_reply_lines=5):
         self.nickname = nickname
         self.channels_features = channels_features
+        self.features_file = features_file
+        # State files go in data_dir so several networks can share one process
+        self.data_dir = data_dir
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
         self.channels = channels if isinstance(channels, list) else [channels]
         self.nickserv_password = nickserv_password
         self.server = server
@@ -35,33 +59,55 @@ class IRCBot:
         self.use_ssl = use_ssl
         self.admin_list = set(admin_list) if admin_list else set()
         self.last_messages = {channel: deque(maxlen=200) for channel in channels}
+        # Every message is appended as it arrives, so a crash no longer costs the history
+        self.message_log = MessageLog(self.data_path('history'), 200, persistence.fsync)
         self.mushroom_facts = []
         self.ignore_list = []
         self.quotes = {}
         self.message_queue = {}
         self.last_seen = {}
-        self.last_command_time = {}
+        # With a state_db, last seen, tells and quotes live in SQLite instead of being rewritten as JSON files
+        self.store = open_store(self.data_path(state_db), data_dir) if state_db else None
         self.processed_urls = {}
         self.response_queue = asyncio.Queue()
         self.active_quotes = {}
         self.reader = None
         self.writer = None
+        self.out = None
+        self.outbound = None
+        self.writer_task = None
+        self.disconnect_requested = False
+        self.reconnect = ReconnectPolicy()
+        self.lag = LagMonitor()
+        self.joins = ChannelJoins()
+        self.tasks = TaskSupervisor(max_tasks, max_tasks_per_user, command_timeout)
+        self.rate_limits = rate_limiter or RateLimiter()
+        self.flood_burst = flood_burst
+        self.flood_rate = flood_rate
+        self.use_uvloop = use_uvloop
         self.last_issued_command = None
         self.topic_command = False
-        self.MIN_COMMAND_INTERVAL = 5
         self.lock = asyncio.Lock()
         self.url_regex = re.compile(r'https?://[^\s\x00-\x1F\x7F]+')
-        self.search = Googlesearch()
+        self.services = services or SharedServices()
+        self.search = self.services.search
+        self.encoder = LineEncoder(nickname, max(1, max_reply_lines))
+        self.history = ChatHistory()
+        self.commands = CommandRegistry(self.build_commands(), channels_features)
 
     @classmethod
-    def from_config_file(cls, config_file, features_file='channels_features.json'):
+    def from_config_file(cls, config_file, features_file='channels_features.json', services=None):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        bot_config = config['BotConfig']
+        features_file = bot_config.get('features_file', features_file)
+        # Process wide, with several networks the last config read sets it
+        persistence.load_settings(config_file)
+
         # Load features from the JSON file
         with open(features_file, 'r') as f:
             channels_features = json.load(f)
 
-        config = configparser.ConfigParser()
-        config.read(config_file)
-        bot_config = config['BotConfig']
         admin_list = config.get('AdminConfig', 'admin_list', fallback='').split(',')
         channels = bot_config.get('channels').split(',')
         nickserv_password = bot_config.get('nickserv_password', fallback=None)
@@ -74,30 +120,26 @@ class IRCBot:
             port=int(bot_config.get('port', 6697)),
             use_ssl=bot_config.getboolean('use_ssl', True),
             admin_list=admin_list,
-            nickserv_password=nickserv_password
+            nickserv_password=nickserv_password,
+            flood_burst=bot_config.getint('flood_burst', 5),
+            flood_rate=bot_config.getfloat('flood_rate', 2.0),
+            use_uvloop=bot_config.getboolean('use_uvloop', False),
+            services=services,
+            data_dir=bot_config.get('data_dir', ''),
+            features_file=features_file,
+            max_tasks=bot_config.getint('max_tasks', 32),
+            max_tasks_per_user=bot_config.getint('max_tasks_per_user', 2),
+            command_timeout=bot_config.getfloat('command_timeout', 20.0),
+            rate_limiter=RateLimiter.from_config(config),
+            state_db=bot_config.get('state_db', '').strip(),
+            max_reply_lines=bot_config.getint('max_reply_lines', 5)
         )
 
-    async def handle_channel_features(self, channel, command):
-        # Check if the specified channel has the given feature enabled
-        if channel in self.channels_features and command in self.channels_features[channel]:
-            return True
-        return False
-
-    async def save_last_messages(self, filename="messages.json"):
-        # Convert deque objects to lists for JSON serialization
-        serializable_last_messages = {channel: list(messages) for channel, messages in self.last_messages.items()}
-        
-        # Ensure the function is thread-safe if called concurrently
-        async with self.lock:
-            try:
-                with open(filename, 'w') as file:
-                    json.dump(serializable_last_messages, file, indent=2)
-                print(f"Saved last messages to {filename}")
-            except Exception as e:
-                print(f"Error saving last messages: {e}")
+    def data_path(self, filename):
+        return os.path.join(self.data_dir, filename)
 
     def load_ignore_list(self):
-        file_path = 'ignore_list.txt'
+        file_path = self.data_path('ignore_list.txt')
         try:
             with open(file_path, 'r') as file:
                 self.ignore_list = [line.strip() for line in file.readlines() if line.strip()]
@@ -111,28 +153,22 @@ class IRCBot:
         # Ensure the function is thread-safe if called concurrently
         async with self.lock:
             try:
-                with open(filename, 'r') as file:
-                    # Load messages from the file
-                    loaded_messages = json.load(file)
-                
+                # messages.json is only read on the first start with the log, to carry its history over
+                self.message_log.import_json(self.data_path(filename))
                 # Convert lists back to deque objects and update self.last_messages
-                self.last_messages = {channel: deque(messages, maxlen=200) for channel, messages in loaded_messages.items()}
-                print(f"Loaded last messages from {filename}")
-            except FileNotFoundError:
-                print(f"{filename} not found. Starting with an empty message history.")
+                loaded_messages = self.message_log.replay()
+                self.last_messages.update({channel: deque(messages, maxlen=200) for channel, messages in loaded_messages.items()})
+                print(f"Loaded last messages for {len(loaded_messages)} channels")
             except Exception as e:
                 print(f"Error loading last messages: {e}")
 
     def save_last_seen(self, filename="last_seen.json"):
-        try:
-            with open(filename, "w") as file:
-                json.dump(self.last_seen, file, indent=2)
-        except Exception as e:
-            print(f"Error saving last_seen dictionary: {e}")
+        # Written behind, so a busy channel costs one write per flush rather than one per message
+        persistence.mark(self.data_path(filename), lambda: json.dumps(self.last_seen, indent=2))
 
     def load_last_seen(self, filename="last_seen.json"):
         try:
-            with open(filename, "r") as file:
+            with open(self.data_path(filename), "r") as file:
                 self.last_seen = json.load(file)
                 print("Successfully Loaded last_seen.json")
         except FileNotFoundError:
@@ -148,11 +184,13 @@ class IRCBot:
         except FileNotFoundError:
             print("Mushroom facts file not found.")
 
-    def load_channel_features(self, filename="channels_features.json"):
+    def load_channel_features(self, filename=None):
+        filename = filename or self.features_file
         # Load features from the JSON file
         try:
             with open(filename, 'r') as f:
                 self.channels_features = json.load(f)
+            self.commands.load_features(self.channels_features)
             print("Successfully Loaded Channel Features")
         except FileNotFoundError:
             print(f"{filename} file not found.")
@@ -160,29 +198,20 @@ class IRCBot:
             print(f"Error loading channel features: {e}")
 
     def save_mushroom_facts(self):
-        with open("mushroom_facts.txt", "w") as file:
-            for fact in self.mushroom_facts:
-                file.write(f"{fact}\n")
+        persistence.mark("mushroom_facts.txt", lambda: "".join(f"{fact}\n" for fact in self.mushroom_facts))
 
     def save_message_queue(self, filename="message_queue.json", backup_filename="message_queue_backup.json"):
-        try:
-            # Convert tuple keys to strings for serialization
-            serialized_message_queue = {str(key): value for key, value in self.message_queue.items()}
-            
-            # Save the primary file
-            with open(filename, "w") as file:
-                json.dump(serialized_message_queue, file, indent=2)
-            
-            # Save the backup file
-            with open(backup_filename, "w") as backup_file:
-                json.dump(serialized_message_queue, backup_file, indent=2)
-        
-        except Exception as e:
-            print(f"Error saving message queue: {e}")
+        # Convert tuple keys to strings for serialization
+        def render():
+            return json.dumps({str(key): value for key, value in self.message_queue.items()}, indent=2)
+
+        # Save the primary file and the backup
+        persistence.mark(self.data_path(filename), render)
+        persistence.mark(self.data_path(backup_filename), render)
 
     def load_message_queue(self, filename="message_queue.json"):
         try:
-            with open(filename, "r") as file:
+            with open(self.data_path(filename), "r") as file:
                 serialized_message_queue = json.load(file)
 
                 # Convert string keys back to tuples for deserialization
@@ -191,49 +220,72 @@ class IRCBot:
         except FileNotFoundError:
             print("Message queue file not found.")
 
+    def load_state(self):
+        # The store is read as needed, only the JSON files are held in memory
+        if self.store:
+            return
+        self.load_message_queue()
+        self.load_last_seen()
+        self.load_quotes()
+
+    def save_state(self):
+        if self.store:
+            return
+        self.save_message_queue()
+        self.save_last_seen()
+
     async def connect(self):
         while True:
             try:
-                if self.use_ssl:
-                    ssl_context = ssl.create_default_context()
-                    self.reader, self.writer = await asyncio.open_connection(self.server, self.port, ssl=ssl_context)
-                else:
-                    self.reader, self.writer = await asyncio.open_connection(self.server, self.port)
+                self.reader, self.writer = await self.reconnect.open_connection(self.server, self.port, self.use_ssl)
 
+                self.start_writer()
+                self.history.reset()
                 await self.send('CAP LS 302')
 
                 await self.send(f'USER {self.nickname} 0 * :{self.nickname}')
                 await self.send(f'NICK {self.nickname}')
-                await self.identify_with_sasl()
-                break
+                framer, lines = await self.identify_with_sasl()
+                # Registration has traded data, so a TLS 1.3 session ticket has arrived by now
+                session_reused = self.reconnect.ssl_context.remember(self.writer, self.server)
+                outage = self.reconnect.outage_started is not None
+                self.reconnect.connected(session_reused)
+                if outage:
+                    last = self.reconnect.outages[-1]
+                    self.error_log(f"Reconnected after {last['duration']:.1f}s and {last['attempts']} attempts (TLS session reused: {session_reused})")
+                return framer, lines
             except NameInUseError as e:
                 print(e)
                 self.error_log(e, nick_in_use=True)
-                await asyncio.sleep(270)
+                self.reconnect.lost()
+                await self.disconnect()
+                await self.reconnect.wait()
             except (ConnectionError, OSError):
-                e = "Connection failed. Retrying in 270 seconds..."
+                e = "Connection failed. Retrying..."
                 print(e)
                 self.error_log(e)
-                await asyncio.sleep(270)
+                self.reconnect.lost()
+                await self.disconnect()
+                await self.reconnect.wait()
 
     async def identify_with_sasl(self):
         # Request SASL capability immediately upon connecting
-        buffer = ""
+        framer = LineFramer()
         SASL_successful = False
         logged_in = False
         motd_received = False
 
         while True:
-            data = await self.reader.read(4096)
-            if not data:
+            lines = await framer.read_lines(self.reader)
+            if lines is None:
                 raise ConnectionError("Connection lost while waiting for the welcome message.")
 
-            decoded_data = data.decode('UTF-8', errors='ignore')
-            buffer += decoded_data
-            while '\r\n' in buffer:
-                line, buffer = buffer.split('\r\n', 1)
-                tokens = irctokens.tokenise(line)
+            for index, line in enumerate(lines):
                 print(line)
+                if peek_command(line)[1] not in self.REGISTRATION_COMMANDS:
+                    continue
+
+                tokens = irctokens.tokenise(line)
 
                 match tokens.command:
                     case "CAP":
@@ -252,10 +304,10 @@ class IRCBot:
                         print("SASL authentication successful.")
                         SASL_successful = True
                         if logged_in and SASL_successful and motd_received:
-                            for channel in self.channels:
-                                await self.join_channel(channel)
+                            await self.join_channels(self.channels)
                             print("Joined channels")
-                            return
+                            # The rest of this read and anything buffered past it belong to handle_messages
+                            return framer, lines[index + 1:]
 
                     case "904" | "905":
                         # SASL authentication failed
@@ -265,10 +317,9 @@ class IRCBot:
                         print("MOTD complete.")
                         motd_received = True
                         if logged_in and SASL_successful:
-                            for channel in self.channels:
-                                await self.join_channel(channel)
+                            await self.join_channels(self.channels)
                             print("Joined channels on MOTD.")
-                            return
+                            return framer, lines[index + 1:]
 
                     case "433":
                         raise NameInUseError("Nickname is already in use (error 433)")
@@ -283,9 +334,15 @@ class IRCBot:
     async def handle_cap(self, tokens):
         print("Handling CAP")
         if "LS" in tokens.params:
-            await self.send("CAP REQ :sasl")
+            if self.history.add_offered(tokens):
+                await self.send(f"CAP REQ :{' '.join(self.history.wanted_caps())}")
         elif "ACK" in tokens.params:
-            await self.send("AUTHENTICATE PLAIN")
+            if 'sasl' in self.history.acknowledge(tokens):
+                await self.send("AUTHENTICATE PLAIN")
+        elif "NAK" in tokens.params and self.history.requested != ['sasl']:
+            # CAP REQ is all or nothing, so fall back to plain SASL
+            self.history.requested = ['sasl']
+            await self.send("CAP REQ :sasl")
 
     async def handle_sasl_auth(self, tokens):
         print("Sent SASL Auth")
@@ -294,20 +351,47 @@ class IRCBot:
             encoded_auth = base64.b64encode(auth_string.encode("UTF-8")).decode("UTF-8")
             await self.send(f"AUTHENTICATE {encoded_auth}\r\n")
 
-    async def send(self, message):
-        safe_msg = await self.sanitize_input(message)
-        self.writer.write((safe_msg + '\r\n').encode('utf-8'))
-
-    async def join_channel(self, channel):
-        await self.send(f"JOIN {channel}")
-        await asyncio.sleep(0.3)
+    def start_writer(self):
+        # A fresh writer task owns each new connection's StreamWriter
+        if self.writer_task:
+            self.writer_task.cancel()
+        self.out = IRCWriter(self.writer)
+        self.outbound = OutboundScheduler(self.out, self.flood_burst, self.flood_rate)
+        self.writer_task = asyncio.create_task(self.outbound.run())
+
+    async def send(self, message, priority=None):
+        # priority=None lets the scheduler classify the line by its verb
+        for line in self.encoder.encode(message):
+            if line.startswith('JOIN '):
+                self.joins.expect(line)
+            await self.outbound.submit(line, priority)
+
+    async def join_channels(self, channels):
+        # As few JOIN lines as fit in 512 bytes, paced by the outbound scheduler rather than sleeps
+        self.joins.reset()
+        for line in self.joins.lines(channels):
+            await self.send(line)
+
+    async def channel_joined(self, line):
+        channel = self.joins.confirm(irctokens.tokenise(line).params[0])
+        if channel and self.history.enabled:
+            # The server has us in the channel now, so it will answer the history request
+            await self.send(self.history.request(channel))
 
     async def keep_alive(self):
+        self.lag.reset()
         while True:
-            async with self.lock:
-                await self.send("PING :keepalive")
-                print(f"Sent: PING to Server: {self.server}")
-            await asyncio.sleep(195)
+            if self.lag.due():
+                async with self.lock:
+                    await self.send(self.lag.probe())
+            self.outbound.set_lag(self.lag.current())
+            if self.lag.stale():
+                # A half dead link can sit quietly for minutes before the read fails, ending this task makes main_loop reconnect
+                e = f"No PONG from {self.server} for {self.lag.current():.0f} seconds, reconnecting..."
+                print(e)
+                self.error_log(e)
+                return
+            await asyncio.sleep(1)
 
     async def clear_urls(self):
         while True:
@@ -316,9 +400,10 @@ class IRCBot:
                 print(f"Cleared URLS")
             await asyncio.sleep(600)
 
-    async def save_message(self, sender, content, channel):
-        # Use system's current time for Unix timestamp
-        unix_timestamp = int(datetime.datetime.now().timestamp())
+    async def save_message(self, sender, content, channel, unix_timestamp=None, replayed=False):
+        # Use system's current time for Unix timestamp unless the server supplied one
+        if unix_timestamp is None:
+            unix_timestamp = int(datetime.datetime.now().timestamp())
 
         # Check if it's a CTCP ACTION message
         if content.startswith("\x01ACTION") and content.endswith("\x01"):
@@ -341,6 +426,9 @@ class IRCBot:
         if channel not in self.last_messages:
             self.last_messages[channel] = []
         self.last_messages[channel].append(formatted_message)
+        # Backfilled lines are the server's copy, logging them would repeat them on every reconnect
+        if not replayed:
+            self.message_log.append(channel, formatted_message)
 
     async def handle_ctcp(self, tokens):
         hostmask = tokens.hostmask
@@ -377,31 +465,50 @@ class IRCBot:
     def is_ctcp_command(self, message):
         return message.startswith('\x01') and message.endswith('\x01')
 
-    async def handle_messages(self):
-        global disconnect_requested
-        disconnect_requested = False
-        buffer = ""  # Initialize an empty buffer for accumulating data
-
-        while not disconnect_requested:
-            data = await self.reader.read(1000)
-            buffer += data.decode('UTF-8', errors='replace')
-
-            while '\n' in buffer:
-                line, buffer = buffer.split('\n', 1)
-                line = line.rstrip('\r').strip().lstrip()
+    async def handle_messages(self, framer, lines):
+        # Carries on with registration's framer, starting on the lines it read past the end of registration
+        self.disconnect_requested = False
+
+        while not self.disconnect_requested:
+            if lines is None:
+                lines = await framer.read_lines(self.reader)
+                if lines is None:
+                    break
+
+            for line in lines:
+                source, verb = peek_command(line)
+                # Only our own JOIN echoes matter, and only while a JOIN we sent is unconfirmed
+                if verb == "JOIN" and self.joins.pending and source and source.split('!')[0].lower() == self.nickname.lower():
+                    await self.channel_joined(line)
+                    continue
 
-                if not line:
+                # JOIN/PART/QUIT/MODE floods stop here without being tokenised
+                if verb not in self.HANDLED_COMMANDS:
                     continue
 
                 tokens = irctokens.tokenise(line)
 
                 if tokens.command == "PING":
-                    await self.send(f"PONG {tokens.params[0].strip().lstrip()}")
+                    await self.send(f"PONG {tokens.params[0].strip()}")
+                elif tokens.command == "PONG":
+                    lag = self.lag.pong(tokens)
+                    if lag is not None:
+                        self.outbound.set_lag(lag)
+                elif tokens.command == "BATCH":
+                    await self.handle_history_batch(tokens)
                 elif tokens.command == "PRIVMSG":
-                    sender = tokens.source.split('!')[0].strip().lstrip() if tokens.source else "Unknown Sender"
-                    hostmask = tokens.source.strip() if tokens.source else "Unknown Hostmask"
-                    channel = tokens.params[0].strip().lstrip()
-                    content = tokens.params[1].strip().lstrip()
+                    history_channel = self.history.batch_channel(tokens)
+                    if history_channel:
+                        # Replayed history only refills the buffer, it never triggers commands
+                        sender = tokens.source.split('!')[0] if tokens.source else "Unknown Sender"
+                        normalized_content = ' '.join(tokens.params[1].split())
+                        await self.save_message(sender, normalized_content, history_channel, self.history.timestamp(tokens), replayed=True)
+                        continue
+
+                    sender = tokens.source.split('!')[0] if tokens.source else "Unknown Sender"
+                    hostmask = tokens.source if tokens.source else "Unknown Hostmask"
+                    channel = tokens.params[0]
+                    content = tokens.params[1].strip()
                     parts = content.split()
                     normalized_content = ' '.join(parts)
 
@@ -416,27 +523,29 @@ class IRCBot:
                     await self.save_message(sender, normalized_content, channel)
                     await self.send_saved_messages(sender, channel)
 
-                    if await self.handle_channel_features(channel, '.record'.strip().lstrip()):
+                    # One lookup for the channel's feature set, then plain set probes
+                    features = self.commands.features_for(channel)
+
+                    if '.record' in features:
                         await self.record_last_seen(sender, channel, normalized_content)
-                        self.save_last_seen()
+                        if not self.store:
+                            self.save_last_seen()
 
-                    if await self.handle_channel_features(channel, '.usercommands'.strip().lstrip()):
+                    if '.usercommands' in features:
                         await self.user_commands(sender, channel, normalized_content, hostmask)
 
-                    if await self.handle_channel_features(channel, '.urlparse'.strip().lstrip()):
-                        await self.detect_and_parse_urls(sender, channel, normalized_content)
+                    # Title lookups run as tasks too, and only for lines that have a link in them
+                    if 'http' in normalized_content:
+                        if '.urlparse' in features:
+                            self.tasks.submit(sender, 'url titles', self.detect_and_parse_urls(sender, channel, normalized_content))
 
-                    if await self.handle_channel_features(channel, '.redditparse'.strip().lstrip()):
-                        response = await parse_reddit_url(normalized_content)
-                        if response == None:
-                            pass
-                        else:
-                            await self.response_queue.put((channel, response))
+                        if '.redditparse' in features:
+                            self.tasks.submit(sender, 'reddit title', self.reddit_title(channel, normalized_content))
 
                 elif tokens.command == "332":  # TOPIC message
                     if self.topic_command == True:
-                        topic = tokens.params[2].strip().lstrip()
-                        channel = tokens.params[1].strip().lstrip()
+                        topic = tokens.params[2].strip()
+                        channel = tokens.params[1]
                         print(f"{topic}")
                         if topic:
                             response = f"PRIVMSG {channel} :{topic}\r\n"
@@ -446,15 +555,31 @@ class IRCBot:
                         print(f"Sent: {response} to {channel}")
                         self.topic_command = False
 
+            lines = None
+
         print("Disconnecting...")
         await self.disconnect()
 
+    async def handle_history_batch(self, tokens):
+        channel, started = self.history.handle_batch(tokens)
+        if not channel:
+            return
+        if started:
+            # The server's copy replaces whatever was replayed from the history log
+            self.last_messages[channel] = deque(maxlen=200)
+        else:
+            print(f"Backfilled {len(self.last_messages.get(channel, []))} messages for {channel}")
+
     async def record_last_seen(self, sender, channel, content):
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # Update or create the last_seen dictionary for the user and channel
         user = sender.lower()
 
+        if self.store:
+            self.store.record_seen(user, channel, timestamp, content)
+            return
+
         if user not in self.last_seen:
             self.last_seen[user] = {}
 
@@ -467,22 +592,15 @@ class IRCBot:
             "chat_count": self.last_seen[user][channel].get('chat_count', 0) + 1
         }
 
+    def seen_entry(self, user, channel):
+        if self.store:
+            return self.store.seen(user, channel)
+        return self.last_seen.get(user, {}).get(channel)
+
     async def get_channel_topic(self, channel: str) -> Optional[str]:
         self.topic_command = True
         await self.send(f"TOPIC {channel}")
 
-    async def sanitize_input(self, malicious_input):
-        decoded_input = html.unescape(malicious_input)
-        # Allow Unicode characters through by checking if the character is not a control character,
-        # except for the whitelisted control codes ('\x03', '\x02', '\x0F', '\x16', '\x1D', '\x1F', '\x01').
-        # This version considers characters outside the basic ASCII control characters as allowed,
-        # including extended Unicode characters.
-        safe_output = ''.join(
-            char for char in decoded_input
-            if (ord(char) > 31 and ord(char) != 127) or char in '\x03\x02\x0F\x16\x1E\x1D\x1F\x01'
-        )
-        return safe_output
-
     def filter_private_ip(self, url):
         # Extract the hostname from the URL
         hostname = re.findall(r'https?://([^/:]+)', url)
@@ -497,16 +615,20 @@ class IRCBot:
         return False
 
     async def send_responses_worker(self):
-        """Worker to send responses from the queue with timing."""
+        """Worker to hand queued responses to the outbound scheduler, which does the pacing."""
         while True:
             channel, response = await self.response_queue.get()
             await self.send(f'PRIVMSG {channel} :{response}\r\n')
             print(f"Sent: {response} to {channel}")
-            await asyncio.sleep(0.4)
             self.response_queue.task_done()
 
+    async def reddit_title(self, channel, content):
+        response = await parse_reddit_url(content)
+        if response is not None:
+            await self.send(f'PRIVMSG {channel} :{response}', PRIORITY_BULK)
+
     async def detect_and_parse_urls(self, sender, channel, content):
-        titlescrape = Titlescraper()
+        titlescrape = self.services.titlescrape
 
         urls = self.url_regex.findall(content)
 
@@ -523,13 +645,14 @@ class IRCBot:
                     print(f"URL already processed for this channel: {url}")
                     continue
 
-                response = await titlescrape.process_url(url)
+                # Titles are cached across every network sharing self.services
+                response = await self.services.fetch_title(url)
 
                 if response is None:
                     return
 
-                # Add the response to the queue instead of sending immediately
-                await self.response_queue.put((channel, response))
+                # URL titles are bulk traffic and yield to command output
+                await self.send(f'PRIVMSG {channel} :{response}', PRIORITY_BULK)
 
                 # Update the dictionary with the processed URL and channel
                 if url not in self.processed_urls:
@@ -577,18 +700,13 @@ class IRCBot:
 
     def save_quotes(self, filename='quotes.json'):
         """Save the quotes dictionary to a JSON file."""
-        try:
-            with open(filename, 'w') as file:
-                json.dump(self.quotes, file, indent=2)  # Use indent for pretty-printing
-            print("Quotes saved successfully.")
-        except Exception as e:
-            print(f"Failed to save quotes: {e}")
+        persistence.mark(self.data_path(filename), lambda: json.dumps(self.quotes, indent=2))
 
     def load_quotes(self, filename='quotes.json'):
         """Load the quotes dictionary from a JSON file."""
         try:
             self.quotes = {}
-            with open(filename, 'r') as file:
+            with open(self.data_path(filename), 'r') as file:
                 self.quotes = json.load(file)
             print("Quotes loaded successfully.")
         except FileNotFoundError:
@@ -598,6 +716,30 @@ class IRCBot:
             print(f"Failed to load quotes: {e}")
             return {}
 
+    def get_quote(self, channel, quote_number):
+        if self.store:
+            return self.store.quote(channel, int(quote_number))
+        # Ensure the channel exists in the quotes dictionary
+        return self.quotes.get(channel, {}).get(quote_number)
+
+    def add_quote(self, channel, sender, quote_content):
+        date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if self.store:
+            return str(self.store.add_quote(channel, sender, date, quote_content))
+        # Initialize the channel in self.quotes if it does not exist
+        if channel not in self.quotes:
+            self.quotes[channel] = {}
+        quote_number = str(len(self.quotes[channel]) + 1)
+        quote = {
+            'recorded_by': sender,
+            'date': date,
+            'quote': quote_content
+        }
+        # Save the quote under the appropriate channel and quote number
+        self.quotes[channel][quote_number] = quote
+        self.save_quotes()
+        return quote_number
+
     async def handle_quote_commands(self, sender, channel, command, content):
         args = content.split(maxsplit=1)
         command_arg = args[1].strip() if len(args) > 1 else None
@@ -605,21 +747,18 @@ class IRCBot:
         if command == '.quote':
             if command_arg and command_arg.isdigit():
                 quote_number = str(command_arg)  # Work with string for consistency
-                # Ensure the channel exists in the quotes dictionary
-                if channel in self.quotes and quote_number in self.quotes[channel]:
-                    quote_info = self.quotes[channel][quote_number]
+                quote_info = self.get_quote(channel, quote_number)
+                if quote_info:
                     date = quote_info['date']
                     recorded_by = quote_info['recorded_by']
                     quote_content = quote_info['quote']
 
                     header = f"PRIVMSG {channel} :Quote #{quote_number} recorded by {recorded_by} on {date}:"
-                    await self.send(header)
-                    await asyncio.sleep(0.3)
+                    await self.send(header, PRIORITY_BULK)
 
                     for message in quote_content:
                         response = f"PRIVMSG {channel} :{message}"
-                        await asyncio.sleep(0.3)
-                        await self.send(response)
+                        await self.send(response, PRIORITY_BULK)
                 else:
                     response = f"PRIVMSG {channel} :Invalid quote number."
                     await self.send(response)
@@ -635,19 +774,7 @@ class IRCBot:
             if sender in self.active_quotes:
                 channel_of_quote, quote_content = self.active_quotes.pop(sender)
                 if quote_content:
-                    # Initialize the channel in self.quotes if it does not exist
-                    if channel_of_quote not in self.quotes:
-                        self.quotes[channel_of_quote] = {}
-                    quote_number = str(len(self.quotes[channel_of_quote]) + 1)
-                    quote = {
-                        'recorded_by': sender,
-                        'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'quote': quote_content
-                    }
-                    # Save the quote under the appropriate channel and quote number
-                    self.quotes[channel_of_quote][quote_number] = quote
-                    self.save_quotes()
-                    self.load_quotes()
+                    quote_number = self.add_quote(channel_of_quote, sender, quote_content)
                     response = f"PRIVMSG {channel_of_quote} :Quote #{quote_number} recorded."
                 else:
                     response = f"PRIVMSG {channel_of_quote} :No messages were quoted."
@@ -656,8 +783,48 @@ class IRCBot:
                 response = f"PRIVMSG {channel} :You have not started quoting. Use '.quote' to start."
                 await self.send(response)
 
+    def build_commands(self):
+        # Every command compiled once: verb -> handler(sender, channel, args, content, hostmask) and how it is run
+        return {
+            '.ping': Command(lambda sender, channel, args, content, hostmask: f"PRIVMSG {channel} :[\x0303Ping\x03] {sender}: PNOG!", limit=LIMIT_CHEAP, output=OUTPUT_LINE),
+            '.yt': Command(lambda sender, channel, args, content, hostmask: run_blocking('youtube', self.search.process_youtube_search, args), limit=LIMIT_API, output=OUTPUT_QUEUE),
+            '.tr': Command(lambda sender, channel, args, content, hostmask: run_blocking('ddg', duck_translate, args), limit=LIMIT_API, output=OUTPUT_QUEUE),
+            '.g': Command(lambda sender, channel, args, content, hostmask: run_blocking('google', self.search.google_it, args), limit=LIMIT_API, output=OUTPUT_QUEUE),
+            '.ddg': Command(lambda sender, channel, args, content, hostmask: run_blocking('ddg', duck_search, args, channel), limit=LIMIT_API, output=OUTPUT_QUEUE),
+            '.quote': Command(lambda sender, channel, args, content, hostmask: self.handle_quote_commands(sender, channel, '.quote', content), limit=None),
+            '.endquote': Command(lambda sender, channel, args, content, hostmask: self.handle_quote_commands(sender, channel, '.endquote', content), limit=None),
+            '.color': Command(lambda sender, channel, args, content, hostmask: handle_color_command(sender, channel, args), limit=LIMIT_CHEAP, output=OUTPUT_LINE),
+            '.weather': Command(lambda sender, channel, args, content, hostmask: WeatherSnag().get_weather(args, channel), limit=LIMIT_API, output=OUTPUT_LINE),
+            '.roll': Command(lambda sender, channel, args, content, hostmask: self.dice_roll(args, channel, sender), limit=LIMIT_CHEAP),
+            '.fact': Command(lambda sender, channel, args, content, hostmask: self.send_random_mushroom_fact(channel, self.extract_factoid_criteria(args))),
+            '.tell': Command(lambda sender, channel, args, content, hostmask: self.handle_tell_command(channel, sender, content)),
+            '.info': Command(lambda sender, channel, args, content, hostmask: self.handle_info_command(channel, sender)),
+            '.moo': Command(lambda sender, channel, args, content, hostmask: "Hi cow!", limit=LIMIT_CHEAP, output=OUTPUT_PRIVMSG),
+            '.moof': Command(lambda sender, channel, args, content, hostmask: self.send_dog_cow_message(channel), limit=LIMIT_CHEAP),
+            '.topic': Command(lambda sender, channel, args, content, hostmask: self.get_channel_topic(channel)),
+            '.help': Command(lambda sender, channel, args, content, hostmask: self.help_command(channel, sender, args, hostmask)),
+            '.seen': Command(lambda sender, channel, args, content, hostmask: self.seen_command(channel, sender, content)),
+            '.last': Command(lambda sender, channel, args, content, hostmask: self.last_command(channel, sender, content)),
+            '.version': Command(lambda sender, channel, args, content, hostmask: "Clov3rBot Version 6.66666", limit=LIMIT_CHEAP, output=OUTPUT_PRIVMSG),
+            '.rollover': Command(lambda sender, channel, args, content, hostmask: self.rollover_command(channel), limit=LIMIT_CHEAP),
+            '.stats': Command(lambda sender, channel, args, content, hostmask: self.stats_command(channel, sender, content)),
+            '.bug': Command(lambda sender, channel, args, content, hostmask: run_blocking('gentoo', get_bug_details, args), limit=LIMIT_API, output=OUTPUT_PRIVMSG),
+            # Admin only, and never rate limited
+            '.factadd': Command(lambda sender, channel, args, content, hostmask: self.factadd_command(channel, args), admin=True, limit=None, output=OUTPUT_LINE, priority=PRIORITY_ADMIN),
+            '.quit': Command(lambda sender, channel, args, content, hostmask: self.quit_command(channel, sender), admin=True, limit=None),
+            '.lag': Command(lambda sender, channel, args, content, hostmask: f"[Lag] {self.lag.summary()} | {self.outbound.stats()} | {self.tasks.stats()}", admin=True, limit=None, output=OUTPUT_PRIVMSG, priority=PRIORITY_ADMIN),
+            '.upstreams': Command(lambda sender, channel, args, content, hostmask: f"[Upstreams] {executors.report()}", admin=True, limit=None, output=OUTPUT_PRIVMSG, priority=PRIORITY_ADMIN),
+            '.limits': Command(lambda sender, channel, args, content, hostmask: f"[Limits] {self.rate_limits.stats()}", admin=True, limit=None, output=OUTPUT_PRIVMSG, priority=PRIORITY_ADMIN),
+            '.op': Command(lambda sender, channel, args, content, hostmask: f"MODE {channel} +o {sender}", admin=True, limit=None, output=OUTPUT_LINE),
+            '.deop': Command(lambda sender, channel, args, content, hostmask: f"MODE {channel} -o {sender}", admin=True, limit=None, output=OUTPUT_LINE),
+            '.botop': Command(lambda sender, channel, args, content, hostmask: f"PRIVMSG Chanserv :OP {channel} {self.nickname}", admin=True, limit=None, output=OUTPUT_LINE, priority=PRIORITY_ADMIN),
+            '.join': Command(lambda sender, channel, args, content, hostmask: f"JOIN {args.split()[0]}" if args else None, admin=True, limit=None, output=OUTPUT_LINE),
+            '.part': Command(lambda sender, channel, args, content, hostmask: f"PART {args.split()[0]}" if args else None, admin=True, limit=None, output=OUTPUT_LINE),
+            '.reload': Command(lambda sender, channel, args, content, hostmask: self.reload_command(channel, sender), admin=True, limit=None),
+            '.purge': Command(lambda sender, channel, args, content, hostmask: self.purge_message_queue(channel, sender), admin=True, limit=None),
+        }
+
     async def user_commands(self, sender, channel, content, hostmask):
-        global disconnect_requested
         print(f"Sender: {sender}")
         print(f"Channel: {channel}")
         print(f"Content: {content}")
@@ -671,267 +838,64 @@ class IRCBot:
             self.active_quotes[sender][1].append(content)
 
         # Check if the message starts with 's/' for sed-like command
-        if content and content.startswith(('s', 'S')):
-            if await self.handle_channel_features(channel, '.sed'):
+        if content.startswith(('s', 'S')):
+            # "sure", "so..." and the like are chatter, not substitutions
+            if len(content) > 2 and content[1] in SED_SEPARATORS and self.commands.enabled(channel, '.sed'):
                 response = await handle_sed_command(channel, sender, content, self.last_messages)
-                if response == None:
-                    return
-                else:
+                if response is not None:
                     await self.response_queue.put((channel, response))
+            return
+
+        command_name = content.split(maxsplit=1)[0]
+        command = self.commands.lookup(channel, command_name)
+        if command is None:
+            return
+
+        is_admin = hostmask in self.admin_list
+        if command.admin and not is_admin:
+            return
+        # Admins are never limited; anyone else over a user, channel or global budget is ignored
+        if command.limit and not is_admin and not self.rate_limits.allow(command.limit, sender, channel):
+            return
+
+        args = content[len(command_name):].strip()
+        if command.admin:
+            # Admin commands are quick, local, and can change the bot's own state (.quit), so they run in order
+            await self.run_command(command, sender, channel, args, content, hostmask)
+            return
+
+        async def report_timeout():
+            await self.send(f"PRIVMSG {channel} :{sender}: {command_name} took too long and was cancelled.")
+
+        self.tasks.submit(sender, command_name, self.run_command(command, sender, channel, args, content, hostmask), report_timeout)
+
+    async def run_command(self, command, sender, channel, args, content, hostmask):
+        response = await self.commands.run(command, sender, channel, args, content, hostmask)
+        if response is None or command.output == OUTPUT_NONE:
+            return
+        if command.output == OUTPUT_QUEUE:
+            await self.response_queue.put((channel, response))
+        elif command.output == OUTPUT_PRIVMSG:
+            await self.send(f"PRIVMSG {channel} :{response}", command.priority)
         else:
-            # Check if there are any words in the content before accessing the first word
-            if content:
-                # Check if user's last command time is tracked, and calculate time elapsed
-                if sender in self.last_command_time:
-                    time_elapsed = time.time() - self.last_command_time[sender]
-                    if time_elapsed < self.MIN_COMMAND_INTERVAL:
-                        return
-
-                command = content.split()[0].strip()
-                args = content[len(command):].strip()
-
-                if await self.handle_channel_features(channel, command):
-                    match command:
-                        case '.ping':
-                            # PNOG
-                            # Update last command time
-                            if hostmask in self.admin_list:
-                                response = f"PRIVMSG {channel} :[\x0303Ping\x03] {sender}: PNOG!"
-                                await self.send(response)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = f"PRIVMSG {channel} :[\x0303Ping\x03] {sender}: PNOG!"
-                                await self.send(response)
-
-                        case '.yt':
-                            if hostmask in self.admin_list:
-                                response = self.search.process_youtube_search(args)
-                                await self.response_queue.put((channel, response))
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = self.search.process_youtube_search(args)
-                                await self.response_queue.put((channel, response))
-
-                        case '.tr':
-                            if hostmask in self.admin_list:
-                                response = duck_translate(args)
-                                await self.response_queue.put((channel, response))
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = duck_translate(args)
-                                await self.response_queue.put((channel, response))
-
-                        case '.g':
-                            if hostmask in self.admin_list:
-                                response = self.search.google_it(args)
-                                await self.response_queue.put((channel, response))
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = self.search.google_it(args)
-                                await self.response_queue.put((channel, response))
-
-                        case '.ddg':
-                            if hostmask in self.admin_list:
-                                response = duck_search(args, channel)
-                                await self.response_queue.put((channel, response))
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = duck_search(args, channel)
-                                await self.response_queue.put((channel, response))
-
-                        case '.quote' | '.endquote':
-                            await self.handle_quote_commands(sender, channel, command, content)
-
-                        case '.color':
-                            if hostmask in self.admin_list:
-                                response = await handle_color_command(sender, channel, args)
-                                await self.send(response)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = await handle_color_command(sender, channel, args)
-                                await self.send(response)
-
-                        case '.weather':
-                            if hostmask in self.admin_list:
-                                snag = WeatherSnag()
-                                response = await snag.get_weather(args, channel)
-                                await self.send(response)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                snag = WeatherSnag()
-                                response = await snag.get_weather(args, channel)
-                                await self.send(response)
-
-                        case '.roll':
-                            # Roll the dice
-                            if hostmask in self.admin_list:
-                                await self.dice_roll(args, channel, sender)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.dice_roll(args, channel, sender)
-
-                        case '.fact':
-                            # Extract the criteria from the user's command
-                            if hostmask in self.admin_list:
-                                criteria = self.extract_factoid_criteria(args)
-                                await self.send_random_mushroom_fact(channel, criteria)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                criteria = self.extract_factoid_criteria(args)
-                                await self.send_random_mushroom_fact(channel, criteria)
-
-                        case '.tell':
-                            # Save a message for a user
-                            if hostmask in self.admin_list:
-                                await self.handle_tell_command(channel, sender, content)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.handle_tell_command(channel, sender, content)
-
-                        case '.info':
-                            if hostmask in self.admin_list:
-                                await self.handle_info_command(channel, sender)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.handle_info_command(channel, sender)
-
-                        case '.moo':
-                            if hostmask in self.admin_list:
-                                response = "Hi cow!"
-                                await self.send(f'PRIVMSG {channel} :{response}\r\n')
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = "Hi cow!"
-                                await self.send(f'PRIVMSG {channel} :{response}\r\n')
-
-                        case '.moof':
-                            if hostmask in self.admin_list:
-                                await self.send_dog_cow_message(channel)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.send_dog_cow_message(channel)
-
-                        case '.topic':
-                            # Get and send the channel topic
-                            if hostmask in self.admin_list:
-                                await self.get_channel_topic(channel)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.get_channel_topic(channel)
-
-                        case '.help':
-                            # Handle the help command
-                            if hostmask in self.admin_list:
-                                await self.help_command(channel, sender, args, hostmask)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.help_command(channel, sender, args, hostmask)
-
-                        case '.seen':
-                            # Handle the !seen command
-                            if hostmask in self.admin_list:
-                                await self.seen_command(channel, sender, content)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.seen_command(channel, sender, content)
-
-                        case '.last':
-                            if hostmask in self.admin_list:
-                                await self.last_command(channel, sender, content)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                await self.last_command(channel, sender, content)
-
-                        case '.version':
-                            if hostmask in self.admin_list:
-                                version = "Clov3rBot Version 6.66666"
-                                response = f"PRIVMSG {channel} :{version}"
-                                await self.send(response)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                version = "Clov3rBot Version 6.66666"
-                                response = f"PRIVMSG {channel} :{version}"
-                                await self.send(response)
-
-                        case '.rollover':
-                            # Perform the rollover action
-                            if hostmask in self.admin_list:
-                                barking_action = f"PRIVMSG {channel} :woof woof!"
-                                action_message = f"PRIVMSG {channel} :\x01ACTION rolls over\x01"
-                                await self.send(barking_action)
-                                await self.send(action_message)
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                barking_action = f"PRIVMSG {channel} :woof woof!"
-                                action_message = f"PRIVMSG {channel} :\x01ACTION rolls over\x01"
-                                await self.send(barking_action)
-                                await self.send(action_message)
-
-                        case '.stats':
-                            # Handle the !stats command
-                            if hostmask in self.admin_list:
-                                await self.stats_command(channel, sender, content)
-                            else:                  
-                                self.last_command_time[sender] = time.time()
-                                await self.stats_command(channel, sender, content)
-
-                        case '.bug':
-                            if hostmask in self.admin_list:
-                                response = get_bug_details(args)
-                                await self.send(f"PRIVMSG {channel} :{response}")
-                            else:
-                                self.last_command_time[sender] = time.time()
-                                response = get_bug_details(args)
-                                await self.send(f"PRIVMSG {channel} :{response}")
-
-                        case '.factadd' if hostmask in self.admin_list:
-                            # Handle the !factadd command
-                            new_fact = args.strip()
-                            if new_fact:
-                                self.mushroom_facts.append(new_fact)
-                                self.save_mushroom_facts()
-                                response = f"PRIVMSG {channel} :New mushroom fact added: {new_fact}"
-                            else:
-                                response = f"PRIVMSG {channel} :Please provide a valid mushroom fact."
-                            await self.send(response)
-
-                        case '.quit' if hostmask in self.admin_list:
-                            # Quits the bot from the network.
-                            response = f"PRIVMSG {channel} :Acknowledged {sender} quitting..."
-                            await self.send(response)
-                            await self.save_last_messages()
-                            disconnect_requested = True
-
-                        case '.op' if hostmask in self.admin_list:
-                            # Op the user
-                            await self.send(f"MODE {channel} +o {sender}\r\n")
-
-                        case '.deop' if hostmask in self.admin_list:
-                            # Deop the user
-                            await self.send(f"MODE {channel} -o {sender}\r\n")
-
-                        case '.botop' if hostmask in self.admin_list:
-                            # Op the bot using Chanserv
-                            await self.send(f"PRIVMSG Chanserv :OP {channel} {self.nickname}\r\n")
-
-                        case '.join' if hostmask in self.admin_list:
-                            # Join a specified channel
-                            if args:
-                                new_channel = args.split()[0]
-                                await self.send(f"JOIN {new_channel}\r\n")
-
-                        case '.part' if hostmask in self.admin_list:
-                            # Part from a specified channel
-                            if args:
-                                part_channel = args.split()[0]
-                                await self.send(f"PART {part_channel}\r\n")
-
-                        case '.reload' if hostmask in self.admin_list:
-                            # Reload lists/dicts
-                            await self.reload_command(channel, sender)
-
-                        case '.purge' if hostmask in self.admin_list:
-                            await self.purge_message_queue(channel, sender)
+            await self.send(response, command.priority)
+
+    async def rollover_command(self, channel):
+        await self.send(f"PRIVMSG {channel} :woof woof!")
+        await self.send(f"PRIVMSG {channel} :\x01ACTION rolls over\x01")
+
+    def factadd_command(self, channel, args):
+        new_fact = args.strip()
+        if not new_fact:
+            return f"PRIVMSG {channel} :Please provide a valid mushroom fact."
+        self.mushroom_facts.append(new_fact)
+        self.save_mushroom_facts()
+        return f"PRIVMSG {channel} :New mushroom fact added: {new_fact}"
+
+    async def quit_command(self, channel, sender):
+        # Quits the bot from the network.
+        await self.send(f"PRIVMSG {channel} :Acknowledged {sender} quitting...", PRIORITY_ADMIN)
+        self.disconnect_requested = True
 
     async def stats_command(self, channel, sender, content):
         # Extract the target user from the command
@@ -942,8 +906,9 @@ class IRCBot:
             target_user = target_user.lower()
 
             # Check if the target user has chat count information
-            if target_user in self.last_seen and channel in self.last_seen[target_user]:
-                chat_count = self.last_seen[target_user][channel].get('chat_count', 0)
+            last_seen_info = self.seen_entry(target_user, channel)
+            if last_seen_info:
+                chat_count = last_seen_info.get('chat_count', 0)
                 response = f"{sender}, I've seen {target_user} send {chat_count} messages"
                 await self.response_queue.put((channel, response))
             else:
@@ -954,6 +919,8 @@ class IRCBot:
             await self.response_queue.put((channel, response))
 
     async def reload_command(self, channel, sender):
+        # Anything not yet written would be lost by reading the files back
+        await persistence.flush()
         self.channels_features = {}
         self.mushroom_facts = []
         self.ignore_list = []
@@ -962,10 +929,8 @@ class IRCBot:
         self.quotes = []
         self.load_channel_features()
         self.load_mushroom_facts()
-        self.load_message_queue()
-        self.load_last_seen()
         self.load_ignore_list()
-        self.load_quotes()
+        self.load_state()
         response = f"{sender}, Clov3r Successfully Reloaded.\r\n"
         await self.response_queue.put((channel, response))
         print(f"Sent: {response} to {channel}")
@@ -989,11 +954,7 @@ class IRCBot:
             if last_n_messages:
                 for timestamp, nickname, msg_content in last_n_messages:
                     response = f"PRIVMSG {sender} :[Last message in {channel}]: {timestamp} <{nickname}> {msg_content}\r\n"
-                    
-                    # Add a delay before sending each response
-                    await asyncio.sleep(0.3)
-
-                    await self.send(response)
+                    await self.send(response, PRIORITY_BULK)
                     print(f"Sent last message to {sender} via direct message")
             else:
                 response = f"PRIVMSG {sender} :No messages found in {channel}\r\n"
@@ -1019,9 +980,8 @@ class IRCBot:
             username_lower = username.lower()
 
             # Check if the user has been seen in the specific channel
-            if username_lower in self.last_seen and channel in self.last_seen[username_lower]:
-                last_seen_info = self.last_seen[username_lower][channel]
-
+            last_seen_info = self.seen_entry(username_lower, channel)
+            if last_seen_info:
                 # Convert the timestamp to a datetime object
                 timestamp = datetime.datetime.strptime(last_seen_info['timestamp'], "%Y-%m-%d %H:%M:%S")
 
@@ -1047,7 +1007,10 @@ class IRCBot:
         self.message_queue = {}
 
         # Save the empty message_queue
-        self.save_message_queue()
+        if self.store:
+            self.store.clear_tells()
+        else:
+            self.save_message_queue()
 
         response = f"PRIVMSG {channel} :{sender}, the message queue has been purged.\r\n"
         await self.send(response)
@@ -1141,24 +1104,27 @@ class IRCBot:
             # Convert the recipient's nickname to lowercase
             username_lower = username.lower()
 
-            # Create a tuple key with the channel and recipient's lowercase nickname
-            key = (channel, username_lower)
-
-            # Check if the key exists in the message_queue
-            if key not in self.message_queue:
-                self.message_queue[key] = []
-
             # Get the current time in UTC without pytz
             utc_now = datetime.datetime.utcnow()
 
             # Save the message for the user in the specific channel with a timestamp
             timestamp = utc_now.strftime("%Y-%m-%d %H:%M:%S UTC")
-            self.message_queue[key].append((username, sender, message, timestamp))
+            if self.store:
+                self.store.add_tell(channel, username_lower, username, sender, message, timestamp)
+            else:
+                # Create a tuple key with the channel and recipient's lowercase nickname
+                key = (channel, username_lower)
+
+                # Check if the key exists in the message_queue
+                if key not in self.message_queue:
+                    self.message_queue[key] = []
+
+                self.message_queue[key].append((username, sender, message, timestamp))
+                self.save_message_queue()
 
             # Notify the user that the message is saved
             response = f"PRIVMSG {channel} :{sender}, I'll tell {username} that when they return."
             await self.send(response)
-            self.save_message_queue()
         except ValueError:
             response = f"PRIVMSG {channel} :Invalid .tell command format. Use: .tell username message"
             await self.send(response)
@@ -1173,42 +1139,46 @@ class IRCBot:
         # Convert the sender nickname to lowercase for case-insensitive comparison
         sender_lower = sender.lower()
 
-        # Iterate over keys in the message_queue and find matching recipients
-        for key, messages in list(self.message_queue.items()):
-            try:
-                (saved_channel, saved_recipient) = key
-            except ValueError:
-                print(f"Error unpacking key: {key}")
-                continue
-
-            # Convert the recipient nickname to lowercase for case-insensitive comparison
-            recipient_lower = saved_recipient.lower()
+        if self.store:
+            # Runs on every message, so this is an index lookup rather than a scan of the whole queue
+            pending = self.store.take_tells(channel, sender_lower)
+        else:
+            pending = []
+            # Iterate over keys in the message_queue and find matching recipients
+            for key, messages in list(self.message_queue.items()):
+                try:
+                    (saved_channel, saved_recipient) = key
+                except ValueError:
+                    print(f"Error unpacking key: {key}")
+                    continue
 
-            # Check if the lowercase nicknames match and the channels are the same
-            if sender_lower == recipient_lower and channel == saved_channel:
-                # Get the current time as offset-aware
-                current_time = datetime.datetime.now(datetime.timezone.utc)
+                # Check if the lowercase nicknames match and the channels are the same
+                if sender_lower == saved_recipient.lower() and channel == saved_channel:
+                    pending.extend(messages)
+                    # Clear the saved messages for the user in the specific channel
+                    del self.message_queue[key]
+            if pending:
+                self.save_message_queue()
 
-                for (username, recipient, saved_message, timestamp) in messages:
-                    # Convert the timestamp to a datetime object and make it offset-aware
-                    timestamp = timestamp.rstrip(" UTC")  # Remove ' UTC' suffix
-                    message_time_naive = datetime.datetime.fromisoformat(timestamp)
-                    # Make it offset-aware by specifying UTC timezone
-                    message_time = message_time_naive.replace(tzinfo=datetime.timezone.utc)
+        # Get the current time as offset-aware
+        current_time = datetime.datetime.now(datetime.timezone.utc)
 
-                    # Calculate the time difference
-                    time_difference = current_time - message_time
+        for (username, recipient, saved_message, timestamp) in pending:
+            # Convert the timestamp to a datetime object and make it offset-aware
+            timestamp = timestamp.rstrip(" UTC")  # Remove ' UTC' suffix
+            message_time_naive = datetime.datetime.fromisoformat(timestamp)
+            # Make it offset-aware by specifying UTC timezone
+            message_time = message_time_naive.replace(tzinfo=datetime.timezone.utc)
 
-                    # Format the time difference as a human-readable string
-                    formatted_time_difference = self.format_timedelta(time_difference)
+            # Calculate the time difference
+            time_difference = current_time - message_time
 
-                    response = f"PRIVMSG {channel} :{sender}, {formatted_time_difference} ago <{recipient}> {saved_message} \r\n"
-                    await self.send(response)
-                    print(f"Sent saved message to {channel}: {response}")
+            # Format the time difference as a human-readable string
+            formatted_time_difference = self.format_timedelta(time_difference)
 
-                # Clear the saved messages for the user in the specific channel
-                del self.message_queue[key]
-                self.save_message_queue()
+            response = f"PRIVMSG {channel} :{sender}, {formatted_time_difference} ago <{recipient}> {saved_message} \r\n"
+            await self.send(response)
+            print(f"Sent saved message to {channel}: {response}")
 
     async def send_random_mushroom_fact(self, channel, criteria=None):
         if self.mushroom_facts:
@@ -1227,34 +1197,45 @@ class IRCBot:
         return lambda fact: args.lower() in fact.lower()
 
     async def disconnect(self):
+        # Nothing can be flushed once the server has hung up, so go straight to reconnecting
+        connection_alive = self.reader is not None and not self.reader.at_eof() and self.writer_task and not self.writer_task.done()
+        if self.outbound and connection_alive:
+            await self.outbound.flush()
+        if self.writer_task:
+            self.writer_task.cancel()
+            self.writer_task = None
         if self.writer:
             self.writer.close()
             asyncio.shield(self.writer.wait_closed())
+            self.writer = None
+            self.reader = None
 
     async def main_loop(self):
         try:
             self.load_mushroom_facts()
-            self.load_message_queue()
-            self.load_last_seen()
             self.load_ignore_list()
-            self.load_quotes()
+            self.load_state()
             await self.load_last_messages()
 
             while True:
                 try:
-                    await self.connect()
+                    framer, lines = await self.connect()
 
                     keep_alive_task = asyncio.create_task(self.keep_alive())
-                    handle_messages_task = asyncio.create_task(self.handle_messages())
+                    handle_messages_task = asyncio.create_task(self.handle_messages(framer, lines))
                     clear_urls_task = asyncio.create_task(self.clear_urls())
                     response_handler = asyncio.create_task(self.send_responses_worker())
 
                     # Wait for either of the tasks to finish
                     done, pending = await asyncio.wait(
-                        [keep_alive_task, handle_messages_task, clear_urls_task, response_handler],
+                        [keep_alive_task, handle_messages_task, clear_urls_task, response_handler, self.writer_task],
                         return_when=asyncio.FIRST_COMPLETED
                     )
 
+                    # Give the writer a chance to push out anything still queued
+                    if self.writer_task in pending:
+                        await self.outbound.flush()
+
                     # Cancel the remaining tasks
                     for task in pending:
                         task.cancel()
@@ -1262,19 +1243,21 @@ class IRCBot:
                     # Wait for the canceled tasks to finish
                     await asyncio.gather(*pending, return_exceptions=True)
 
-                    if disconnect_requested == True:
+                    if self.disconnect_requested == True:
                         break
 
                 except (ConnectionError, OSError):
                     e = "Error In main_loop: Connection lost. Reconnecting..."
                     print(e)
                     self.error_log(e)
-                    await asyncio.sleep(270)
                 finally:
-                    self.save_message_queue()
-                    self.save_last_seen()
+                    await self.tasks.cancel_all()
+                    self.save_state()
                     await self.disconnect()
 
+                self.reconnect.lost()
+                await self.reconnect.wait()
+
         except KeyboardInterrupt:
             print("KeyboardInterrupt received. Shutting down...")
         except Exception as e:
@@ -1289,7 +1272,7 @@ class IRCBot:
             log_entry = f"{now}: Nickname Error: {e}\n"
 
         # Append the log entry to the file
-        with open("error_log.txt", "a") as log_file:
+        with open(self.data_path("error_log.txt"), "a") as log_file:
             log_file.write(log_entry)
 
     async def start(self):
@@ -1300,6 +1283,23 @@ class NameInUseError(ConnectionError):
     pass
 
 
+async def run_networks(bots):
+    # Each network keeps its own connection and tasks, all on one event loop
+    await asyncio.gather(*(bot.start() for bot in bots))
+
+
 if __name__ == "__main__":
-    bot = IRCBot.from_config_file("bot_config.ini")
-    asyncio.run(bot.start())
+    # One .ini per network, e.g. python Clov3r_async.py libera.ini oftc.ini
+    config_files = sys.argv[1:] or ["bot_config.ini"]
+    services = SharedServices()
+    bots = [IRCBot.from_config_file(config_file, services=services) for config_file in config_files]
+    install_event_loop(bots[0].use_uvloop)
+    persistence.install_signal_handlers()
+    try:
+        asyncio.run(run_networks(bots))
+    finally:
+        persistence.flush_now()
+        for bot in bots:
+            bot.message_log.close()
+        # Drop queued upstream calls, so exit only waits on the ones already running
+        executors.shutdown()
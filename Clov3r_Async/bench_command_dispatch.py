@@ -0,0 +1,174 @@
+"""Messages/s through the per-message feature checks and user_commands, old match dispatch vs CommandRegistry."""
+import asyncio
+import builtins
+import json
+import random
+import time
+import types
+from Clov3r_async import IRCBot
+from task_supervisor import TaskSupervisor
+from rate_limit import RateLimiter
+
+MESSAGE_COUNT = 50000
+ADMIN = 'Irish!~Irish@user/irish'
+
+
+async def legacy_handle_channel_features(self, channel, command):
+    if channel in self.channels_features and command in self.channels_features[channel]:
+        return True
+    return False
+
+
+async def legacy_user_commands(self, sender, channel, content, hostmask):
+    # The old dispatch shape: every arm tried in order, admin and non-admin branches duplicated
+    print(f"Sender: {sender}")
+    print(f"Channel: {channel}")
+    print(f"Content: {content}")
+    print(f"Full Hostmask: {hostmask}")
+    if not content.strip():
+        return
+    if sender in self.active_quotes:
+        self.active_quotes[sender][1].append(content)
+    if content and content.startswith(('s', 'S')):
+        if await legacy_handle_channel_features(self, channel, '.sed'):
+            return
+    else:
+        if content:
+            if sender in self.last_command_time:
+                time_elapsed = time.time() - self.last_command_time[sender]
+                if time_elapsed < self.MIN_COMMAND_INTERVAL:
+                    return
+            command = content.split()[0].strip()
+            args = content[len(command):].strip()
+            if await legacy_handle_channel_features(self, channel, command):
+                match command:
+                    case '.ping':
+                        if hostmask in self.admin_list:
+                            await self.send(f"PRIVMSG {channel} :[\x0303Ping\x03] {sender}: PNOG!")
+                        else:
+                            self.last_command_time[sender] = time.time()
+                            await self.send(f"PRIVMSG {channel} :[\x0303Ping\x03] {sender}: PNOG!")
+                    case '.yt' | '.tr' | '.g' | '.ddg' | '.quote' | '.endquote' | '.color' | '.weather':
+                        pass
+                    case '.roll':
+                        if hostmask in self.admin_list:
+                            await self.dice_roll(args, channel, sender)
+                        else:
+                            self.last_command_time[sender] = time.time()
+                            await self.dice_roll(args, channel, sender)
+                    case '.fact' | '.tell' | '.info':
+                        pass
+                    case '.moo':
+                        if hostmask in self.admin_list:
+                            await self.send(f'PRIVMSG {channel} :Hi cow!\r\n')
+                        else:
+                            self.last_command_time[sender] = time.time()
+                            await self.send(f'PRIVMSG {channel} :Hi cow!\r\n')
+                    case '.moof' | '.topic' | '.help' | '.seen' | '.last':
+                        pass
+                    case '.version':
+                        if hostmask in self.admin_list:
+                            await self.send(f"PRIVMSG {channel} :Clov3rBot Version 6.66666")
+                        else:
+                            self.last_command_time[sender] = time.time()
+                            await self.send(f"PRIVMSG {channel} :Clov3rBot Version 6.66666")
+                    case '.rollover':
+                        pass
+                    case '.stats':
+                        if hostmask in self.admin_list:
+                            await self.stats_command(channel, sender, content)
+                        else:
+                            self.last_command_time[sender] = time.time()
+                            await self.stats_command(channel, sender, content)
+                    case '.bug':
+                        pass
+                    case '.factadd' if hostmask in self.admin_list:
+                        pass
+                    case '.quit' if hostmask in self.admin_list:
+                        pass
+                    case '.op' if hostmask in self.admin_list:
+                        await self.send(f"MODE {channel} +o {sender}\r\n")
+                    case '.deop' if hostmask in self.admin_list:
+                        await self.send(f"MODE {channel} -o {sender}\r\n")
+                    case '.botop' | '.join' | '.part' | '.reload' | '.purge' if hostmask in self.admin_list:
+                        pass
+
+
+async def legacy_message(bot, sender, channel, content, hostmask):
+    if await legacy_handle_channel_features(bot, channel, '.record'.strip().lstrip()):
+        pass
+    if await legacy_handle_channel_features(bot, channel, '.usercommands'.strip().lstrip()):
+        await legacy_user_commands(bot, sender, channel, content, hostmask)
+    if await legacy_handle_channel_features(bot, channel, '.urlparse'.strip().lstrip()):
+        pass
+    if await legacy_handle_channel_features(bot, channel, '.redditparse'.strip().lstrip()):
+        pass
+
+
+async def registry_message(bot, sender, channel, content, hostmask):
+    features = bot.commands.features_for(channel)
+    if '.record' in features:
+        pass
+    if '.usercommands' in features:
+        await bot.user_commands(sender, channel, content, hostmask)
+    if '.urlparse' in features:
+        pass
+    if '.redditparse' in features:
+        pass
+
+
+def build_stream():
+    # Mostly chatter, the odd command (some disabled or unknown), admin commands from the admin and from others
+    random.seed(3)
+    commands = ['.ping', '.moo', '.version', '.roll 2d6', '.stats someone', '.op', '.deop', '.nosuch', '.weather']
+    chatter = ['hello there', 'anyone around?', 'that build broke again', 'lol', 'Sure, in a minute', 'brb']
+    stream = []
+    for i in range(MESSAGE_COUNT):
+        sender = f"user{random.randint(0, 20000)}"
+        hostmask = ADMIN if random.random() < 0.02 else f"{sender}!~{sender}@host"
+        channel = '#irish' if random.random() < 0.9 else '#other'
+        content = random.choice(commands) if random.random() < 0.2 else random.choice(chatter)
+        stream.append((sender, channel, content, hostmask))
+    return stream
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+async def main():
+    with open('channels_features.json') as f:
+        features = json.load(f)
+    features['#irish'] += ['.stats', '.weather']
+    bot = IRCBot('bench', ['#irish', '#other'], '127.0.0.1', admin_list=[ADMIN], channels_features=features,
+                 services=types.SimpleNamespace(search=None, titlescrape=None))
+    # Measure dispatch, not the network or the terminal
+    bot.send = noop
+    bot.response_queue = types.SimpleNamespace(put=noop)
+    # Commands now run as tasks; no caps here so every one is run and timed
+    bot.tasks = TaskSupervisor(max_tasks=MESSAGE_COUNT, per_user=MESSAGE_COUNT)
+    # The flat per nick interval the old dispatch checked
+    bot.last_command_time = {}
+    bot.MIN_COMMAND_INTERVAL = 5
+    stream = build_stream()
+    print(f"{MESSAGE_COUNT} messages, about 20% commands, print() silenced for both")
+    for name, handler in (("match + list check", legacy_message), ("CommandRegistry", registry_message)):
+        real_print = builtins.print
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            # Best of a few runs, the box is noisy
+            elapsed = float('inf')
+            for _ in range(5):
+                bot.last_command_time.clear()
+                bot.rate_limits = RateLimiter()
+                start = time.perf_counter()
+                for sender, channel, content, hostmask in stream:
+                    await handler(bot, sender, channel, content, hostmask)
+                await asyncio.gather(*bot.tasks.running)
+                elapsed = min(elapsed, time.perf_counter() - start)
+        finally:
+            builtins.print = real_print
+        print(f"{name:<20} {len(stream) / elapsed:10.0f} messages/s")
+
+if __name__ == '__main__':
+    asyncio.run(main())
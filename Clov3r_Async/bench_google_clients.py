@@ -0,0 +1,47 @@
+"""Cost of the YouTube API clients: the old build() in every constructor vs the shared, lazily built client."""
+import subprocess
+import sys
+import time
+from googleapiclient.discovery import build
+from google_clients import youtube_client, clients
+
+# A non empty key, an empty one makes the old build() go looking for default credentials
+KEY = 'bench'
+RUNS = 20
+
+COLD = {
+    # Googlesearch and Titlescraper each built their own client
+    "old constructors": "from googleapiclient.discovery import build; build('youtube', 'v3', developerKey='bench'); build('youtube', 'v3', developerKey='bench')",
+    # The key as shipped is empty; build() then probes for default credentials and raises when it finds none
+    "old, empty key": "from googleapiclient.discovery import build\ntry:\n    build('youtube', 'v3', developerKey='')\nexcept Exception:\n    pass",
+    "new constructors": "google_api.Googlesearch(); title_scrape.Titlescraper()",
+    "new first lookup": "from google_clients import youtube_client; youtube_client('bench').videos().list(part='snippet', id='x')",
+}
+
+
+def cold(code):
+    # A fresh interpreter each time, the imports are timed separately so only the client work is left
+    script = f"import time, google_api, title_scrape\nstart = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)"
+    best = min(float(subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout) for _ in range(3))
+    return best * 1000
+
+
+def per_call(func):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        func()
+    return (time.perf_counter() - start) / RUNS * 1000
+
+
+def main():
+    print("Cold start, best of 3 fresh processes")
+    for label, code in COLD.items():
+        print(f"  {label:<18} {cold(code):8.2f} ms")
+    print(f"Per URL, mean of {RUNS} (the old Titlescraper() per message built a client each time)")
+    print(f"  {'build() per URL':<18} {per_call(lambda: build('youtube', 'v3', developerKey=KEY)):8.2f} ms")
+    clients.clear()
+    youtube_client(KEY)
+    print(f"  {'shared client':<18} {per_call(lambda: youtube_client(KEY)) * 1000:8.2f} us")
+
+if __name__ == '__main__':
+    main()
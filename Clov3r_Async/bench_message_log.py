@@ -0,0 +1,57 @@
+"""Cost of keeping channel history on disk: rewriting messages.json per message vs appending to the segmented log, and loading each back."""
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from message_log import MessageLog
+
+CHANNELS = 20
+MESSAGES = 2000
+
+
+def message(i):
+    return {"timestamp": 1700000000 + i, "sender": f"user{i % 50}", "content": f"message number {i} with a bit of chatter in it"}
+
+
+def rewrite(directory):
+    last_messages = {f"#chan{c}": deque((message(i) for i in range(200)), maxlen=200) for c in range(CHANNELS)}
+    filename = os.path.join(directory, "messages.json")
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        last_messages[f"#chan{i % CHANNELS}"].append(message(i))
+        # What save_last_messages did on every PRIVMSG
+        with open(filename, 'w') as file:
+            json.dump({channel: list(messages) for channel, messages in last_messages.items()}, file, indent=2)
+    per_message = (time.perf_counter() - start) / MESSAGES * 1e6
+    start = time.perf_counter()
+    with open(filename, 'r') as file:
+        json.load(file)
+    return per_message, (time.perf_counter() - start) * 1000
+
+
+def append(directory):
+    log = MessageLog(os.path.join(directory, 'history'))
+    for c in range(CHANNELS):
+        for i in range(200):
+            log.append(f"#chan{c}", message(i))
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        log.append(f"#chan{i % CHANNELS}", message(i))
+    per_message = (time.perf_counter() - start) / MESSAGES * 1e6
+    log.close()
+    start = time.perf_counter()
+    history = MessageLog(os.path.join(directory, 'history')).replay()
+    assert all(len(messages) == 200 for messages in history.values())
+    return per_message, (time.perf_counter() - start) * 1000
+
+
+def main():
+    print(f"{CHANNELS} channels of 200 messages, {MESSAGES} more messages")
+    for label, run in (("rewrite json", rewrite), ("append log", append)):
+        with tempfile.TemporaryDirectory() as directory:
+            per_message, load = run(directory)
+        print(f"{label:<13} {per_message:9.1f} us/message, startup load {load:6.1f} ms")
+
+if __name__ == '__main__':
+    main()
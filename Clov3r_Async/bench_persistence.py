@@ -0,0 +1,65 @@
+"""Per message cost of saving last_seen.json: writing it on every message vs marking it for the write behind flusher."""
+import asyncio
+import builtins
+import json
+import tempfile
+import time
+import types
+from Clov3r_async import IRCBot
+from persistence import persistence
+from executors import executors
+
+USERS = 5000
+MESSAGES = 2000
+
+
+def save_directly(bot):
+    # What each save did before: the whole file rewritten in place
+    with open(bot.data_path("last_seen.json"), "w") as file:
+        json.dump(bot.last_seen, file, indent=2)
+
+
+async def run(data_dir, write_behind):
+    with open('channels_features.json') as f:
+        features = json.load(f)
+    bot = IRCBot('bench', ['#irish'], '127.0.0.1', channels_features=features, data_dir=data_dir,
+                 services=types.SimpleNamespace(search=None, titlescrape=None))
+    for i in range(USERS):
+        await bot.record_last_seen(f"user{i}", '#irish', f"message {i}")
+    persistence.flush_now()
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        sender = f"user{i * 7 % USERS}"
+        await bot.record_last_seen(sender, '#irish', f"hello {i}")
+        if write_behind:
+            bot.save_last_seen()
+        else:
+            save_directly(bot)
+        # Give the flusher its turns, as the read loop would between lines
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    if not write_behind:
+        return elapsed / MESSAGES * 1e6, MESSAGES
+    await persistence.flush()
+    return elapsed / MESSAGES * 1e6, executors.sites['disk:write'].calls
+
+
+async def main():
+    # A short interval so the run covers many flushes
+    persistence.interval = 0.05
+    print(f"{USERS} nicks in last_seen, {MESSAGES} messages, flush every {persistence.interval * 1000:.0f}ms")
+    real_print = builtins.print
+    results = []
+    for label, write_behind in (("every message", False), ("write behind", True)):
+        with tempfile.TemporaryDirectory() as data_dir:
+            builtins.print = lambda *args, **kwargs: None
+            try:
+                results.append((label, *await run(data_dir, write_behind)))
+            finally:
+                builtins.print = real_print
+    for label, per_message, writes in results:
+        print(f"{label:<14} {per_message:9.1f} us/message on the loop, {writes} file writes")
+    executors.shutdown()
+
+if __name__ == '__main__':
+    asyncio.run(main())
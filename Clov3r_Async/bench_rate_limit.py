@@ -0,0 +1,60 @@
+"""Memory and calls/s of the per user limit with many distinct nicks: the old last_command_time dict vs RateLimiter."""
+import random
+import time
+import tracemalloc
+from rate_limit import RateLimiter, LIMIT_API, LIMIT_CHEAP, LIMIT_DEFAULT
+
+COMMAND_COUNT = 200000
+NICKS = 100000
+MIN_COMMAND_INTERVAL = 5
+
+
+def build_stream():
+    # A busy network: many one-off nicks, a handful of channels, mostly cheap commands
+    random.seed(5)
+    classes = [LIMIT_CHEAP] * 6 + [LIMIT_DEFAULT] * 3 + [LIMIT_API]
+    return [(random.choice(classes), f"user{random.randrange(NICKS)}", f"#chan{random.randrange(20)}") for _ in range(COMMAND_COUNT)]
+
+
+def legacy(stream):
+    last_command_time = {}
+    allowed = 0
+    for _, sender, _ in stream:
+        if sender in last_command_time and time.time() - last_command_time[sender] < MIN_COMMAND_INTERVAL:
+            continue
+        last_command_time[sender] = time.time()
+        allowed += 1
+    return last_command_time, allowed
+
+
+def limited(stream):
+    limiter = RateLimiter(max_entries=5000)
+    # Channel and global budgets off, so both sides only do the per user check
+    for scopes in limiter.limits.values():
+        scopes.pop('channel')
+        scopes.pop('global')
+    allowed = 0
+    for name, sender, channel in stream:
+        allowed += limiter.allow(name, sender, channel)
+    return limiter, allowed
+
+
+def main():
+    stream = build_stream()
+    print(f"{COMMAND_COUNT} commands from {NICKS} nicks")
+    for label, run in (("last_command_time", legacy), ("RateLimiter", limited)):
+        start = time.perf_counter()
+        state, allowed = run(stream)
+        elapsed = time.perf_counter() - start
+        del state
+        # Timed and measured on separate runs, tracemalloc slows every allocation down
+        tracemalloc.start()
+        state, allowed = run(stream)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        entries = len(state) if isinstance(state, dict) else len(state.buckets['user'])
+        print(f"{label:<18} {COMMAND_COUNT / elapsed:9.0f} calls/s  {entries:7d} entries kept  {current / 1024:8.0f} KiB held  {allowed} allowed")
+        del state
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Per message cost of keeping last_seen and the tell queue: rewriting the JSON files vs the SQLite state store."""
+import asyncio
+import builtins
+import json
+import tempfile
+import time
+import types
+from Clov3r_async import IRCBot
+
+USERS = 5000
+MESSAGES = 2000
+
+
+async def run(data_dir, state_db):
+    with open('channels_features.json') as f:
+        features = json.load(f)
+    bot = IRCBot('bench', ['#irish'], '127.0.0.1', channels_features=features, data_dir=data_dir, state_db=state_db,
+                 services=types.SimpleNamespace(search=None, titlescrape=None))
+    # A network that has been up a while: thousands of nicks already seen
+    for i in range(USERS):
+        await bot.record_last_seen(f"user{i}", '#irish', f"message {i}")
+    bot.save_state()
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        # What every message in a .record channel costs: the last seen update, its save, and the check for waiting tells
+        sender = f"user{i * 7 % USERS}"
+        await bot.record_last_seen(sender, '#irish', f"hello {i}")
+        if not bot.store:
+            bot.save_last_seen()
+        await bot.send_saved_messages(sender, '#irish')
+    return (time.perf_counter() - start) / MESSAGES * 1e6
+
+
+async def main():
+    print(f"{USERS} nicks in last_seen, {MESSAGES} messages")
+    real_print = builtins.print
+    results = []
+    for label, state_db in (("JSON files", ''), ("SQLite store", 'state.db')):
+        with tempfile.TemporaryDirectory() as data_dir:
+            builtins.print = lambda *args, **kwargs: None
+            try:
+                per_message = await run(data_dir, state_db)
+            finally:
+                builtins.print = real_print
+            results.append((label, per_message))
+    for label, per_message in results:
+        print(f"{label:<14} {per_message:9.1f} us/message")
+
+if __name__ == '__main__':
+    asyncio.run(main())
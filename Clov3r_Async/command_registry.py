@@ -0,0 +1,53 @@
+import inspect
+from rate_limit import LIMIT_DEFAULT
+
+# How a handler's return value reaches IRC
+OUTPUT_NONE = 0      # the handler sends its own lines
+OUTPUT_QUEUE = 1     # text for the paced response queue
+OUTPUT_LINE = 2      # a complete IRC line
+OUTPUT_PRIVMSG = 3   # text sent straight to the channel
+
+NO_FEATURES = frozenset()
+
+
+class Command:
+    __slots__ = ('handler', 'admin', 'limit', 'output', 'priority')
+
+    def __init__(self, handler, admin=False, limit=LIMIT_DEFAULT, output=OUTPUT_NONE, priority=None):
+        # handler(sender, channel, args, content, hostmask), sync or async; limit is the rate limit class, None for no limit
+        self.handler = handler
+        self.admin = admin
+        self.limit = limit
+        self.output = output
+        self.priority = priority
+
+
+class CommandRegistry:
+    """Commands keyed by verb, and each channel's enabled features as a frozenset built when the features load."""
+
+    def __init__(self, commands=None, channels_features=None):
+        self.commands = dict(commands or {})
+        self.features = {}
+        self.load_features(channels_features or {})
+
+    def load_features(self, channels_features):
+        self.features = {channel: frozenset(features) for channel, features in channels_features.items()}
+
+    def features_for(self, channel):
+        return self.features.get(channel, NO_FEATURES)
+
+    def enabled(self, channel, feature):
+        return feature in self.features.get(channel, NO_FEATURES)
+
+    def lookup(self, channel, verb):
+        command = self.commands.get(verb)
+        if command is None or verb not in self.features.get(channel, NO_FEATURES):
+            return None
+        return command
+
+    @staticmethod
+    async def run(command, sender, channel, args, content, hostmask):
+        response = command.handler(sender, channel, args, content, hostmask)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
@@ -0,0 +1,23 @@
+import asyncio
+import configparser
+
+
+def uvloop_enabled(config_file='bot_config.ini'):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return config.getboolean('BotConfig', 'use_uvloop', fallback=False)
+
+
+def install_event_loop(use_uvloop=False):
+    """Installs uvloop's event loop policy when asked for and importable, returns the name of the loop in use."""
+    if not use_uvloop:
+        return 'asyncio'
+    try:
+        import uvloop
+    except ImportError:
+        # uvloop has no Windows build, so this is the normal path there
+        print("uvloop is not installed, using the default asyncio event loop.")
+        return 'asyncio'
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    print("Using the uvloop event loop.")
+    return 'uvloop'
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import deque
+
+# Lower numbers are served first. Protocol traffic also skips the token wait so the bot never pings out.
+PRIORITY_PROTOCOL = 0
+PRIORITY_ADMIN = 1
+PRIORITY_INTERACTIVE = 2
+PRIORITY_BULK = 3
+
+PROTOCOL_VERBS = {'PONG', 'PING', 'CAP', 'AUTHENTICATE', 'NICK', 'USER', 'PASS', 'QUIT'}
+ADMIN_VERBS = {'MODE', 'JOIN', 'PART', 'KICK', 'INVITE', 'TOPIC'}
+
+
+class TokenBucket:
+    """Token bucket modelled on the server's flood limits: a burst allowance plus a steady refill rate."""
+
+    __slots__ = ('burst', 'rate', 'tokens', 'stamp')
+
+    def __init__(self, burst=5, rate=2.0):
+        self.configure(burst, rate)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+
+    def configure(self, burst, rate):
+        self.burst = max(1, int(burst))
+        self.rate = max(0.01, float(rate))
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self):
+        # Seconds until a whole token is available, 0 if one can be taken right now
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.refill()
+        self.tokens -= 1
+
+
+class Lane:
+    """One priority class: a queue per target plus the round-robin order of targets with work."""
+
+    def __init__(self):
+        self.queues = {}
+        self.ready = deque()
+
+    def append(self, target, line):
+        queue = self.queues.get(target)
+        if queue is None:
+            queue = self.queues[target] = deque()
+            self.ready.append(target)
+        queue.append(line)
+
+    def popleft(self):
+        # Take one line from the target at the head of the rotation and send that target to the back
+        target = self.ready.popleft()
+        queue = self.queues[target]
+        line = queue.popleft()
+        if queue:
+            self.ready.append(target)
+        else:
+            del self.queues[target]
+        return line
+
+
+class OutboundScheduler:
+    """Paces every outbound line through one token bucket, by priority lane and round-robin per target."""
+
+    def __init__(self, out, burst=5, rate=2.0, max_pending=1000, slow_lag=5.0):
+        self.out = out
+        self.lag = 0.0
+        self.slow_lag = slow_lag
+        self.bucket = TokenBucket(burst, rate)
+        self.max_pending = max_pending
+        self.lanes = [Lane() for _ in range(PRIORITY_BULK + 1)]
+        self.pending = 0
+        self.has_data = asyncio.Event()
+        self.has_room = asyncio.Event()
+        self.has_room.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @staticmethod
+    def target_of(line):
+        # PRIVMSG/NOTICE lines are queued per target, everything else shares the server queue
+        if line.startswith(('PRIVMSG ', 'NOTICE ')):
+            parts = line.split(' ', 2)
+            if len(parts) > 1:
+                return parts[1].lower()
+        return ''
+
+    @staticmethod
+    def priority_of(line):
+        verb = line.split(' ', 1)[0].upper()
+        if verb in PROTOCOL_VERBS:
+            return PRIORITY_PROTOCOL
+        if verb in ADMIN_VERBS:
+            return PRIORITY_ADMIN
+        return PRIORITY_INTERACTIVE
+
+    @property
+    def queue_depth(self):
+        return self.pending
+
+    async def submit(self, line, priority=None):
+        if priority is None:
+            priority = self.priority_of(line)
+
+        # Protocol replies never wait behind a full queue
+        while priority != PRIORITY_PROTOCOL and self.pending >= self.max_pending and not self.out.closed:
+            self.has_room.clear()
+            await self.has_room.wait()
+
+        self.lanes[priority].append(self.target_of(line), line)
+        self.pending += 1
+        self.idle.clear()
+        self.has_data.set()
+
+    def set_lag(self, lag):
+        # A lagging server is still chewing on what we sent, so bulk output waits for it to catch up
+        was_slow = self.lag >= self.slow_lag
+        self.lag = lag
+        if was_slow and lag < self.slow_lag:
+            self.has_data.set()
+
+    def next_lane(self):
+        for priority, lane in enumerate(self.lanes):
+            if priority == PRIORITY_BULK and self.lag >= self.slow_lag:
+                break
+            if lane.ready:
+                return priority, lane
+        return None, None
+
+    async def pump(self):
+        while True:
+            priority, lane = self.next_lane()
+            if lane is None:
+                if not self.pending:
+                    self.idle.set()
+                self.has_data.clear()
+                await self.has_data.wait()
+                continue
+
+            if priority != PRIORITY_PROTOCOL:
+                wait = self.bucket.delay()
+                if wait:
+                    # Sleep until a token is due or higher priority work arrives, whichever is first
+                    self.has_data.clear()
+                    try:
+                        await asyncio.wait_for(self.has_data.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            # Protocol lines still spend a token (the server counts them too) but may run the bucket into debt
+            self.bucket.take()
+            line = lane.popleft()
+            self.pending -= 1
+            if self.pending < self.max_pending:
+                self.has_room.set()
+            await self.out.write_line(line)
+
+    async def run(self):
+        # The scheduler and the writer live and die together
+        tasks = [asyncio.create_task(self.out.run()), asyncio.create_task(self.pump())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.idle.set()
+
+    async def flush(self, timeout=5):
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Timed out with {self.pending} lines still scheduled")
+        await self.out.flush(timeout)
+
+    def stats(self):
+        lanes = '/'.join(str(sum(len(queue) for queue in lane.queues.values())) for lane in self.lanes)
+        return f"scheduled={self.pending} lanes={lanes} tokens={self.bucket.tokens:.1f} lag={self.lag:.3f} {self.out.stats()}"
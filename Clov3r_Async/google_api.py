@@ -2,19 +2,24 @@ import requests
 import json
 import os
 import hashlib
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_clients import youtube_client
 from datetime import datetime, timedelta
 
 class Googlesearch:
-    def __init__(self, count_file='search_count.txt'):
+    def __init__(self, count_file='search_count.txt', session=None):
+        self.session = session or requests.Session()
         self.api_key = "" # This is the API key needed, usually provided by Google.
         self.youtube_api_key = ""
         self.bot_id = "" # This is the search engine ID from your google console
         self.count_file = count_file
         self.safe_search = "active"
         self.search_count = self.load_search_count()
-        self.youtube_service = build('youtube', 'v3', developerKey=self.youtube_api_key)
+
+    @property
+    def youtube_service(self):
+        # Built on first use and shared with everything else in the process that talks to YouTube
+        return youtube_client(self.youtube_api_key)
 
     def load_search_count(self):
         """Load the search count from a file."""
@@ -62,7 +67,7 @@ class Googlesearch:
                 data = json.load(f)
         else:
             print("Fetching new data...")
-            response = requests.get(f"https://www.googleapis.com/customsearch/v1?key={self.api_key}&cx={self.bot_id}&q={query}&safe={self.safe_search}")
+            response = self.session.get(f"https://www.googleapis.com/customsearch/v1?key={self.api_key}&cx={self.bot_id}&q={query}&safe={self.safe_search}")
             if response.status_code == 200:
                 self.search_count += 1
                 self.save_search_count()
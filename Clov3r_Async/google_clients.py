@@ -0,0 +1,41 @@
+import threading
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# API clients are built on first use and shared by every module in the process.
+# This module is left out of .remod so a reload does not throw them away.
+clients = {}
+clients_lock = threading.Lock()
+local = threading.local()
+
+
+def thread_http():
+    # httplib2.Http is not thread safe, so each executor thread keeps its own connection
+    http = getattr(local, 'http', None)
+    if http is None:
+        http = local.http = httplib2.Http(timeout=15)
+    return http
+
+
+def build_request(http, *args, **kwargs):
+    return HttpRequest(thread_http(), *args, **kwargs)
+
+
+def api_client(service, version, api_key):
+    """The shared client for a Google API, built from the discovery document that ships with googleapiclient."""
+    key = (service, version, api_key)
+    client = clients.get(key)
+    if client is None:
+        with clients_lock:
+            client = clients.get(key)
+            if client is None:
+                # Passing http skips the default credentials lookup, which stalls for seconds off Google Cloud
+                client = build(service, version, developerKey=api_key, http=thread_http(), requestBuilder=build_request,
+                               static_discovery=True, cache_discovery=False)
+                clients[key] = client
+    return client
+
+
+def youtube_client(api_key):
+    return api_client('youtube', 'v3', api_key)
@@ -50,7 +50,7 @@ def get_detailed_help(command):
         ".bug": "Usage .bug <bug_id>, Gives bug information from bugs.gentoo.org API. Extra arguments: change & creation example: .bug <bug_id> <argument>",
         ".quote": "starts recording a quote, .quote <number> to call a quote by tag number",
         ".endquote": "ends quote recording and saves quote",
-        ".admin": ".factadd - .quit - .join - .part - .op - .deop - .botop - .reload - .purge",
+        ".admin": ".factadd - .quit - .join - .part - .op - .deop - .botop - .reload - .purge - .lag - .upstreams - .limits",
     }
 
     return help_dict.get(command, f"No detailed help available for {command}.")
\ No newline at end of file
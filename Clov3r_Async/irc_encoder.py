@@ -0,0 +1,107 @@
+import html
+import re
+
+MAX_LINE_BYTES = 512
+# Ends the last line of a reply that was cut short
+ELLIPSIS = '\u2026'.encode('utf-8')
+# Formatting codes that are allowed through: CTCP, bold, colour, reset, reverse, italic, strikethrough, underline
+ALLOWED_CONTROLS = '\x01\x02\x03\x0F\x16\x1D\x1E\x1F'
+STRIP_TABLE = {code: None for code in range(32) if chr(code) not in ALLOWED_CONTROLS}
+STRIP_TABLE[127] = None
+CONTROL_REGEX = re.compile('[' + ''.join(re.escape(chr(code)) for code in STRIP_TABLE) + ']')
+
+
+def sanitize(text):
+    # Most lines carry no entities and no control characters, so both passes are skipped when possible
+    if '&' in text:
+        text = html.unescape(text)
+    if CONTROL_REGEX.search(text) is None:
+        return text
+    return text.translate(STRIP_TABLE)
+
+
+def split_utf8(data, limit):
+    """Splits encoded bytes into chunks of at most limit bytes without cutting a character in half."""
+    chunks = []
+    while len(data) > limit:
+        cut = limit
+        # Step back over UTF-8 continuation bytes (10xxxxxx)
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        # Prefer breaking on a space when one is reasonably close to the limit
+        space = data.rfind(b' ', 0, cut + 1)
+        if space > limit * 2 // 3:
+            chunks.append(data[:space])
+            data = data[space + 1:]
+        else:
+            chunks.append(data[:cut])
+            data = data[cut:]
+    if data:
+        chunks.append(data)
+    return chunks
+
+
+class LineEncoder:
+    """Sanitizes outbound lines and splits PRIVMSG/NOTICE payloads to fit the 512 byte line limit.
+
+    A payload that needs more than max_lines lines is cut after max_lines, with the last line ending in an ellipsis."""
+
+    def __init__(self, nickname, max_lines=5):
+        self.max_lines = max_lines
+        self.prefix_budget = {}
+        self.set_nickname(nickname)
+
+    def set_nickname(self, nickname):
+        # Relayed lines gain ":nick!~user@host " (user up to 10, host up to 63) plus the trailing CRLF
+        self.source_reserve = len((nickname or '').encode('utf-8')) + 78
+        self.prefix_budget.clear()
+
+    def budget(self, verb, target):
+        # Payload bytes left once the "PRIVMSG target :" prefix and the relayed source are paid for
+        key = (verb, target)
+        budget = self.prefix_budget.get(key)
+        if budget is None:
+            prefix_cost = len(f"{verb} {target} :".encode('utf-8'))
+            budget = self.prefix_budget[key] = max(64, MAX_LINE_BYTES - self.source_reserve - prefix_cost)
+        return budget
+
+    def encode(self, message):
+        line = sanitize(message)
+        if not line.startswith(('PRIVMSG ', 'NOTICE ')):
+            return [line]
+
+        verb, target, payload = self.split_line(line)
+        if payload is None:
+            return [line]
+
+        budget = self.budget(verb, target)
+        # Cheap check first: no string of this many characters can exceed the budget in UTF-8
+        if len(payload) * 4 <= budget:
+            return [line]
+        data = payload.encode('utf-8')
+        if len(data) <= budget:
+            return [line]
+
+        # Keep CTCP ACTIONs intact by wrapping every chunk in its own \x01ACTION ...\x01
+        wrapper = ('', '')
+        if payload.startswith('\x01ACTION ') and payload.endswith('\x01'):
+            wrapper = ('\x01ACTION ', '\x01')
+            data = payload[8:-1].encode('utf-8')
+            budget -= 9
+
+        chunks = split_utf8(data, budget)
+        if len(chunks) > self.max_lines:
+            dropped = sum(len(chunk) for chunk in chunks[self.max_lines:])
+            print(f"Cut a reply to {target} at {self.max_lines} lines, dropping {dropped} bytes")
+            chunks = chunks[:self.max_lines]
+            # Make room for the ellipsis so the cut shows in the channel
+            chunks[-1] = split_utf8(chunks[-1], budget - len(ELLIPSIS))[0] + ELLIPSIS
+        return [f"{verb} {target} :{wrapper[0]}{chunk.decode('utf-8')}{wrapper[1]}" for chunk in chunks]
+
+    @staticmethod
+    def split_line(line):
+        verb, _, rest = line.partition(' ')
+        target, separator, payload = rest.partition(' :')
+        if not separator:
+            return verb, target, None
+        return verb, target, payload
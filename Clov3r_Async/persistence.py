@@ -0,0 +1,202 @@
+import asyncio
+import configparser
+import contextlib
+import json
+import os
+import signal
+import tempfile
+import threading
+from executors import run_blocking
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def write_atomic(path, text, fsync=False):
+    """Writes text to a temp file next to path and renames it over path, so a crash leaves the old file or the new one, never half of one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        if os.path.exists(path):
+            # mkstemp makes the file private, keep whatever the old one had
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # The rename is only on disk once the directory is
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def read_json(path, default):
+    # A missing file reads as default; a corrupt one raises rather than being written over
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on path.lock for as long as the block runs, shared by every process that rewrites path."""
+    with open(f"{path}.lock", 'a+') as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class WriteBehind:
+    """Saves mark a file dirty; each dirty file is written once per flush, every interval seconds or as soon as threshold saves pile up."""
+
+    def __init__(self, interval=5.0, threshold=100, fsync=False):
+        self.interval = interval
+        self.threshold = threshold
+        self.fsync = fsync
+        # path -> (sequence, render), render returns the file's text and is only called when the file is written
+        self.dirty = {}
+        self.sequence = 0
+        self.changes = 0
+        # Highest sequence on disk per path, so an older write finishing late can't replace a newer one
+        self.written = {}
+        # Reentrant, the SIGTERM handler flushes on the main thread and may land while it is already inside write()
+        self.write_lock = threading.RLock()
+        self.flusher = None
+        self.wake = None
+
+    def load_settings(self, config_file='bot_config.ini'):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        self.interval = config.getfloat('BotConfig', 'flush_interval', fallback=self.interval)
+        self.threshold = config.getint('BotConfig', 'flush_threshold', fallback=self.threshold)
+        self.fsync = config.getboolean('BotConfig', 'flush_fsync', fallback=self.fsync)
+
+    def mark(self, path, render):
+        self.sequence += 1
+        self.dirty[path] = (self.sequence, render)
+        self.changes += 1
+        self.start()
+        if self.changes >= self.threshold and self.wake:
+            self.wake.set()
+
+    def update_locked(self, path, load, change, render):
+        with file_lock(path):
+            data = load()
+            result = change(data)
+            # A change that finds nothing to do returns something falsy and the file is left alone
+            if result:
+                write_atomic(path, render(data), self.fsync)
+        return data, result
+
+    async def update(self, path, load, change, render):
+        """Rereads path, applies change and writes it back under path's lock file, for a file several processes change."""
+        # On the disk thread, so load and change may only touch the data they are given; None if it failed, else (data, change's result)
+        try:
+            return await run_blocking('disk', self.update_locked, path, load, change, render, site='disk:update')
+        except Exception as e:
+            print(f"Error updating {path}: {e}")
+            return None
+
+    def start(self):
+        # The first save made with a loop running starts the flusher; until then saves only pile up
+        if self.flusher is not None and not self.flusher.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.wake = asyncio.Event()
+        self.flusher = loop.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            await self.flush()
+
+    def write(self, path, sequence, text):
+        with self.write_lock:
+            if sequence <= self.written.get(path, 0):
+                return
+            write_atomic(path, text, self.fsync)
+            self.written[path] = sequence
+
+    def written_out(self, path, entry):
+        # Left dirty while it was written so settle still sees it; dropped unless it was saved again since
+        if self.dirty.get(path) is entry:
+            del self.dirty[path]
+
+    async def flush(self):
+        self.changes = 0
+        for path, entry in list(self.dirty.items()):
+            sequence, render = entry
+            try:
+                # Rendered here on the loop so nothing changes under json.dumps, written on the disk thread
+                text = render()
+                await run_blocking('disk', self.write, path, sequence, text, site='disk:write')
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+                continue
+            self.written_out(path, entry)
+
+    def flush_now(self):
+        """Writes everything still dirty from the calling thread, for shutdown when the loop may already be gone."""
+        self.changes = 0
+        for path in list(self.dirty):
+            self.settle(path)
+
+    def settle(self, path):
+        # A file about to be read back has to hold this process's own pending changes first
+        entry = self.dirty.get(path)
+        if entry is None:
+            return
+        sequence, render = entry
+        try:
+            self.write(path, sequence, render())
+        except Exception as e:
+            print(f"Error writing {path}: {e}")
+            return
+        self.written_out(path, entry)
+
+    def install_signal_handlers(self):
+        def handler(signum, frame):
+            self.flush_now()
+            raise SystemExit(128 + signum)
+
+        for name in ('SIGTERM', 'SIGHUP'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), handler)
+
+
+# One per process, shared by everything that saves a JSON or text file
+persistence = WriteBehind()
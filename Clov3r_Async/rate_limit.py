@@ -0,0 +1,107 @@
+import time
+from collections import Counter, OrderedDict
+from flood_control import TokenBucket
+
+# Command classes, so the API backed commands can be held to a tighter budget than .moo
+LIMIT_API = 'api'
+LIMIT_DEFAULT = 'default'
+LIMIT_CHEAP = 'cheap'
+
+SCOPES = ('user', 'channel', 'global')
+
+# class -> scope -> (burst, seconds to earn the whole burst back)
+RATE_LIMITS = {
+    LIMIT_API: {'user': (2, 60), 'channel': (4, 30), 'global': (10, 20)},
+    LIMIT_DEFAULT: {'user': (2, 10), 'channel': (8, 10), 'global': (30, 10)},
+    LIMIT_CHEAP: {'user': (4, 10), 'channel': (10, 10), 'global': (60, 10)},
+}
+
+
+def parse_limit(value):
+    # "2/60" is a burst of 2, refilled over 60 seconds
+    count, seconds = value.split('/', 1)
+    return int(count), float(seconds)
+
+
+class RateLimiter:
+    """Token buckets per user, per channel and for the whole bot, for each command class. Idle buckets are evicted so memory stays bounded."""
+
+    def __init__(self, limits=None, max_entries=5000, ttl=600.0):
+        self.limits = {name: dict(scopes) for name, scopes in RATE_LIMITS.items()}
+        for name, scopes in (limits or {}).items():
+            self.limits.setdefault(name, {}).update(scopes)
+        self.max_entries = max_entries
+        # A bucket left alone long enough is full again, the same as a new one, so dropping it changes nothing
+        refill = max(seconds for scopes in self.limits.values() for _, seconds in scopes.values())
+        self.ttl = max(ttl, refill)
+        # (class, key) -> TokenBucket, least recently used first
+        self.buckets = {'user': OrderedDict(), 'channel': OrderedDict()}
+        self.global_buckets = {}
+        self.counters = Counter()
+        self.evicted = 0
+
+    @classmethod
+    def from_config(cls, config):
+        # [RateLimits] entries look like api_user = 2/60
+        limits = {}
+        max_entries, ttl = 5000, 600.0
+        if config.has_section('RateLimits'):
+            section = config['RateLimits']
+            max_entries = section.getint('max_entries', max_entries)
+            ttl = section.getfloat('ttl', ttl)
+            for key, value in section.items():
+                name, _, scope = key.rpartition('_')
+                if scope not in SCOPES or not name:
+                    continue
+                try:
+                    limits.setdefault(name, {})[scope] = parse_limit(value)
+                except ValueError:
+                    print(f"Ignoring bad rate limit {key} = {value}")
+        return cls(limits, max_entries, ttl)
+
+    def bucket(self, scope, name, key, now):
+        burst, seconds = self.limits[name][scope]
+        if scope == 'global':
+            bucket = self.global_buckets.get(name)
+            if bucket is None:
+                bucket = self.global_buckets[name] = TokenBucket(burst, burst / seconds)
+            return bucket
+        table = self.buckets[scope]
+        bucket = table.get((name, key))
+        if bucket is None:
+            self.evict(table, now)
+            bucket = table[(name, key)] = TokenBucket(burst, burst / seconds)
+        else:
+            table.move_to_end((name, key))
+        return bucket
+
+    def evict(self, table, now):
+        # Oldest first, so stop at the first bucket that is still in use
+        while table:
+            bucket = next(iter(table.values()))
+            if now - bucket.stamp < self.ttl and len(table) < self.max_entries:
+                break
+            table.popitem(last=False)
+            self.evicted += 1
+
+    def allow(self, name, user, channel):
+        """Takes a token from each scope for a command of class name, or counts a refusal and takes none."""
+        if name not in self.limits:
+            return True
+        now = time.monotonic()
+        buckets = [(scope, self.bucket(scope, name, key, now)) for scope, key in (('user', user), ('channel', channel), ('global', None))
+                   if scope in self.limits[name]]
+        for scope, bucket in buckets:
+            if bucket.delay():
+                # Nothing is taken, a user who is held back by the channel limit keeps their own budget
+                self.counters[f"{name}/{scope}"] += 1
+                return False
+        for _, bucket in buckets:
+            bucket.take()
+        self.counters[name] += 1
+        return True
+
+    def stats(self):
+        limited = ", ".join(f"{key} {count}" for key, count in sorted(self.counters.items()) if '/' in key) or "none"
+        return (f"{len(self.buckets['user'])} users and {len(self.buckets['channel'])} channels tracked, "
+                f"{self.evicted} evicted | limited: {limited}")
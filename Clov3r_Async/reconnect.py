@@ -0,0 +1,89 @@
+import asyncio
+import random
+import ssl
+import time
+from collections import deque
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """SSLContext that hands the last TLS session for a server back to asyncio's handshake."""
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        return super().__new__(cls, protocol)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        self.load_default_certs()
+        self.sessions = {}
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        # asyncio never passes a session itself, so offer the one saved for this host
+        if session is None and not server_side:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side=server_side, server_hostname=server_hostname, session=session)
+
+    def remember(self, writer, server_hostname):
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object is None:
+            return False
+        if ssl_object.session is not None:
+            self.sessions[server_hostname] = ssl_object.session
+        return ssl_object.session_reused
+
+
+class ReconnectPolicy:
+    """Fast first retries, then capped exponential backoff with jitter; keeps a log of recent outages."""
+
+    def __init__(self, fast_retries=2, base_delay=1.0, max_delay=270.0, factor=2.0, stable_after=60.0):
+        self.fast_retries = fast_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.stable_after = stable_after
+        self.attempt = 0
+        self.outage_started = None
+        self.connected_at = None
+        self.outages = deque(maxlen=20)
+        self.ssl_context = ResumingSSLContext()
+
+    def delay(self):
+        if self.attempt < self.fast_retries:
+            # A blip usually clears at once, so the first retries only wait long enough to not hammer the server
+            return random.uniform(0.1, 0.5) * self.attempt
+        backoff = min(self.max_delay, self.base_delay * self.factor ** (self.attempt - self.fast_retries + 1))
+        # Equal jitter keeps half the delay so clients that dropped together do not return together
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    async def wait(self):
+        delay = self.delay()
+        self.attempt += 1
+        if delay:
+            print(f"Reconnecting in {delay:.1f} seconds (attempt {self.attempt})")
+            await asyncio.sleep(delay)
+
+    def lost(self):
+        # Only a session that stayed up a while earns the fast retries back; one dropped right after registering
+        # (a K-line, throttling) keeps backing off
+        if self.connected_at is not None and time.monotonic() - self.connected_at >= self.stable_after:
+            self.attempt = 0
+        self.connected_at = None
+        if self.outage_started is None:
+            self.outage_started = time.monotonic()
+
+    def connected(self, session_reused=False):
+        if self.outage_started is not None:
+            duration = time.monotonic() - self.outage_started
+            self.outages.append({
+                "ended": time.time(),
+                "duration": duration,
+                "attempts": self.attempt,
+                "session_reused": session_reused
+            })
+            print(f"Reconnected after {duration:.1f}s and {self.attempt} attempts (TLS session reused: {session_reused})")
+        self.outage_started = None
+        self.connected_at = time.monotonic()
+
+    async def open_connection(self, server, port, use_ssl=True):
+        # One SSLContext for the life of the bot, so the saved session can be resumed
+        if use_ssl:
+            return await asyncio.open_connection(server, port, ssl=self.ssl_context)
+        return await asyncio.open_connection(server, port)
@@ -3,14 +3,15 @@ import requests
 import re
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+from executors import run_blocking
 
 
 async def process_reddit_url(url):
     headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:122.0) Gecko/20100101 Firefox/122.0', 'Accept-Encoding': 'identity'}
     try:
-        response = requests.get(url, headers=headers)
+        response = await run_blocking('reddit', requests.get, url, headers=headers, site='reddit.page')
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = await run_blocking('reddit', BeautifulSoup, response.text, 'html.parser', site='reddit.parse')
             title_tag = soup.find('title')
             if title_tag:
                 return f"[\x0303Reddit\x03] {title_tag.text}"
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import requests
+from google_api import Googlesearch
+from title_scrape import Titlescraper
+
+
+class SharedServices:
+    """API clients, the HTTP pool and the URL title cache, built once and shared by every network in the process."""
+
+    def __init__(self, title_ttl=600, max_titles=2048):
+        self.session = requests.Session()
+        self.search = Googlesearch(session=self.session)
+        self.titlescrape = Titlescraper(session=self.session)
+        self.title_ttl = title_ttl
+        self.max_titles = max_titles
+        self.titles = {}
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def fetch_title(self, url):
+        cached = self.titles.get(url)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        # The same link pasted on two networks at once only gets fetched once
+        task = self.in_flight.get(url)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self.titlescrape.process_url(url))
+            self.in_flight[url] = task
+            task.add_done_callback(lambda done: self.store_title(url, done))
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    def store_title(self, url, task):
+        self.in_flight.pop(url, None)
+        if task.cancelled() or task.exception() is not None or task.result() is None:
+            return
+        if len(self.titles) >= self.max_titles:
+            # Dicts keep insertion order, so this drops the oldest entry
+            self.titles.pop(next(iter(self.titles)))
+        self.titles[url] = (time.monotonic() + self.title_ttl, task.result())
+
+    def stats(self):
+        return f"titles cached={len(self.titles)} hits={self.hits} misses={self.misses}"
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from collections import Counter
+
+
+class TaskSupervisor:
+    """Runs command and URL work as tasks so the read loop never waits on it, with global and per user caps and a deadline."""
+
+    def __init__(self, max_tasks=32, per_user=2, timeout=20.0):
+        self.max_tasks = max_tasks
+        self.per_user = per_user
+        self.timeout = timeout
+        self.running = {}
+        self.user_counts = Counter()
+        self.counters = Counter()
+        self.expired = set()
+
+    def submit(self, user, label, coro, on_timeout=None):
+        """Starts coro as a supervised task, or drops it and returns False when a cap is reached."""
+        if len(self.running) >= self.max_tasks:
+            coro.close()
+            self.counters['rejected'] += 1
+            print(f"Dropped {label} from {user}: {self.max_tasks} tasks already running")
+            return False
+        if self.user_counts[user] >= self.per_user:
+            coro.close()
+            self.counters['rejected'] += 1
+            print(f"Dropped {label} from {user}: already has {self.per_user} running")
+            return False
+        self.user_counts[user] += 1
+        self.counters['started'] += 1
+        task = asyncio.create_task(self.supervise(user, label, coro, on_timeout))
+        # One timer per task is much cheaper than wrapping each one in wait_for
+        deadline = asyncio.get_running_loop().call_later(self.timeout, self.expire, task)
+        self.running[task] = (user, label, time.monotonic(), deadline)
+        task.add_done_callback(self.finished)
+        return True
+
+    def expire(self, task):
+        self.expired.add(task)
+        task.cancel()
+
+    async def supervise(self, user, label, coro, on_timeout):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if task not in self.expired:
+                self.counters['cancelled'] += 1
+                raise
+            self.expired.discard(task)
+            self.counters['timed_out'] += 1
+            print(f"{label} from {user} ran past {self.timeout:.0f}s and was cancelled")
+            if on_timeout:
+                try:
+                    await on_timeout()
+                except Exception as e:
+                    print(f"Error reporting timeout of {label}: {e}")
+        except Exception as e:
+            self.counters['failed'] += 1
+            print(f"Error in {label} from {user}: {e}")
+
+    def finished(self, task):
+        user, label, started, deadline = self.running.pop(task)
+        deadline.cancel()
+        self.expired.discard(task)
+        self.user_counts[user] -= 1
+        if not self.user_counts[user]:
+            del self.user_counts[user]
+
+    async def cancel_all(self):
+        # Nothing left to answer once the connection is gone
+        tasks = list(self.running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        oldest = max((time.monotonic() - started for _, _, started, _ in self.running.values()), default=0)
+        return (f"tasks {len(self.running)}/{self.max_tasks} running (oldest {oldest:.1f}s), {self.counters['started']} started, "
+                f"{self.counters['rejected']} dropped, {self.counters['timed_out']} timed out, {self.counters['failed']} failed")
@@ -4,9 +4,7 @@ import configparser
 import datetime
 import json
 import random
-import ssl
 import time
-import html
 import irctokens
 import re
 import os
@@ -15,10 +13,30 @@ import ctypes
 from last_seen import Seenme
 from report_command import ReportIn
 from botpad import BotPad
+from line_framer import LineFramer
+from irc_writer import IRCWriter
+from flood_control import OutboundScheduler, PRIORITY_ADMIN, PRIORITY_BULK
+from irc_encoder import LineEncoder
+from irc_preparse import peek_command
+from chathistory import ChatHistory
+from reconnect import ReconnectPolicy
+from event_loop import install_event_loop
+from lag_monitor import LagMonitor
+from channel_joins import ChannelJoins
+from parser_link import ParserLink
+from parser_pool import ParserPool
+from message_classifier import MessageClassifier, USER_COMMAND, ADMIN_COMMAND, SED
+from state_store import shared_store
+from persistence import persistence
+from message_log import MessageLog
 
 
 class Clov3r:
-    def __init__(self, nickname, channels, server, port=6697, use_ssl=True, admin_list=None, nickserv_password=None, sasl_username=None, available_commands=None, admin_commands=None, notice_commands=None, config_file=None):
+    # Verbs worth a full tokenise; anything else is dropped after peek_command
+    REGISTRATION_COMMANDS = frozenset({"CAP", "AUTHENTICATE", "900", "903", "904", "905", "376", "422", "433", "513", "PING"})
+    HANDLED_COMMANDS = frozenset({"PING", "PONG", "PRIVMSG", "BATCH"})
+
+    def __init__(self, nickname, channels, server, port=6697, use_ssl=True, admin_list=None, nickserv_password=None, sasl_username=None, available_commands=None, admin_commands=None, notice_commands=None, config_file=None, flood_burst=5, flood_rate=2.0, use_uvloop=False, parser_socket=None, parser_codec='json', parser_workers=0, max_reply_lines=5):
         self.config_file = config_file
         self.nickname = nickname
         self.sasl_username = sasl_username
@@ -29,23 +47,44 @@ class Clov3r:
         self.nickserv_password = nickserv_password
         self.reader = None
         self.writer = None
+        self.out = None
+        self.outbound = None
+        self.writer_task = None
+        self.reconnect = ReconnectPolicy()
+        self.lag = LagMonitor()
+        self.joins = ChannelJoins()
+        # With workers the bot runs its own parser processes, otherwise it talks to a command_parser started by hand
+        self.parser_workers = parser_workers
+        if parser_workers:
+            self.parser = ParserPool(parser_workers, socket_path=parser_socket, codec=parser_codec, snapshot=self.parser_snapshot)
+        else:
+            self.parser = ParserLink(socket_path=parser_socket, codec=parser_codec, snapshot=self.parser_snapshot)
+        self.flood_burst = flood_burst
+        self.flood_rate = flood_rate
+        self.use_uvloop = use_uvloop
         self.disconnect_requested = False
         self.is_notice = False
         self.requester = ''
         self.response_queue = asyncio.Queue()
         self.lock = asyncio.Lock()
         self.last_messages = {}
+        # Appended to as messages arrive instead of rewriting messages.json each time
+        self.message_log = MessageLog('history', 200, persistence.fsync)
         self.ignore_list = []
         self.admin_list = admin_list
         self.url_regex = re.compile(r'https?://[^\s\x00-\x1F\x7F]+')
         self.available_commands = available_commands
         self.admin_commands = admin_commands
         self.notice_commands = notice_commands
-        self.separator_list = ['/', '_', '-', '~', '.', '|', '@', '+', '!', '`', ';', ':', '>', '<', '=', ')', '(', '*', '&', '^', '%', '#', '?', '[', ']', '{', '}','$', ',', "'", '"', '/', '\'', '\"']
+        self.classifier = MessageClassifier(available_commands or [], admin_commands or [])
         self.response_track = set()
+        # Opened before Seenme and friends so state_db comes from the selected config rather than bot_config.ini
+        self.store = shared_store(config_file)
         self.saw = Seenme()
         self.report = ReportIn()
         self.deltacheck = BotPad()
+        self.encoder = LineEncoder(nickname, max(1, max_reply_lines))
+        self.history = ChatHistory()
 
     @classmethod
     def from_config_file(cls, config_file):
@@ -58,6 +97,7 @@ class Clov3r:
         available_commands = bot_config.get('available_commands').split(',')
         admin_commands = bot_config.get('admin_commands').split(',')
         notice_commands = bot_config.get('notice_commands').split(',')
+        persistence.load_settings(config_file)
 
         return cls(
             nickname=bot_config.get('nickname'),
@@ -71,7 +111,14 @@ class Clov3r:
             available_commands=available_commands,
             admin_commands=admin_commands,
             notice_commands=notice_commands,
-            config_file=config_file
+            config_file=config_file,
+            flood_burst=bot_config.getint('flood_burst', 5),
+            flood_rate=bot_config.getfloat('flood_rate', 2.0),
+            use_uvloop=bot_config.getboolean('use_uvloop', False),
+            parser_socket=bot_config.get('parser_socket', fallback='').strip() or None,
+            parser_codec=bot_config.get('parser_codec', fallback='json').strip().lower(),
+            parser_workers=bot_config.getint('parser_workers', 0),
+            max_reply_lines=bot_config.getint('max_reply_lines', 5)
         )
 
     def reload_config(self):
@@ -89,6 +136,8 @@ class Clov3r:
         notice_commands = bot_config.get('notice_commands').split(',')
 
         self.nickname = bot_config.get('nickname')
+        self.encoder.set_nickname(self.nickname)
+        self.encoder.max_lines = max(1, bot_config.getint('max_reply_lines', 5))
         self.channels = channels
         self.server = bot_config.get('server')
         self.port = int(bot_config.get('port', 6697))
@@ -99,44 +148,55 @@ class Clov3r:
         self.available_commands = available_commands
         self.admin_commands = admin_commands
         self.notice_commands = notice_commands
+        self.classifier = MessageClassifier(available_commands, admin_commands)
+        self.flood_burst = bot_config.getint('flood_burst', 5)
+        self.flood_rate = bot_config.getfloat('flood_rate', 2.0)
+        if self.outbound:
+            self.outbound.bucket.configure(self.flood_burst, self.flood_rate)
         return True
 
     async def connect(self):
         while True:
             try:
-                if self.use_ssl:
-                    ssl_context = ssl.create_default_context()
-                    self.reader, self.writer = await asyncio.open_connection(self.server, self.port, ssl=ssl_context)
-                else:
-                    self.reader, self.writer = await asyncio.open_connection(self.server, self.port)
+                self.reader, self.writer = await self.reconnect.open_connection(self.server, self.port, self.use_ssl)
 
+                self.start_writer()
+                self.history.reset()
                 await self.send('CAP LS 302')
 
                 await self.send(f'USER {self.nickname} 0 * :{self.nickname}')
                 await self.send(f'NICK {self.nickname}')
-                await self.identify_with_sasl()
-                break
+                framer, lines = await self.identify_with_sasl()
+                # Registration has traded data, so a TLS 1.3 session ticket has arrived by now
+                session_reused = self.reconnect.ssl_context.remember(self.writer, self.server)
+                self.reconnect.connected(session_reused)
+                return framer, lines
             except NameInUseError as e:
                 print(e)
-                await asyncio.sleep(270)
+                self.reconnect.lost()
+                await self.disconnect()
+                await self.reconnect.wait()
             except (ConnectionError, OSError) as e:
                 print(f"Error in connect: {e}")
+                self.reconnect.lost()
+                await self.disconnect()
+                await self.reconnect.wait()
 
     async def identify_with_sasl(self):
-        buffer = ""
+        framer = LineFramer()
         SASL_successful = False
         logged_in = False
         motd_received = False
 
         while True:
-            data = await self.reader.read(4096)
-            if not data:
+            lines = await framer.read_lines(self.reader)
+            if lines is None:
                 raise ConnectionError("Connection lost while waiting for the welcome message.")
 
-            decoded_data = data.decode('UTF-8', errors='ignore')
-            buffer += decoded_data
-            while '\r\n' in buffer:
-                line, buffer = buffer.split('\r\n', 1)
+            for index, line in enumerate(lines):
+                if peek_command(line)[1] not in self.REGISTRATION_COMMANDS:
+                    continue
+
                 tokens = irctokens.tokenise(line)
 
                 match tokens.command:
@@ -154,10 +214,10 @@ class Clov3r:
                         print("SASL authentication successful.")
                         SASL_successful = True
                         if logged_in and SASL_successful and motd_received:
-                            for channel in self.channels:
-                                await self.join_channel(channel)
+                            await self.join_channels(self.channels)
                             print("Joined channels")
-                            return
+                            # The rest of this read and anything buffered past it belong to handle_messages
+                            return framer, lines[index + 1:]
 
                     case "904" | "905":
                         print("SASL authentication failed.")
@@ -166,10 +226,9 @@ class Clov3r:
                         print("MOTD complete.")
                         motd_received = True
                         if logged_in and SASL_successful:
-                            for channel in self.channels:
-                                await self.join_channel(channel)
+                            await self.join_channels(self.channels)
                             print("Joined channels on MOTD.")
-                            return
+                            return framer, lines[index + 1:]
 
                     case "433":
                         raise NameInUseError("Nickname is already in use (error 433)")
@@ -180,17 +239,33 @@ class Clov3r:
                     case "PING":
                         await self.send(f"PONG {tokens.params[0]}")
 
-    async def join_channel(self, channel):
-        await self.send(f"JOIN {channel}")
-        await asyncio.sleep(0.3)
+    async def join_channels(self, channels):
+        # As few JOIN lines as fit in 512 bytes, paced by the outbound scheduler rather than sleeps
+        self.joins.reset()
+        for line in self.joins.lines(channels):
+            await self.send(line)
+
+    async def channel_joined(self, line):
+        channel = self.joins.confirm(irctokens.tokenise(line).params[0])
+        if channel and self.history.enabled:
+            # The server has us in the channel now, so it will answer the history request
+            await self.send(self.history.request(channel))
 
     async def handle_cap(self, tokens):
         if "LS" in tokens.params:
-            print("Handling CAP LS: CAP REQ :sasl")
-            await self.send("CAP REQ :sasl")
+            if self.history.add_offered(tokens):
+                caps = ' '.join(self.history.wanted_caps())
+                print(f"Handling CAP LS: CAP REQ :{caps}")
+                await self.send(f"CAP REQ :{caps}")
         elif "ACK" in tokens.params:
             print("ACK Received")
-            await self.send("AUTHENTICATE PLAIN")
+            if 'sasl' in self.history.acknowledge(tokens):
+                await self.send("AUTHENTICATE PLAIN")
+        elif "NAK" in tokens.params and self.history.requested != ['sasl']:
+            # CAP REQ is all or nothing, so fall back to plain SASL
+            print("NAK Received, requesting SASL only")
+            self.history.requested = ['sasl']
+            await self.send("CAP REQ :sasl")
 
     async def handle_sasl_auth(self, tokens):
         print("Sent SASL Auth")
@@ -199,19 +274,20 @@ class Clov3r:
             encoded_auth = base64.b64encode(auth_string.encode("UTF-8")).decode("UTF-8")
             await self.send(f"AUTHENTICATE {encoded_auth}")
 
-    async def sanitize_input(self, malicious_input):
-        decoded_input = html.unescape(malicious_input)
-        safe_output = ''.join(
-            char for char in decoded_input
-            if (ord(char) > 31 and ord(char) != 127) or char in '\x03\x02\x0F\x16\x1E\x1D\x1F\x01'
-        )
-        return safe_output
-
-    async def send(self, message):
-        safe_msg = await self.sanitize_input(message)
-        self.writer.write((safe_msg + '\r\n').encode('utf-8'))
-        await self.writer.drain()  # Ensure the message is sent
-        return
+    def start_writer(self):
+        # A fresh writer task owns each new connection's StreamWriter
+        if self.writer_task:
+            self.writer_task.cancel()
+        self.out = IRCWriter(self.writer)
+        self.outbound = OutboundScheduler(self.out, self.flood_burst, self.flood_rate)
+        self.writer_task = asyncio.create_task(self.outbound.run())
+
+    async def send(self, message, priority=None):
+        # priority=None lets the scheduler classify the line by its verb
+        for line in self.encoder.encode(message):
+            if line.startswith('JOIN '):
+                self.joins.expect(line)
+            await self.outbound.submit(line, priority)
 
     async def send_responses_worker(self):
         sent_responses = []  # List to track sent responses
@@ -223,13 +299,11 @@ class Clov3r:
                     if self.is_notice:
                         await self.send(f'NOTICE {self.requester} :{response}')
                         print(f"Sent: {response} to {self.requester}")
-                        await asyncio.sleep(0.4)
                         # Add the response to the list of sent responses
                         sent_responses.append(response)
                     else:
                         await self.send(f'PRIVMSG {channel} :{response}')
                         print(f"Sent: {response} to {channel}")
-                        await asyncio.sleep(0.4)
                         # Add the response to the list of sent responses
                         sent_responses.append(response)
             finally:
@@ -272,9 +346,10 @@ class Clov3r:
                 case _:
                     print(f"Unhandled CTCP command: {ctcp_command}")
 
-    async def save_message(self, sender, content, channel):
-        # Use system's current time for Unix timestamp
-        unix_timestamp = int(datetime.datetime.now().timestamp())
+    async def save_message(self, sender, content, channel, unix_timestamp=None, replayed=False):
+        # Use system's current time for Unix timestamp unless the server supplied one
+        if unix_timestamp is None:
+            unix_timestamp = int(datetime.datetime.now().timestamp())
 
         # Check if it's a CTCP ACTION message
         if content.startswith("\x01ACTION") and content.endswith("\x01"):
@@ -303,57 +378,78 @@ class Clov3r:
         while len(self.last_messages[channel]) > 200:
             self.last_messages[channel].pop(0)  # Remove the oldest message
 
-    async def save_last_messages(self, filename="messages.json"):
-        # Convert deque objects to lists for JSON serialization
-        serializable_last_messages = {channel: list(messages) for channel, messages in self.last_messages.items()}
-        
-        async with self.lock:
-            try:
-                with open(filename, 'w') as file:
-                    json.dump(serializable_last_messages, file, indent=2)
-            except Exception as e:
-                print(f"Error saving last messages: {e}")
+        # Logged even with chathistory, a backfill replaces the replayed copy but a channel the server won't backfill still has it
+        if not replayed:
+            self.message_log.append(channel, formatted_message)
+
+        await self.parser.notify({"event": "append", "channel": channel, "message": formatted_message})
+
+    def parser_snapshot(self):
+        # Everything the parser keeps a copy of, sent whenever it (re)connects
+        events = [{"event": "admins", "admin_list": self.admin_list}]
+        for channel, messages in self.last_messages.items():
+            events.append({"event": "history", "channel": channel, "messages": list(messages)})
+        return events
+
+    async def sync_parser(self):
+        for event in self.parser_snapshot():
+            await self.parser.notify(event)
 
     async def load_last_messages(self, filename="messages.json"):
         async with self.lock:
             try:
-                with open(filename, 'r') as file:
-                    self.last_messages = json.load(file)
-                
-                print(f"Loaded last messages from {filename}")
-            except FileNotFoundError:
-                print(f"{filename} not found. Starting with an empty message history.")
+                # messages.json is only read on the first start with the log, to carry its history over
+                self.message_log.import_json(filename)
+                self.last_messages = self.message_log.replay()
+                print(f"Loaded last messages for {len(self.last_messages)} channels")
+                await self.sync_parser()
             except Exception as e:
                 print(f"Error loading last messages: {e}")
 
-    async def handle_messages(self):
+    async def handle_messages(self, framer, lines):
+        # Carries on with registration's framer, starting on the lines it read past the end of registration
         self.disconnect_requested = False
-        buffer = ""
 
         try:
             while not self.disconnect_requested:
-                data = await self.reader.read(1000)
-                buffer += data.decode('UTF-8', errors='replace')
-
-                if not data:
-                    break
+                if lines is None:
+                    lines = await framer.read_lines(self.reader)
+                    if lines is None:
+                        break
 
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    line = line.rstrip('\r').strip().lstrip()
+                for line in lines:
+                    source, verb = peek_command(line)
+                    # Only our own JOIN echoes matter, and only while a JOIN we sent is unconfirmed
+                    if verb == "JOIN" and self.joins.pending and source and source.split('!')[0].lower() == self.nickname.lower():
+                        await self.channel_joined(line)
+                        continue
 
-                    if not line:
+                    # JOIN/PART/QUIT/MODE floods stop here without being tokenised
+                    if verb not in self.HANDLED_COMMANDS:
                         continue
 
                     tokens = irctokens.tokenise(line)
 
                     if tokens.command == "PING":
-                        await self.send(f"PONG {tokens.params[0].strip().lstrip()}")
+                        await self.send(f"PONG {tokens.params[0].strip()}")
+                    elif tokens.command == "PONG":
+                        lag = self.lag.pong(tokens)
+                        if lag is not None:
+                            self.outbound.set_lag(lag)
+                    elif tokens.command == "BATCH":
+                        await self.handle_history_batch(tokens)
                     elif tokens.command == "PRIVMSG":
-                        sender = tokens.source.split('!')[0].strip().lstrip() if tokens.source else "Unknown Sender"
-                        hostmask = tokens.source.strip() if tokens.source else "Unknown Hostmask"
-                        channel = tokens.params[0].strip().lstrip()
-                        content = tokens.params[1].strip().lstrip()
+                        history_channel = self.history.batch_channel(tokens)
+                        if history_channel:
+                            # Replayed history only refills the buffer, it never triggers commands
+                            sender = tokens.source.split('!')[0] if tokens.source else "Unknown Sender"
+                            await self.save_message(sender, tokens.params[1].strip(), history_channel, self.history.timestamp(tokens), replayed=True)
+                            continue
+
+                        sender = tokens.source.split('!')[0] if tokens.source else "Unknown Sender"
+                        hostmask = tokens.source if tokens.source else "Unknown Hostmask"
+                        channel = tokens.params[0]
+                        content = tokens.params[1].strip()
                         parts = content.split()
                         normalized_content = ' '.join(parts)
 
@@ -367,50 +463,55 @@ class Clov3r:
                         print(f"Full Hostmask: {hostmask}")
                         
                         # Check for user and admin commands
-                        for command in self.available_commands:
-                            if content.startswith(command):
-                                await self.user_commands(sender, channel, content, hostmask, self.last_messages, self.admin_list)
-                                break
-                        for command in self.admin_commands:
-                            if content.startswith(command):
-                                if command == '.quit' and hostmask in self.admin_list:
-                                    await self.send(f"Acknowledged {sender} quitting...")
-                                    await self.send(f"QUIT :Cl4irBot")
-                                    self.disconnect_requested = True
-                                    break
-                                elif command == '.reconf' and hostmask in self.admin_list:
-                                    print("Reloading Config....")
-                                    config = self.reload_config()
-                                    if config:
-                                        print("Config Reloaded :)")
-                                        self.load_ignore_list()
-                                        break
-                                else:
-                                    await self.user_commands(sender, channel, content, hostmask, self.last_messages, self.admin_list, admin_command=True)
-                                    break
-                        else:
-                            prefixes = [f's{sep}' for sep in self.separator_list] + [f'S{sep}' for sep in self.separator_list]
-                            if any(content.startswith(prefix) for prefix in prefixes) and len(content) > 2:
-                                await self.user_commands(sender, channel, content, hostmask, self.last_messages, self.admin_list)
-
-                        await self.detect_and_parse_urls(sender, channel, normalized_content, hostmask, self.last_messages, self.admin_list, admin_command=False)
+                        kind, command, has_url = self.classifier.classify(content)
+                        if kind == USER_COMMAND or kind == SED:
+                            await self.user_commands(sender, channel, content, hostmask)
+                        elif kind == ADMIN_COMMAND:
+                            if command == '.quit' and hostmask in self.admin_list:
+                                await self.send(f"Acknowledged {sender} quitting...", PRIORITY_ADMIN)
+                                await self.send(f"QUIT :Cl4irBot")
+                                self.disconnect_requested = True
+                            elif command == '.lag' and hostmask in self.admin_list:
+                                await self.send(f"PRIVMSG {channel} :[Lag] {self.lag.summary()} | {self.outbound.stats()} | {self.parser.stats()}", PRIORITY_ADMIN)
+                            elif command == '.reconf' and hostmask in self.admin_list:
+                                print("Reloading Config....")
+                                if self.reload_config():
+                                    print("Config Reloaded :)")
+                                    await self.parser.notify({"event": "admins", "admin_list": self.admin_list})
+                                    self.load_ignore_list()
+                            else:
+                                await self.user_commands(sender, channel, content, hostmask, admin_command=True)
+
+                        if has_url:
+                            await self.detect_and_parse_urls(sender, channel, normalized_content, hostmask, admin_command=False)
                         await self.saw.record_last_seen(sender, channel, normalized_content)
                         await self.saw.save_last_seen()
                         await self.tatle_tell(sender, channel)
                         await self.handle_ctcp(tokens)
                         await self.save_message(sender, content, channel)
-                        await self.save_last_messages()
                         await self.notes_check(sender, channel)
 
+                lines = None
+
         except (ConnectionError, OSError) as e:
+            # main_loop reconnects once this task ends
             print(f"OSError/ConnectionError in handle_messages: {e}")
-            await asyncio.sleep(246)
-            await self.connect()
         except Exception as e:
             print(f"Error in handle_messages: {e}")
         except asyncio.CancelledError:
             print("handle_messages coroutine cancelled.")
 
+    async def handle_history_batch(self, tokens):
+        channel, started = self.history.handle_batch(tokens)
+        if not channel:
+            return
+        if started:
+            # The server's copy replaces whatever was replayed from the history log
+            self.last_messages[channel] = []
+            await self.parser.notify({"event": "history", "channel": channel, "messages": []})
+        else:
+            print(f"Backfilled {len(self.last_messages.get(channel, []))} messages for {channel}")
+
     def filter_private_ip(self, url):
         # Extract the hostname from the URL
         hostname = re.findall(r'https?://([^/:]+)', url)
@@ -424,7 +525,7 @@ class Clov3r:
 
         return False
 
-    async def detect_and_parse_urls(self, sender, channel, content, hostmask, last_messages, admin_list, admin_command=False):
+    async def detect_and_parse_urls(self, sender, channel, content, hostmask, admin_command=False):
         urls = self.url_regex.findall(content)
 
         for url in urls:
@@ -436,7 +537,7 @@ class Clov3r:
                     print(f"Ignoring URL with private IP address: {url}")
                     continue
 
-                data = (sender, channel, url, hostmask, last_messages, admin_list)
+                data = (sender, channel, url, hostmask)
 
                 self.response_track.clear()
 
@@ -448,8 +549,9 @@ class Clov3r:
                 if not response:
                     return
 
+                # URL titles are bulk traffic and yield to command output
                 for response in self.response_track:
-                    await self.response_queue.put((channel, response))
+                    await self.send(f'PRIVMSG {channel} :{response}', PRIORITY_BULK)
 
             except Exception as e:
                 print(f"Error in detect_and_parse_urls: {e}")
@@ -462,7 +564,7 @@ class Clov3r:
                 print(f"user_commands: {response}")
                 self.response_track.add(response)
 
-    async def user_commands(self, sender, channel, content, hostmask, last_messages, admin_list, admin_command=False):
+    async def user_commands(self, sender, channel, content, hostmask, admin_command=False):
         self.requester = sender
         args = content.split()
         if args[0] in self.notice_commands:
@@ -476,7 +578,7 @@ class Clov3r:
                 print("Content is too short to send.")
                 return
 
-            data = (sender, channel, content, hostmask, last_messages, admin_list)
+            data = (sender, channel, content, hostmask)
 
             # Clear the response track at the start of the method
             self.response_track.clear()
@@ -489,34 +591,15 @@ class Clov3r:
                 if not admin_command:
                     await self.response_queue.put((channel, response))
                 else:
-                    await self.send(response)
+                    await self.send(response, PRIORITY_ADMIN)
         except Exception as e:
             print(f"Error in user_commands: {e}")
 
     async def send_command_to_parser(self, data):
-        responses = []
         try:
-            reader, writer = await asyncio.open_connection('127.0.0.1', 8888)
-            try:
-                encoded_data = json.dumps(data).encode('utf-8')
-                writer.write(encoded_data)
-                await writer.drain()
-
-                while True:
-                    response = await asyncio.wait_for(reader.read(2048), timeout=30)
-                    if not response:
-                        break
-                    if response in responses:
-                        pass
-                    
-                    decoded_response = response.decode()
-                    print("Received response from server:", decoded_response)
-                    responses.append(decoded_response)
-            finally:
-                writer.close()
-                await writer.wait_closed()
-            
-            for response in responses:
+            # Responses stream back over the shared parser connection as they are produced
+            async for response in self.parser.request(data):
+                print("Received response from server:", response)
                 yield response
 
         except asyncio.TimeoutError:
@@ -539,11 +622,17 @@ class Clov3r:
                 await self.response_queue.put((channel, response))
 
     async def keep_alive(self):
+        self.lag.reset()
         while not self.disconnect_requested:
-            async with self.lock:
-                await self.send("PING :keepalive")
-                print(f"Sent: PING to Server: {self.server}")
-            await asyncio.sleep(195)
+            if self.lag.due():
+                async with self.lock:
+                    await self.send(self.lag.probe())
+            self.outbound.set_lag(self.lag.current())
+            if self.lag.stale():
+                # A half dead link can sit quietly for minutes before the read fails, ending this task makes main_loop reconnect
+                print(f"No PONG from {self.server} for {self.lag.current():.0f} seconds, reconnecting...")
+                return
+            await asyncio.sleep(1)
 
     async def clear_response(self):
         while True:
@@ -564,41 +653,60 @@ class Clov3r:
             print(f"Error loading ignore list from '{file_path}': {e}")
 
     async def disconnect(self):
+        # Nothing can be flushed once the server has hung up, so go straight to reconnecting
+        connection_alive = self.reader is not None and not self.reader.at_eof() and self.writer_task and not self.writer_task.done()
+        if self.outbound and connection_alive:
+            await self.outbound.flush()
+        if self.writer_task:
+            self.writer_task.cancel()
+            self.writer_task = None
         if self.writer:
             self.writer.close()
-            await self.writer.wait_closed()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
             self.writer = None
             self.reader = None
 
     async def main_loop(self):
         while True:
             try:
-                await self.connect()
+                framer, lines = await self.connect()
                 await self.load_last_messages()
                 self.load_ignore_list()
 
                 keep_alive_task = asyncio.create_task(self.keep_alive())
-                handle_messages_task = asyncio.create_task(self.handle_messages())
+                handle_messages_task = asyncio.create_task(self.handle_messages(framer, lines))
                 clear_response_task = asyncio.create_task(self.clear_response())
                 response_handler_task = asyncio.create_task(self.send_responses_worker())
 
                 done, pending = await asyncio.wait(
-                    [keep_alive_task, handle_messages_task, response_handler_task, clear_response_task],
+                    [keep_alive_task, handle_messages_task, response_handler_task, clear_response_task, self.writer_task],
                     return_when=asyncio.FIRST_COMPLETED
                 )
 
+                # Give the writer a chance to push out anything still queued, e.g. QUIT
+                if self.writer_task in pending:
+                    await self.outbound.flush()
+
                 for task in pending:
                     task.cancel()
 
                 await asyncio.gather(*pending, return_exceptions=True)
+                self.reconnect.lost()
+                await self.disconnect()
+                # A session the server ended is retried with the same backoff as a failed connect
+                await self.reconnect.wait()
 
             except (ConnectionError, OSError) as e:
                 if isinstance(e, OSError) and ctypes.get_last_error() == 121:
                     print(f"WinError 121: The semaphore timeout period has expired. Reconnecting...")
                 else:
                     print(f"Connection error: {e}. Reconnecting...")
+                self.reconnect.lost()
                 await self.disconnect()
-                await asyncio.sleep(5)  # Short delay before reconnecting
+                await self.reconnect.wait()
             except KeyboardInterrupt:
                 print("KeyboardInterrupt received. Shutting down...")
                 break
@@ -608,7 +716,12 @@ class Clov3r:
                 break
 
     async def start(self):
-        await self.main_loop()
+        if self.parser_workers:
+            await self.parser.start()
+        try:
+            await self.main_loop()
+        finally:
+            await self.parser.close()
 
 def list_ini_files(directory="."):
     return [f for f in os.listdir(directory) if f.endswith(".ini")]
@@ -640,4 +753,10 @@ if __name__ == "__main__":
     selected_file = select_ini_file()
     if selected_file:
         bot = Clov3r.from_config_file(selected_file)
-        asyncio.run(bot.start())
+        install_event_loop(bot.use_uvloop)
+        persistence.install_signal_handlers()
+        try:
+            asyncio.run(bot.start())
+        finally:
+            persistence.flush_now()
+            bot.message_log.close()
@@ -0,0 +1,53 @@
+"""Time to all channels joined against fake_ircd: one JOIN and a sleep per channel vs batched JOIN lines."""
+import asyncio
+import contextlib
+import io
+import time
+from fake_ircd import FakeIRCd
+from Clov3r_netbot import Clov3r
+
+CHANNEL_COUNT = 60
+
+
+class PerChannelJoins(Clov3r):
+    # The startup join loop as it was before batching
+    async def join_channels(self, channels):
+        self.joins.reset()
+        self.joins.lines(channels)
+        for channel in channels:
+            await self.send(f"JOIN {channel}")
+            await asyncio.sleep(0.3)
+
+
+async def time_to_joined(bot_class):
+    ircd = FakeIRCd(caps=('sasl',))
+    port = await ircd.start()
+    channels = [f"#clov3r-channel-{i:02d}" for i in range(CHANNEL_COUNT)]
+    bot = bot_class('benchbot', channels, '127.0.0.1', port, use_ssl=False, admin_list=[], sasl_username='benchbot',
+                    nickserv_password='bench', available_commands=[], admin_commands=[], notice_commands=[])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.monotonic()
+        await bot.connect()
+        reader = asyncio.create_task(bot.handle_messages())
+        while bot.joins.pending or len(bot.joins.joined) < CHANNEL_COUNT:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - start
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await bot.disconnect()
+
+    join_lines = sum(1 for _, line in ircd.received if line.startswith('JOIN '))
+    await ircd.stop()
+    return elapsed, join_lines
+
+
+async def main():
+    print(f"{CHANNEL_COUNT} channels, flood control at the default 5 burst / 2 lines per second")
+    for name, bot_class in (("per-channel JOIN", PerChannelJoins), ("batched JOIN", Clov3r)):
+        elapsed, join_lines = await time_to_joined(bot_class)
+        print(f"{name:<18} all joined after {elapsed:6.2f}s  JOIN lines sent={join_lines}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""Compares the default asyncio loop with uvloop on the bot read path and on parser round trips."""
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+import irctokens
+from line_framer import LineFramer
+from irc_preparse import peek_command
+from command_parser import CommandHandler
+from parser_link import ParserLink
+
+LINE_COUNT = 100000
+COMMANDS = 2000
+CONCURRENCY = 20
+
+
+class PingParser:
+    # Stands in for CommandHandler so its connection handling runs without the API clients behind it
+    handle_client = CommandHandler.handle_client
+    handle_request = CommandHandler.handle_request
+
+    async def handle_command(self, data):
+        yield f"[\x0303Ping\x03] {data[0]}: PONG"
+
+
+async def irc_throughput():
+    line = b":nick!~nick@gateway/web/nick PRIVMSG #channel :did everyone just split?\r\n"
+
+    async def blast(reader, writer):
+        writer.write(line * LINE_COUNT)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(blast, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    framer = LineFramer()
+    received = 0
+    start = time.perf_counter()
+    while True:
+        lines = await framer.read_lines(reader)
+        if lines is None:
+            break
+        for text in lines:
+            if peek_command(text)[1] == 'PRIVMSG':
+                irctokens.tokenise(text)
+            received += 1
+    elapsed = time.perf_counter() - start
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return received / elapsed
+
+
+async def parser_round_trips():
+    parser = PingParser()
+    server = await asyncio.start_server(parser.handle_client, '127.0.0.1', 0)
+    link = ParserLink(port=server.sockets[0].getsockname()[1])
+    data = ('bench', '#channel', '.ping', 'bench!~bench@host')
+    latencies = []
+
+    async def one_command():
+        start = time.perf_counter()
+        async for response in link.request(data):
+            pass
+        latencies.append(time.perf_counter() - start)
+
+    async def client(count):
+        for _ in range(count):
+            await one_command()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(COMMANDS // CONCURRENCY) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    await link.close()
+    # Let the server side notice the link closing before the loop shuts down
+    await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def run(name, loop_factory):
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        lines_per_second = runner.run(irc_throughput())
+        # Both ends print every response, keep that out of the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            commands_per_second, p50, p99 = runner.run(parser_round_trips())
+    print(f"{name:<8} irc read {lines_per_second:10.0f} lines/s   parser {commands_per_second:7.0f} commands/s  "
+          f"p50 {p50 * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    print(f"{LINE_COUNT} inbound lines, {COMMANDS} parser commands over {CONCURRENCY} concurrent clients")
+    run("asyncio", asyncio.new_event_loop)
+    try:
+        import uvloop
+    except ImportError:
+        print("uvloop is not installed, skipping")
+    else:
+        run("uvloop", uvloop.new_event_loop)
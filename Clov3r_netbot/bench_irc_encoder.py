@@ -0,0 +1,36 @@
+"""Microbenchmarks for irc_encoder against the sanitize_input it replaced."""
+import html
+import timeit
+from irc_encoder import LineEncoder, sanitize
+
+SAMPLES = {
+    'short reply': "PRIVMSG #channel :[\x0303Ping\x03] someone: PNOG!",
+    'title with entities': "PRIVMSG #channel :[\x0303Website\x03] Tom &amp; Jerry &#8211; The &quot;Complete&quot; Collection | Example",
+    'unicode title': "PRIVMSG #channel :\x030,4 ► \x031,0\x02YouTube\x0F \x02ナルト 疾風伝 — Zoë's café ☘\x0F | \x024m:20s\x0F | \x02Ünïcødé\x0F",
+    'long description': "PRIVMSG #channel :" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. Łódź żółć ☘ " * 20,
+}
+
+
+def old_sanitize(malicious_input):
+    # The per-character generator that used to live in four modules
+    decoded_input = html.unescape(malicious_input)
+    return ''.join(
+        char for char in decoded_input
+        if (ord(char) > 31 and ord(char) != 127) or char in '\x03\x02\x0F\x16\x1E\x1D\x1F\x01'
+    )
+
+
+def measure(func, text, number=20000):
+    return min(timeit.repeat(lambda: func(text), number=number, repeat=3)) / number * 1e6
+
+
+if __name__ == '__main__':
+    encoder = LineEncoder('Cl4ir')
+    print(f"{'sample':<22} {'old sanitize':>14} {'sanitize':>10} {'encode+split':>14}  lines")
+    for name, text in SAMPLES.items():
+        old = measure(old_sanitize, text)
+        new = measure(sanitize, text)
+        full = measure(encoder.encode, text)
+        lines = encoder.encode(text)
+        assert all(len(line.encode('utf-8')) + encoder.source_reserve <= 512 for line in lines)
+        print(f"{name:<22} {old:11.2f} us {new:7.2f} us {full:11.2f} us  {len(lines)}")
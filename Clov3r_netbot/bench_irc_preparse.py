@@ -0,0 +1,63 @@
+"""Measures lines/s through the read path on a netsplit burst, with and without peek_command."""
+import random
+import time
+import irctokens
+from irc_preparse import peek_command
+
+HANDLED_COMMANDS = frozenset({"PING", "PRIVMSG"})
+
+
+def build_netsplit(count=100000):
+    # Mostly QUIT/JOIN/MODE/NOTICE noise with the odd PRIVMSG and PING mixed in, tags on some lines
+    random.seed(7)
+    lines = []
+    for i in range(count):
+        nick = f"user{random.randint(0, 5000)}"
+        source = f":{nick}!~{nick}@gateway/web/{nick}"
+        roll = random.random()
+        if roll < 0.45:
+            lines.append(f"{source} QUIT :*.net *.split")
+        elif roll < 0.85:
+            lines.append(f"@time=2024-01-01T00:00:00.000Z {source} JOIN #channel * :{nick}")
+        elif roll < 0.93:
+            lines.append(f":ChanServ!ChanServ@services.libera.chat MODE #channel +o {nick}")
+        elif roll < 0.97:
+            lines.append(f":irc.example.net NOTICE * :*** Notice -- netjoin {nick}")
+        elif roll < 0.999:
+            lines.append(f"{source} PRIVMSG #channel :did everyone just split?")
+        else:
+            lines.append("PING :irc.example.net")
+    return lines
+
+
+def tokenise_everything(lines):
+    kept = 0
+    for line in lines:
+        tokens = irctokens.tokenise(line)
+        if tokens.command in HANDLED_COMMANDS:
+            kept += 1
+    return kept
+
+
+def peek_then_tokenise(lines):
+    kept = 0
+    for line in lines:
+        if peek_command(line)[1] not in HANDLED_COMMANDS:
+            continue
+        irctokens.tokenise(line)
+        kept += 1
+    return kept
+
+
+def run(name, func, lines):
+    start = time.perf_counter()
+    kept = func(lines)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {len(lines) / elapsed:12.0f} lines/s  kept={kept}")
+
+
+if __name__ == '__main__':
+    burst = build_netsplit()
+    print(f"Netsplit burst of {len(burst)} lines")
+    run("tokenise every line", tokenise_everything, burst)
+    run("peek, then tokenise", peek_then_tokenise, burst)
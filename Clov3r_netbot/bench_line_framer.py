@@ -0,0 +1,87 @@
+"""Replays a 50k line NAMES/netsplit burst through the old str buffer loop and LineFramer."""
+import asyncio
+import random
+import time
+from line_framer import LineFramer
+
+LINE_COUNT = 50000
+
+
+class ReplayReader:
+    # Stands in for asyncio.StreamReader, handing back at most n bytes per read
+    def __init__(self, payload):
+        self.payload = payload
+        self.offset = 0
+
+    async def read(self, n):
+        chunk = self.payload[self.offset:self.offset + n]
+        self.offset += len(chunk)
+        return chunk
+
+
+def build_burst():
+    random.seed(1)
+    nicks = [f"nick{i}" for i in range(2000)] + ["Ünïcødé", "ナルト", "Zoë", "Łukasz"]
+    lines = []
+    for i in range(LINE_COUNT):
+        nick = random.choice(nicks)
+        kind = i % 4
+        if kind == 0:
+            lines.append(f":{nick}!~{nick}@user/{nick} QUIT :*.net *.split")
+        elif kind == 1:
+            names = ' '.join(random.sample(nicks, 25))
+            lines.append(f":irc.example.net 353 Cl4ir = #channel :{names}")
+        elif kind == 2:
+            lines.append(f":{nick}!~{nick}@user/{nick} JOIN #channel")
+        else:
+            lines.append(f":{nick}!~{nick}@user/{nick} PRIVMSG #channel :héllo wörld — ☘ {i}")
+    return ('\r\n'.join(lines) + '\r\n').encode('UTF-8')
+
+
+async def old_loop(reader):
+    # The loop handle_messages used before LineFramer
+    buffer = ""
+    lines = 0
+    broken = 0
+    while True:
+        data = await reader.read(1000)
+        if not data:
+            break
+        buffer += data.decode('UTF-8', errors='replace')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            line = line.rstrip('\r').strip().lstrip()
+            if not line:
+                continue
+            lines += 1
+            broken += '�' in line
+    return lines, broken
+
+
+async def framer_loop(reader, chunk_size):
+    framer = LineFramer(chunk_size=chunk_size)
+    lines = 0
+    broken = 0
+    while True:
+        batch = await framer.read_lines(reader)
+        if batch is None:
+            break
+        for line in batch:
+            lines += 1
+            broken += '�' in line
+    return lines, broken
+
+
+def run(name, factory, payload):
+    start = time.perf_counter()
+    lines, broken = asyncio.run(factory(ReplayReader(payload)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000:9.1f} ms {lines / elapsed:12.0f} lines/s  lines={lines} corrupted={broken}")
+
+
+if __name__ == '__main__':
+    payload = build_burst()
+    print(f"Replaying {LINE_COUNT} lines ({len(payload)} bytes)")
+    run("str buffer, 1000 B reads", old_loop, payload)
+    run("LineFramer, 1000 B reads", lambda reader: framer_loop(reader, 1000), payload)
+    run("LineFramer, 64 KiB reads", lambda reader: framer_loop(reader, 65536), payload)
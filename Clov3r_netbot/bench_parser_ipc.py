@@ -0,0 +1,122 @@
+"""Round-trip latency and requests/s on the bot to parser link: TCP with JSON frames against a unix socket with msgpack frames.
+
+Also sizes the request payload as it used to be, with the channel history and admin list packed into every request,
+against the four field request and the append event that keeps the parser's own history in step.
+"""
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from command_parser import CommandHandler
+from parser_link import ParserLink, start_parser_server, encode, decode, CODEC_JSON, CODEC_MSGPACK, msgpack, unix_sockets_supported
+
+SEQUENTIAL = 2000
+CONCURRENT = 5000
+CONCURRENCY = 20
+
+
+class PingParser:
+    # Stands in for CommandHandler so its connection handling runs without the API clients behind it
+    handle_client = CommandHandler.handle_client
+    handle_request = CommandHandler.handle_request
+
+    async def handle_command(self, data):
+        yield f"[\x0303Ping\x03] {data[0]}: PONG"
+
+
+REQUEST = ('bench', '#channel0', '.ping', 'bench!~bench@host')
+
+
+def chat_line(i):
+    return {"timestamp": 1700000000 + i, "sender": f"user{i % 40}", "content": f"message {i} about nothing much in particular, with a link https://example.com/{i}"}
+
+
+def legacy_request(channels=3, history=200):
+    # What the netbot used to send: the full last_messages and admin_list with every command and URL
+    last_messages = {f"#channel{c}": [chat_line(i) for i in range(history)] for c in range(channels)}
+    admin_list = ["Irish!~Irish@user/irish", "someone!~else@user/else"]
+    return REQUEST + (last_messages, admin_list)
+
+
+async def round_trips(socket_path, codec, data):
+    parser = PingParser()
+    server = await start_parser_server(parser.handle_client, port=0, socket_path=socket_path)
+    port = None if socket_path else server.sockets[0].getsockname()[1]
+    link = ParserLink(port=port, socket_path=socket_path, codec=codec)
+
+    async def one_request(latencies):
+        start = time.perf_counter()
+        async for response in link.request(data):
+            pass
+        latencies.append(time.perf_counter() - start)
+
+    # One at a time shows the latency of a single command
+    sequential = []
+    for _ in range(SEQUENTIAL):
+        await one_request(sequential)
+
+    # Many clients at once shows how far the link goes under load
+    concurrent = []
+
+    async def client(count):
+        for _ in range(count):
+            await one_request(concurrent)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(CONCURRENT // CONCURRENCY) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+
+    await link.close()
+    # Let the server side notice the link closing before the loop shuts down
+    await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
+    sequential.sort()
+    return statistics.median(sequential), sequential[int(len(sequential) * 0.99)], len(concurrent) / elapsed
+
+
+def codec_cost(codec, message, rounds=200):
+    body = encode(message, codec)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode(encode(message, codec), codec)
+    return len(body), (time.perf_counter() - start) / rounds
+
+
+def payloads():
+    codecs = [('json', CODEC_JSON)] + ([('msgpack', CODEC_MSGPACK)] if msgpack is not None else [])
+    messages = (("request with history (3 x 200 lines)", {'id': 1, 'data': legacy_request()}),
+                ("request, four fields", {'id': 1, 'data': REQUEST}),
+                ("append event", {'event': 'append', 'channel': '#channel0', 'message': chat_line(0)}))
+    for label, message in messages:
+        for name, codec in codecs:
+            size, cost = codec_cost(codec, message)
+            print(f"{label:<38} {name:<8} {size:7d} bytes  encode+decode {cost * 1e6:8.1f} us")
+
+
+def run(name, socket_path, codec, data):
+    # Both ends print every response, keep that out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        p50, p99, per_second = asyncio.run(round_trips(socket_path, codec, data))
+    print(f"{name:<14} p50 {p50 * 1000:6.3f} ms  p99 {p99 * 1000:6.3f} ms  {per_second:7.0f} requests/s")
+
+
+if __name__ == '__main__':
+    combos = [("tcp+json", None, 'json')]
+    if msgpack is not None:
+        combos.append(("tcp+msgpack", None, 'msgpack'))
+    if unix_sockets_supported():
+        socket_path = os.path.join(tempfile.mkdtemp(), 'parser.sock')
+        combos.append(("unix+json", socket_path, 'json'))
+        if msgpack is not None:
+            combos.append(("unix+msgpack", socket_path, 'msgpack'))
+    else:
+        print("Unix sockets are not available here, skipping them")
+
+    payloads()
+    print(f"{SEQUENTIAL} sequential requests, then {CONCURRENT} over {CONCURRENCY} concurrent clients")
+    for name, path, codec in combos:
+        run(name, path, codec, REQUEST)
@@ -0,0 +1,95 @@
+"""Command throughput through ParserPool with 1, 2 and 4 workers, for handlers that block on I/O and for ones that burn CPU.
+
+Run with --worker it is the worker itself: the real connection handling from command_parser in front of a stand-in handler.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
+from collections import Counter
+from command_parser import CommandHandler
+from parser_link import start_parser_server
+from parser_pool import ParserPool
+
+COMMANDS = 400
+CHANNELS = 64
+CONCURRENCY = 32
+BASE_PORT = 18890
+
+
+class StandInParser:
+    handle_client = CommandHandler.handle_client
+    handle_request = CommandHandler.handle_request
+
+    def __init__(self, work):
+        self.work = work
+
+    async def handle_command(self, data):
+        if self.work == 'io':
+            # What a requests.get() in a handler does to the loop: nothing else runs for 5 ms
+            time.sleep(0.005)
+        else:
+            digest = data[2].encode()
+            for _ in range(4000):
+                digest = hashlib.sha256(digest).digest()
+        yield f"{data[1]}: done"
+
+
+async def serve_worker(port, work):
+    server = await start_parser_server(StandInParser(work).handle_client, port=port)
+    async with server:
+        await server.serve_forever()
+
+
+async def run_pool(workers, work):
+    pool = ParserPool(workers, base_port=BASE_PORT, script=os.path.abspath(__file__), script_args=['--worker', work])
+    await pool.start()
+    requests = [('bench', f"#channel{i % CHANNELS}", f".cmd {i}", 'bench!~bench@host') for i in range(COMMANDS)]
+    # Warm up so worker start up time is not counted
+    await asyncio.gather(*(consume(pool, data) for data in requests[:workers * 8]))
+
+    queue = list(requests)
+
+    async def client():
+        while queue:
+            await consume(pool, queue.pop())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    spread = Counter(pool.worker_for(data[1]) for data in requests)
+    await pool.close()
+    return COMMANDS / elapsed, spread
+
+
+async def consume(pool, data):
+    async for response in pool.request(data):
+        pass
+
+
+def main():
+    print(f"{COMMANDS} commands over {CHANNELS} channels from {CONCURRENCY} concurrent clients, {os.cpu_count()} cores")
+    for work in ('io', 'cpu'):
+        baseline = None
+        for workers in (1, 2, 4):
+            with contextlib.redirect_stdout(io.StringIO()):
+                per_second, spread = asyncio.run(run_pool(workers, work))
+            baseline = baseline or per_second
+            share = ' '.join(f"{spread[index]}" for index in range(workers))
+            print(f"{work:<4} {workers} workers {per_second:8.0f} commands/s  x{per_second / baseline:4.2f}  commands per worker: {share}")
+
+
+if __name__ == '__main__':
+    if '--worker' in sys.argv:
+        arguments = argparse.ArgumentParser()
+        arguments.add_argument('--worker')
+        arguments.add_argument('--port', type=int)
+        options = arguments.parse_args()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(serve_worker(options.port, options.worker))
+    else:
+        main()
@@ -1,18 +1,25 @@
 import json
 from datetime import datetime, timedelta
+from state_store import shared_store
+from persistence import persistence, read_json
 
 
 
 class BotPad:
     def __init__(self):
         self.paper = {}
-        self.load_from_file()
+        self.store = shared_store()
+        if not self.store:
+            self.load_from_file()
         self.reminded_users = []
         self.short_term_remind = []
         self.remind_timer = datetime.now()
         self.short_remind_timer = datetime.now()
 
-    def add_note(self, channel, user, note):
+    async def add_note(self, channel, user, content):
+        # Parse the command: .memo [hours] note
+        note = content.partition(' ')[2].strip()
+
         # Split the note to get args
         args = note.split()
         
@@ -23,25 +30,33 @@ class BotPad:
             note = ' '.join(args[1:])  # Remove the time delta from the note
 
         luser = user.lower()
-        if channel not in self.paper:
-            self.paper[channel] = {}
-
-        if luser not in self.paper[channel]:
-            self.paper[channel][luser] = []
-
-        # Check for duplicate note by comparing the note content for the user in the channel
-        for entry in self.paper[channel][luser]:
-            if entry["note"] == note:
-                return f"Duplicate note detected for {user} in {channel}: '{note}'"
-
-        # Add the note with a timestamp and optional time delta
         timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self.paper[channel][luser].append({
-            "note": note,
-            "timestamp": timestamp,
-            "time_delta_hours": time_delta_hours  # Store the time delta if it exists
-        })
-        self.save_to_file()
+        if self.store:
+            if not self.store.add_note(channel, luser, note, timestamp, time_delta_hours):
+                return f"Duplicate note detected for {user} in {channel}: '{note}'"
+            return f"Note Added"
+
+        def add(paper):
+            notes = paper.setdefault(channel, {}).setdefault(luser, [])
+
+            # Check for duplicate note by comparing the note content for the user in the channel
+            for entry in notes:
+                if entry["note"] == note:
+                    return False
+
+            # Add the note with a timestamp and optional time delta
+            notes.append({
+                "note": note,
+                "timestamp": timestamp,
+                "time_delta_hours": time_delta_hours  # Store the time delta if it exists
+            })
+            return True
+
+        updated = await self.save_to_file(add)
+        if updated is None:
+            return f"Unable to save the note for {user} right now"
+        if not updated[1]:
+            return f"Duplicate note detected for {user} in {channel}: '{note}'"
         print(self.paper)
         return f"Note Added"
 
@@ -76,43 +91,39 @@ class BotPad:
 
             luser = user.lower()
 
-            if channel in self.paper:
-                if luser in self.paper[channel]:
-                    current_time = datetime.utcnow()
+            entries = self.user_notes(channel, luser)
+            if entries:
+                current_time = datetime.utcnow()
 
-                    for entry in self.paper[channel][luser]:
-                        note_time = datetime.strptime(entry["timestamp"], "%Y-%m-%d %H:%M:%S")
-                        stored_delta = int(entry["time_delta_hours"])
-                        time_delta = current_time - note_time
-                        self.reset_reminded_users_if_needed_6hr(luser, stored_delta)
+                for entry in entries:
+                    note_time = datetime.strptime(entry["timestamp"], "%Y-%m-%d %H:%M:%S")
+                    stored_delta = int(entry["time_delta_hours"])
+                    time_delta = current_time - note_time
+                    self.reset_reminded_users_if_needed_6hr(luser, stored_delta)
 
-                        if luser not in self.short_term_remind:
-                            self.paper = {}
-                            self.load_from_file()
-                            # If user has already been reminded, use a 6-hour threshold
-                            threshold = timedelta(hours=stored_delta)
+                    if luser not in self.short_term_remind:
+                        self.refresh()
+                        # If user has already been reminded, use a 6-hour threshold
+                        threshold = timedelta(hours=stored_delta)
 
-                            if time_delta > threshold:
+                        if time_delta > threshold:
 
-                                if luser not in self.short_term_remind:
-                                    self.short_term_remind.append(luser)
+                            if luser not in self.short_term_remind:
+                                self.short_term_remind.append(luser)
 
-                                yield f"Reminder ({stored_delta}-hour rule): '{entry['note']}' | Timestamp: {entry['timestamp']} | Time Delta: {stored_delta} vs {time_delta}"
+                            yield f"Reminder ({stored_delta}-hour rule): '{entry['note']}' | Timestamp: {entry['timestamp']} | Time Delta: {stored_delta} vs {time_delta}"
 
-                        elif luser not in self.reminded_users:
-                            # If user has not been reminded
-                            threshold = timedelta(hours=stored_delta)
-                            self.paper = {}
-                            self.load_from_file()
+                    elif luser not in self.reminded_users:
+                        # If user has not been reminded
+                        threshold = timedelta(hours=stored_delta)
+                        self.refresh()
 
-                            if time_delta > threshold:
-                                if luser not in self.reminded_users:
-                                    self.reminded_users.append(luser)
-                                yield f"Note: '{entry['note']}' | Timestamp: {entry['timestamp']} | Time Delta: {stored_delta} vs {time_delta}"
-                else:
-                    print(f"User '{luser}' not found in paper for channel '{channel}'")
+                        if time_delta > threshold:
+                            if luser not in self.reminded_users:
+                                self.reminded_users.append(luser)
+                            yield f"Note: '{entry['note']}' | Timestamp: {entry['timestamp']} | Time Delta: {stored_delta} vs {time_delta}"
             else:
-                print(f"Channel '{channel}' not found in paper")
+                print(f"No notes for '{luser}' in '{channel}'")
 
         except Exception as e:
             print(f"Exception occurred: {e}")
@@ -121,22 +132,32 @@ class BotPad:
         luser = user.lower()
         entry_index = 0
         # Retrieve the notes for a user in a specific channel, and yield each note one by one
-        if channel in self.paper and luser in self.paper[channel]:
-            for entry in self.paper[channel][luser]:
+        entries = self.user_notes(channel, luser)
+        if entries:
+            for entry in entries:
                 response = f"Index:{entry_index} [{entry['timestamp']}]: {entry['note']}"
                 entry_index += 1
                 yield response
         else:
             yield "No User Found"
 
-    def save_to_file(self, filename='notes.json'):
-        # Save self.paper
-        try:
-            with open(filename, 'w') as f:
-                json.dump(self.paper, f, indent=4)
-            print(f"Data successfully saved to {filename}")
-        except Exception as e:
-            print(f"Error saving data: {e}")
+    def user_notes(self, channel, luser):
+        if self.store:
+            return self.store.notes(channel, luser)
+        return self.paper.get(channel, {}).get(luser, [])
+
+    def refresh(self):
+        # Pick up notes written by another process; the store is always current
+        if not self.store:
+            self.paper = {}
+            self.load_from_file()
+
+    async def save_to_file(self, change, filename='notes.json'):
+        # Every parser worker has its own BotPad on notes.json, so the change is made to the file as it is now, not to self.paper
+        updated = await persistence.update(filename, lambda: read_json(filename, {}), change, lambda paper: json.dumps(paper, indent=4))
+        if updated is not None:
+            self.paper = updated[0]
+        return updated
 
     def load_from_file(self, filename='notes.json'):
         # Load self.paper
@@ -149,11 +170,13 @@ class BotPad:
         except Exception as e:
             print(f"Error loading data: {e}")
 
-    def clear_user_notes(self, channel, user, index=None):
+    async def clear_user_notes(self, channel, user, content):
+        # Parse the command: .rmnote index
+        index = content.partition(' ')[2]
         luser = user.lower()
         
-        if channel in self.paper and luser in self.paper[channel]:
-            if index is None or index.strip() == '':
+        if self.user_notes(channel, luser):
+            if index.strip() == '':
                 return "Please provide a valid index number"
             else:
                 try:
@@ -161,20 +184,33 @@ class BotPad:
                 except ValueError:
                     return "Please provide a valid index number"
                 
-                # Remove specific note by index
-                notes = self.paper[channel][luser]
-                if 0 <= iindex < len(notes):
+                if self.store:
+                    removed_note = self.store.remove_note(channel, luser, iindex) if iindex >= 0 else None
+                    if removed_note is None:
+                        return "No note at the given index"
+                    return f"Note removed for {user}: '{removed_note['note']}'"
+
+                def remove(paper):
+                    # Remove specific note by index
+                    notes = paper.get(channel, {}).get(luser, [])
+                    if not 0 <= iindex < len(notes):
+                        return None
                     removed_note = notes.pop(iindex)
                     # If user has no more notes, remove the user entry
                     if not notes:
-                        del self.paper[channel][luser]
+                        del paper[channel][luser]
                         # Remove the channel entry if it's empty
-                        if not self.paper[channel]:
-                            del self.paper[channel]
-                    self.save_to_file()
-                    print(self.paper)
-                    return f"Note removed for {user}: '{removed_note['note']}'"
-                else:
+                        if not paper[channel]:
+                            del paper[channel]
+                    return removed_note
+
+                updated = await self.save_to_file(remove)
+                if updated is None:
+                    return f"Unable to remove the note for {user} right now"
+                removed_note = updated[1]
+                if removed_note is None:
                     return "No note at the given index"
+                print(self.paper)
+                return f"Note removed for {user}: '{removed_note['note']}'"
         else:
             return f"No notes found for {user}"
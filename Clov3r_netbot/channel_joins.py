@@ -0,0 +1,63 @@
+import time
+
+JOIN_PREFIX = 'JOIN '
+
+
+class ChannelJoins:
+    """Packs channels into as few JOIN lines as fit in 512 bytes and tracks which ones the server has echoed back."""
+
+    def __init__(self, limit=510):
+        # 512 bytes including the trailing CRLF
+        self.limit = limit
+        self.pending = {}
+        self.joined = {}
+        self.started = None
+
+    def lines(self, channels):
+        self.started = time.monotonic()
+        lines = []
+        batch = []
+        size = len(JOIN_PREFIX)
+        for channel in channels:
+            channel = channel.strip()
+            if not channel:
+                continue
+            self.pending[channel.lower()] = (channel, self.started)
+            cost = len(channel.encode('utf-8')) + (1 if batch else 0)
+            if batch and size + cost > self.limit:
+                lines.append(JOIN_PREFIX + ','.join(batch))
+                batch = []
+                size = len(JOIN_PREFIX)
+                cost -= 1
+            batch.append(channel)
+            size += cost
+        if batch:
+            lines.append(JOIN_PREFIX + ','.join(batch))
+        return lines
+
+    def expect(self, line):
+        # A JOIN sent at runtime (.join) is confirmed like the startup ones, so it gets its history backfilled too
+        verb, _, rest = line.partition(' ')
+        if verb.upper() != 'JOIN':
+            return
+        sent = time.monotonic()
+        for channel in rest.split(' ')[0].split(','):
+            channel = channel.strip()
+            if channel and channel != '0':
+                self.pending.setdefault(channel.lower(), (channel, sent))
+
+    def confirm(self, channel):
+        # Returns the channel the first time its JOIN echo arrives, None otherwise
+        entry = self.pending.pop(channel.lower(), None)
+        if entry is None:
+            return None
+        channel, sent = entry
+        self.joined[channel] = time.monotonic() - sent
+        if not self.pending and sent == self.started:
+            print(f"All {len(self.joined)} channels joined in {self.joined[channel]:.2f}s")
+        return channel
+
+    def reset(self):
+        self.pending.clear()
+        self.joined.clear()
+        self.started = None
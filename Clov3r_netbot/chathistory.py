@@ -0,0 +1,73 @@
+import datetime
+
+# draft/chathistory is only useful with batch; server-time gives us the real send time of each message
+HISTORY_CAPS = ['draft/chathistory', 'batch', 'server-time', 'message-tags']
+
+
+class ChatHistory:
+    """IRCv3 capability negotiation and CHATHISTORY batch tracking used to backfill last_messages."""
+
+    def __init__(self, limit=200):
+        self.limit = limit
+        self.offered = set()
+        self.requested = []
+        self.enabled = False
+        self.batches = {}
+
+    def reset(self):
+        self.offered.clear()
+        self.requested = []
+        self.enabled = False
+        self.batches.clear()
+
+    def add_offered(self, tokens):
+        # CAP * LS * :caps... is a continuation, CAP * LS :caps... ends the list
+        for cap in tokens.params[-1].split():
+            self.offered.add(cap.split('=', 1)[0])
+        return len(tokens.params) < 4 or tokens.params[2] != '*'
+
+    def wanted_caps(self):
+        self.requested = ['sasl']
+        if 'draft/chathistory' in self.offered and 'batch' in self.offered:
+            self.requested += [cap for cap in HISTORY_CAPS if cap in self.offered]
+        return self.requested
+
+    def acknowledge(self, tokens):
+        acked = {cap.lstrip('-') for cap in tokens.params[-1].split()}
+        self.enabled = 'draft/chathistory' in acked and 'batch' in acked
+        if self.enabled:
+            print("Server supports chathistory, history will be backfilled after JOIN.")
+        return acked
+
+    def request(self, channel):
+        return f"CHATHISTORY LATEST {channel} * {self.limit}"
+
+    def handle_batch(self, tokens):
+        # BATCH +ref chathistory #channel opens a batch, BATCH -ref closes it
+        reference = tokens.params[0]
+        if reference.startswith('+'):
+            if len(tokens.params) > 2 and tokens.params[1] == 'chathistory':
+                self.batches[reference[1:]] = tokens.params[2]
+                return tokens.params[2], True
+        elif reference.startswith('-'):
+            channel = self.batches.pop(reference[1:], None)
+            if channel:
+                return channel, False
+        return None, False
+
+    def batch_channel(self, tokens):
+        # The channel a PRIVMSG was replayed for, or None for live traffic
+        if not self.batches or not tokens.tags:
+            return None
+        return self.batches.get(tokens.tags.get('batch'))
+
+    @staticmethod
+    def timestamp(tokens):
+        # server-time tags look like 2024-01-01T12:00:00.000Z
+        server_time = (tokens.tags or {}).get('time')
+        if server_time:
+            try:
+                return int(datetime.datetime.fromisoformat(server_time.replace('Z', '+00:00')).timestamp())
+            except ValueError:
+                pass
+        return int(datetime.datetime.now().timestamp())
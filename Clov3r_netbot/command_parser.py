@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import json
 import datetime
@@ -7,6 +8,7 @@ import importlib
 import sys
 import random
 import types
+from collections import deque
 from sed import handle_sed_command
 from google_api import Googlesearch
 from title_scrape import Titlescraper
@@ -19,14 +21,25 @@ from mushroom_facts import MushroomFacts
 from help import help_command
 from weather import WeatherSnag
 from botpad import BotPad
+from event_loop import install_event_loop, uvloop_enabled
+from message_classifier import is_sed
+from executors import offload, executors
+from parser_link import read_frame, write_frame, start_parser_server, parser_settings
+from state_store import shared_store
+from persistence import persistence
+
+
+HISTORY_LIMIT = 200
 
 
 class CommandHandler:
     def __init__(self):
         self.command_registry = {}
+        # Kept in step with the bot by events on the parser link, so requests don't have to carry them
+        self.last_messages = {}
+        self.admin_list = []
         self.server_instance = None
         self.url_regex = re.compile(r'https?://[^\s\x00-\x1F\x7F]+')
-        self.separator_list = ['/', '_', '-', '~', '.', '|', '@', '+', '!', '`', ';', ':', '>', '<', '=', ')', '(', '*', '&', '^', '%', '#', '?', '[', ']', '{', '}','$', ',', "'", '"', '/', '\'', '\"']
         self.channels_features = {}
         self.search = Googlesearch()
         self.load_channels_features()
@@ -57,11 +70,12 @@ class CommandHandler:
         self.register_command('.weather', self.snag.get_weather)
         self.register_command('.w', self.snag.get_weather)
         self.register_command('.wx', self.snag.get_weather)
-        self.register_command('.bug', get_bug_details)
-        self.register_command('.yt', self.search.process_youtube_search)
-        self.register_command('.g', self.search.google_it)
-        self.register_command('.ddg', duck_search)
-        self.register_command('.tr', duck_translate)
+        # Blocking library calls, each run on its upstream's own thread pool
+        self.register_command('.bug', offload('gentoo', get_bug_details))
+        self.register_command('.yt', offload('youtube', self.search.process_youtube_search))
+        self.register_command('.g', offload('google', self.search.google_it))
+        self.register_command('.ddg', offload('ddg', duck_search))
+        self.register_command('.tr', offload('ddg', duck_translate))
         self.register_command('.part', self.handle_part)
         self.register_command('.join', self.handle_join)
         self.register_command('.op', self.handle_op, needs_context=True)
@@ -74,6 +88,7 @@ class CommandHandler:
         self.register_command('.remind', self.scribe.get_notes, needs_context=True)
         self.register_command('.rmnote', self.scribe.clear_user_notes, needs_context=True)
         self.register_command('.topstats', self.seen.top_stats_command, needs_context=True)
+        self.register_command('.upstreams', self.handle_upstreams, needs_context=True)
 
     def register_command(self, command, handler, needs_context=False, full_context=False):
         self.command_registry[command] = {
@@ -132,8 +147,21 @@ class CommandHandler:
             return True
         return False
 
+    def apply_event(self, event):
+        kind = event.get('event')
+        if kind == 'append':
+            self.last_messages.setdefault(event['channel'], deque(maxlen=HISTORY_LIMIT)).append(event['message'])
+        elif kind == 'history':
+            self.last_messages[event['channel']] = deque(event['messages'], maxlen=HISTORY_LIMIT)
+        elif kind == 'admins':
+            self.admin_list = event['admin_list']
+        else:
+            print(f"Unknown event from the bot: {kind}")
+
     async def handle_command(self, data):
-        sender, channel, content, hostmask, last_messages, admin_list = data
+        sender, channel, content, hostmask = data
+        last_messages = self.last_messages
+        admin_list = self.admin_list
         urls = self.url_regex.findall(content)
 
         if not content.strip():
@@ -143,14 +171,11 @@ class CommandHandler:
         response = None
         command_handled = False
 
-        # Create all possible prefixes with 's' and 'S'
-        prefixes = [f's{sep}' for sep in self.separator_list] + [f'S{sep}' for sep in self.separator_list]
-
         # Check if content starts with any of the commands
         command = content.split()[0].strip()
         args = content[len(command):].strip()
 
-        if any(content.startswith(prefix) for prefix in prefixes) and len(content) > 2:
+        if is_sed(content):
             print("sed command")
             if await self.handle_channel_features(channel, '.sed'):
                 print(f"Handling sed command from {sender} in channel {channel}.")
@@ -167,7 +192,7 @@ class CommandHandler:
                 needs_context = handler_info["needs_context"]
                 full_context = handler_info["full_context"]
 
-                if command in ['.part', '.join', '.op', '.deop', '.remod', '.addsnack'] and hostmask not in admin_list:
+                if command in ['.part', '.join', '.op', '.deop', '.remod', '.addsnack', '.upstreams'] and hostmask not in admin_list:
                     print(f"Unauthorized command attempt by {sender}.")
                 else:
                     try:
@@ -205,10 +230,20 @@ class CommandHandler:
             'snack_count': self.snack_count,
             'snack_level': self.snack_level
         }
+        store = shared_store()
+        if store:
+            store.set_value('snacks', data)
+            return
         with open('snack_data.json', 'w') as file:
             json.dump(data, file)
 
     def load_snack_data(self):
+        store = shared_store()
+        if store:
+            data = store.get_value('snacks', {'snack_count': 0, 'snack_level': 0})
+            self.snack_count = data['snack_count']
+            self.snack_level = data['snack_level']
+            return
         try:
             with open('snack_data.json', 'r') as file:
                 data = json.load(file)
@@ -271,71 +306,71 @@ class CommandHandler:
             new_channel = args.split()[0]
             return f"JOIN {new_channel}\r\n"
 
+    async def handle_upstreams(self, channel, sender, args):
+        return f"PRIVMSG {channel} :[Upstreams] {executors.report()}"
+
     async def handle_op(self, channel, sender, args):
         return f"MODE {channel} +o {sender}\r\n"
 
     async def handle_deop(self, channel, sender, args):
         return f"MODE {channel} -o {sender}\r\n"
 
-    async def sanitize_input(self, malicious_input):
-        decoded_input = html.unescape(malicious_input)
-        # Allow Unicode characters through by checking if the character is not a control character,
-        # except for the whitelisted control codes ('\x03', '\x02', '\x0F', '\x16', '\x1D', '\x1F', '\x01').
-        # This version considers characters outside the basic ASCII control characters as allowed,
-        # including extended Unicode characters.
-        safe_output = ''.join(
-            char for char in decoded_input
-            if (ord(char) > 31 and ord(char) != 127) or char in '\x03\x02\x0F\x16\x1E\x1D\x1F\x01'
-        )
-        return safe_output
-
     async def handle_client(self, reader, writer):
-        buffer = ""
+        # One long-lived connection per bot; each request runs as its own task so a slow lookup doesn't hold up the rest
+        write_lock = asyncio.Lock()
+        requests = set()
         try:
             while True:
-                data = await reader.read(2048)
-                if not data:
+                try:
+                    request, codec = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
                     break
-                buffer += data.decode('utf-8')
-
-                # Attempt to load a complete JSON object
-                while buffer:
-                    try:
-                        data, index = json.JSONDecoder().raw_decode(buffer)
-                        buffer = buffer[index:].lstrip()  # Remove processed part from buffer
-                        
-                        # Process all responses
-                        async for response in self.handle_command(data):
-                            if isinstance(response, str):
-                                # If it's a regular string response, send it directly
-                                print("Sending response:", response)
-                                writer.write(response.encode())
-                                await writer.drain()
-                            elif isinstance(response, types.GeneratorType):
-                                # If it's a generator (e.g. from get_notes), iterate through it
-                                for note in response:
-                                    print("Sending Generator response:", note)
-                                    writer.write(note.encode())
-                                    await writer.drain()
-                        
-                        # Close the connection after all responses are sent
-                        writer.close()
-                        await writer.wait_closed()
-                        print("Connection closed.")
-                        return 
-                    except json.JSONDecodeError:
-                        break
+                # Events are applied in arrival order, before any request that came after them
+                if 'event' in request:
+                    self.apply_event(request)
+                    continue
+                task = asyncio.create_task(self.handle_request(request, writer, write_lock, codec))
+                requests.add(task)
+                task.add_done_callback(requests.discard)
         except asyncio.CancelledError:
             print("Client connection cancelled.")
         finally:
+            for task in requests:
+                task.cancel()
             if not writer.is_closing():
                 writer.close()
                 await writer.wait_closed()
                 print("Connection closed.")
 
-    async def start_server(self):
-        print("Server started and listening for connections...")
-        self.server_instance = await asyncio.start_server(self.handle_client, '127.0.0.1', 8888)
+    async def handle_request(self, request, writer, write_lock, codec):
+        request_id = request.get('id')
+
+        async def reply(message):
+            async with write_lock:
+                write_frame(writer, message, codec)
+                await writer.drain()
+
+        try:
+            # Process all responses
+            async for response in self.handle_command(request['data']):
+                if isinstance(response, str):
+                    # If it's a regular string response, send it directly
+                    print("Sending response:", response)
+                    await reply({'id': request_id, 'response': response})
+                elif isinstance(response, types.GeneratorType):
+                    # If it's a generator (e.g. from get_notes), iterate through it
+                    for note in response:
+                        print("Sending Generator response:", note)
+                        await reply({'id': request_id, 'response': note})
+        except Exception as e:
+            print(f"Error handling request {request_id}: {e}")
+        finally:
+            # Tells the bot this request is finished, in place of closing the connection
+            if not writer.is_closing():
+                await reply({'id': request_id, 'done': True})
+
+    async def start_server(self, socket_path=None, port=8888):
+        self.server_instance = await start_parser_server(self.handle_client, port=port, socket_path=socket_path)
         async with self.server_instance:
             try:
                 await self.server_instance.serve_forever()
@@ -343,5 +378,18 @@ class CommandHandler:
                 print("Server cancelled.")
 
 if __name__ == '__main__':
+    # The parser does little besides socket reads and frame decoding, so it gains the most from uvloop
+    install_event_loop(uvloop_enabled())
+    socket_path, _ = parser_settings()
+    # The netbot passes these when it runs a pool of parser workers
+    arguments = argparse.ArgumentParser(description="Clov3r command parser")
+    arguments.add_argument('--port', type=int, default=8888)
+    arguments.add_argument('--socket', default=socket_path)
+    options = arguments.parse_args()
+    persistence.load_settings()
     command_handler = CommandHandler()
-    asyncio.run(command_handler.start_server())
+    try:
+        asyncio.run(command_handler.start_server(options.socket, options.port))
+    finally:
+        # Drop queued upstream calls, so exit only waits on the ones already running
+        executors.shutdown()
@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads per upstream service; a slow or hung service only ever ties up its own pool
+POOL_SIZES = {
+    'titles': 6,
+    'weather': 2,
+    'google': 2,
+    'youtube': 2,
+    'ddg': 2,
+    'reddit': 2,
+    'gentoo': 2,
+    # One thread, so writes to a file land in the order they were made
+    'disk': 1,
+}
+DEFAULT_POOL_SIZE = 2
+
+
+class CallStats:
+    __slots__ = ('calls', 'errors', 'wait_total', 'wait_max', 'run_total', 'run_max')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def add(self, wait, run, failed):
+        self.calls += 1
+        self.errors += failed
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+
+class UpstreamExecutors:
+    """A bounded thread pool per upstream for blocking library calls, timing queue wait and run time per call site."""
+
+    def __init__(self, sizes=None):
+        self.sizes = dict(POOL_SIZES, **(sizes or {}))
+        self.pools = {}
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def pool(self, upstream):
+        pool = self.pools.get(upstream)
+        if pool is None:
+            pool = ThreadPoolExecutor(self.sizes.get(upstream, DEFAULT_POOL_SIZE), thread_name_prefix=f"clov3r-{upstream}")
+            self.pools[upstream] = pool
+        return pool
+
+    async def run(self, upstream, func, *args, site=None, **kwargs):
+        site = site or f"{upstream}:{getattr(func, '__qualname__', repr(func))}"
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.record(site, started - submitted, time.perf_counter() - started, failed)
+
+        # A cancelled caller stops waiting, but the thread finishes the call and keeps its slot until then
+        return await asyncio.get_running_loop().run_in_executor(self.pool(upstream), call)
+
+    def record(self, site, wait, run, failed):
+        # Called from the pool threads
+        with self.lock:
+            stats = self.sites.get(site)
+            if stats is None:
+                stats = self.sites[site] = CallStats()
+            stats.add(wait, run, failed)
+
+    def report(self):
+        with self.lock:
+            sites = sorted(self.sites.items())
+            if not sites:
+                return "No upstream calls yet"
+            return " | ".join(
+                f"{site} {stats.calls}x wait {stats.wait_total / stats.calls * 1000:.0f}/{stats.wait_max * 1000:.0f}ms "
+                f"run {stats.run_total / stats.calls * 1000:.0f}/{stats.run_max * 1000:.0f}ms"
+                + (f" {stats.errors} errors" if stats.errors else "")
+                for site, stats in sites
+            )
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools.clear()
+
+
+# One set of pools per process, shared by every module that makes blocking calls
+executors = UpstreamExecutors()
+
+
+async def run_blocking(upstream, func, *args, site=None, **kwargs):
+    return await executors.run(upstream, func, *args, site=site, **kwargs)
+
+
+def offload(upstream, func, site=None):
+    """Wraps a blocking function as a coroutine function that runs it on the upstream's pool."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await executors.run(upstream, func, *args, site=site, **kwargs)
+    return wrapper
@@ -0,0 +1,122 @@
+"""Minimal IRC server for exercising the bots locally: CAP/SASL registration, JOIN echo and CHATHISTORY LATEST."""
+import asyncio
+import datetime
+import itertools
+import sys
+import time
+import irctokens
+
+SERVER_NAME = 'fake.ircd'
+
+
+class FakeIRCd:
+    def __init__(self, caps=('sasl', 'draft/chathistory', 'batch', 'server-time', 'message-tags')):
+        self.caps = set(caps)
+        self.history = {}
+        self.received = []
+        self.joined = {}
+        self.batch_ids = itertools.count(1)
+        # Flip off to play a half dead link that accepts lines but never answers
+        self.answer_pings = True
+        self.server = None
+
+    def seed_history(self, channel, count, sender='seed'):
+        for i in range(count):
+            self.record(channel, f"{sender}!~{sender}@fake", f"history line {i}")
+
+    def record(self, channel, source, text):
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        self.history.setdefault(channel.lower(), []).append((stamp, source, channel, text))
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        nick = '*'
+        enabled = set()
+        registered = False
+        cap_done = False
+        user_sent = False
+
+        def send(line):
+            writer.write((line + '\r\n').encode('utf-8'))
+
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode('utf-8', errors='replace').strip()
+                if not line:
+                    continue
+                self.received.append((time.monotonic(), line))
+                tokens = irctokens.tokenise(line)
+                command, params = tokens.command, tokens.params
+
+                if command == 'CAP' and params[0] == 'LS':
+                    send(f":{SERVER_NAME} CAP * LS :{' '.join(sorted(self.caps))}")
+                elif command == 'CAP' and params[0] == 'REQ':
+                    requested = params[-1].split()
+                    if all(cap in self.caps for cap in requested):
+                        enabled.update(requested)
+                        send(f":{SERVER_NAME} CAP * ACK :{' '.join(requested)}")
+                    else:
+                        send(f":{SERVER_NAME} CAP * NAK :{' '.join(requested)}")
+                elif command == 'CAP' and params[0] == 'END':
+                    cap_done = True
+                elif command == 'AUTHENTICATE':
+                    if params[0] == 'PLAIN':
+                        send("AUTHENTICATE +")
+                    else:
+                        send(f":{SERVER_NAME} 900 {nick} {nick}!~{nick}@fake {nick} :You are now logged in")
+                        send(f":{SERVER_NAME} 903 {nick} :SASL authentication successful")
+                elif command == 'NICK':
+                    nick = params[0]
+                elif command == 'USER':
+                    user_sent = True
+                elif command == 'PING' and self.answer_pings:
+                    send(f":{SERVER_NAME} PONG {SERVER_NAME} :{params[-1]}")
+                elif command == 'JOIN':
+                    for channel in params[0].split(','):
+                        self.joined[channel.lower()] = time.monotonic()
+                        send(f":{nick}!~{nick}@fake JOIN {channel}")
+                        send(f":{SERVER_NAME} 366 {nick} {channel} :End of /NAMES list.")
+                elif command == 'PING':
+                    pass
+                elif command == 'CHATHISTORY' and params[0] == 'LATEST':
+                    channel, limit = params[1], int(params[3])
+                    reference = f"hist{next(self.batch_ids)}"
+                    send(f":{SERVER_NAME} BATCH +{reference} chathistory {channel}")
+                    for stamp, source, target, text in self.history.get(channel.lower(), [])[-limit:]:
+                        send(f"@batch={reference};time={stamp} :{source} PRIVMSG {target} :{text}")
+                    send(f":{SERVER_NAME} BATCH -{reference}")
+                elif command == 'PRIVMSG':
+                    self.record(params[0], f"{nick}!~{nick}@fake", params[1])
+                elif command == 'QUIT':
+                    break
+
+                if not registered and cap_done and user_sent and nick != '*':
+                    registered = True
+                    send(f":{SERVER_NAME} 001 {nick} :Welcome to the fake network {nick}")
+                    send(f":{SERVER_NAME} 376 {nick} :End of /MOTD command.")
+
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(port):
+    ircd = FakeIRCd()
+    ircd.seed_history('#test', 50)
+    port = await ircd.start(port=port)
+    print(f"Fake ircd listening on 127.0.0.1:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(int(sys.argv[1]) if len(sys.argv) > 1 else 6667))
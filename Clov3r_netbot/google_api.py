@@ -2,8 +2,8 @@ import requests
 import json
 import os
 import hashlib
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_clients import youtube_client
 from datetime import datetime, timedelta
 
 class Googlesearch:
@@ -14,7 +14,11 @@ class Googlesearch:
         self.count_file = count_file
         self.safe_search = "active"
         self.search_count = self.load_search_count()
-        self.youtube_service = build('youtube', 'v3', developerKey=self.youtube_api_key)
+
+    @property
+    def youtube_service(self):
+        # Built on first use and shared with everything else in the process that talks to YouTube
+        return youtube_client(self.youtube_api_key)
 
     def load_search_count(self):
         """Load the search count from a file."""
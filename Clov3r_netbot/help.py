@@ -76,7 +76,7 @@ def get_detailed_help(command):
         ".memo": "Adds a memo that the bot will remind you of, .memo <number> <note> will choose the hours of which the bot will wait to remind you.",
         ".remind": "Shows all memos saved with index",
         ".rmnote": ".rmnote <index> Removes memo at the given index",
-        ".admin": ".factadd - .quit - .join - .part - .op - .deop - .remod - .reload",
+        ".admin": ".factadd - .quit - .join - .part - .op - .deop - .remod - .reload - .lag - .upstreams",
     }
 
     if command in help_dict:
@@ -0,0 +1,22 @@
+def peek_command(line):
+    """Returns (source, verb) from a raw IRC line without tokenising the parameters."""
+    start = 0
+
+    # Skip IRCv3 message tags, they are only parsed for lines we keep
+    if line.startswith('@'):
+        start = line.find(' ') + 1
+        if not start:
+            return None, ''
+
+    source = None
+    if line.startswith(':', start):
+        end = line.find(' ', start)
+        if end == -1:
+            return line[start + 1:], ''
+        source = line[start + 1:end]
+        start = end + 1
+
+    end = line.find(' ', start)
+    verb = line[start:] if end == -1 else line[start:end]
+    return source, verb.upper()
+
@@ -0,0 +1,79 @@
+import asyncio
+from collections import deque
+
+
+class IRCWriter:
+    """Owns the StreamWriter and coalesces queued lines into one write per loop tick."""
+
+    def __init__(self, writer, high_water=65536):
+        self.writer = writer
+        self.high_water = high_water
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.closed = False
+        self.has_data = asyncio.Event()
+        self.has_room = asyncio.Event()
+        self.has_room.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @property
+    def queue_depth(self):
+        # Lines waiting to be handed to the transport
+        return len(self.pending)
+
+    @property
+    def transport_buffered(self):
+        # Bytes the transport has accepted but not yet pushed to the socket
+        transport = self.writer.transport
+        if transport is None or transport.is_closing():
+            return 0
+        return transport.get_write_buffer_size()
+
+    async def write_line(self, line):
+        data = (line + '\r\n').encode('utf-8')
+
+        # Backpressure: callers wait here while a slow link works through the backlog
+        while self.pending_bytes >= self.high_water and not self.closed:
+            self.has_room.clear()
+            await self.has_room.wait()
+
+        if self.closed:
+            raise ConnectionError("IRC writer is closed")
+
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        self.idle.clear()
+        self.has_data.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.has_data.wait()
+                # Let everything else that is runnable this tick queue its lines first
+                await asyncio.sleep(0)
+                self.has_data.clear()
+
+                batch = b''.join(self.pending)
+                self.pending.clear()
+                self.pending_bytes = 0
+                self.has_room.set()
+
+                self.writer.write(batch)
+                await self.writer.drain()
+
+                if not self.pending:
+                    self.idle.set()
+        finally:
+            self.closed = True
+            self.has_room.set()
+            self.idle.set()
+
+    async def flush(self, timeout=5):
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Timed out flushing {self.queue_depth} queued lines")
+
+    def stats(self):
+        return f"queued={self.queue_depth} pending_bytes={self.pending_bytes} transport_buffered={self.transport_buffered}"
@@ -0,0 +1,57 @@
+import itertools
+import time
+from collections import deque
+
+
+class LagMonitor:
+    """Times each keepalive PING against its PONG and flags the link as stale when PONGs stop coming back."""
+
+    def __init__(self, interval=60.0, max_lag=30.0, history=20):
+        self.interval = interval
+        self.max_lag = max_lag
+        self.history = deque(maxlen=history)
+        self.pending = {}
+        self.sequence = itertools.count(1)
+        self.last_probe = None
+
+    def reset(self):
+        self.history.clear()
+        self.pending.clear()
+        self.last_probe = None
+
+    def due(self):
+        return self.last_probe is None or time.monotonic() - self.last_probe >= self.interval
+
+    def probe(self):
+        # A unique token per PING so each PONG can be matched to the probe that caused it
+        token = f"lag{next(self.sequence)}"
+        self.last_probe = time.monotonic()
+        self.pending[token] = self.last_probe
+        return f"PING :{token}"
+
+    def pong(self, tokens):
+        sent = self.pending.pop(tokens.params[-1], None)
+        if sent is None:
+            return None
+        lag = time.monotonic() - sent
+        self.history.append(lag)
+        # PONGs come back in order, so anything older than this one is never going to be answered
+        for token, stamp in list(self.pending.items()):
+            if stamp < sent:
+                del self.pending[token]
+        return lag
+
+    def current(self):
+        # An unanswered probe is at least as laggy as its age
+        waiting = time.monotonic() - min(self.pending.values()) if self.pending else 0.0
+        last = self.history[-1] if self.history else 0.0
+        return max(last, waiting)
+
+    def stale(self):
+        return self.current() > self.max_lag
+
+    def summary(self):
+        if not self.history:
+            return f"no PONG yet, current {self.current():.3f}s"
+        return (f"current {self.current():.3f}s, avg {sum(self.history) / len(self.history):.3f}s, "
+                f"min {min(self.history):.3f}s, max {max(self.history):.3f}s over {len(self.history)} probes")
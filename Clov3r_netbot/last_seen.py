@@ -1,21 +1,26 @@
 import asyncio
-import aiofiles
 import json
 import datetime
+from state_store import shared_store
+from persistence import persistence
 
 class Seenme:
     def __init__(self):
         self.last_seen = {}
-        self.load_last_seen()
+        # With a state_db configured every message is one upsert and last_seen.json is left alone
+        self.store = shared_store()
+        if not self.store:
+            self.load_last_seen()
 
     async def save_last_seen(self, filename="last_seen.json"):
-        try:
-            async with aiofiles.open(filename, "w") as file:
-                await file.write(json.dumps(self.last_seen, indent=2))
-        except Exception as e:
-            print(f"Error saving last_seen dictionary: {e}")
+        if self.store:
+            return
+        # Written behind, so a busy channel costs one write per flush rather than one per message
+        # The bot is its only writer, the parser only reads it for .seen and is at most a flush behind
+        persistence.mark(filename, lambda: json.dumps(self.last_seen, indent=2))
 
     def load_last_seen(self, filename="last_seen.json"):
+        persistence.settle(filename)
         try:
             with open(filename, "r") as file:
                 self.last_seen = json.load(file)
@@ -42,10 +47,16 @@ class Seenme:
         
         return ' '.join(parts)
         
+    def seen_entry(self, user, channel):
+        if self.store:
+            return self.store.seen(user, channel)
+        # Another process may have written the file since, so read it fresh
+        self.last_seen = {}
+        self.load_last_seen()
+        return self.last_seen.get(user, {}).get(channel)
+
     async def seen_command(self, channel, sender, content):
         try:
-            self.last_seen = {}
-            self.load_last_seen()
             # Parse the command: !seen username
             _, username = content.split(' ', 1)
 
@@ -53,9 +64,8 @@ class Seenme:
             username_lower = username.lower()
 
             # Check if the user has been seen in the specific channel
-            if username_lower in self.last_seen and channel in self.last_seen[username_lower]:
-                last_seen_info = self.last_seen[username_lower][channel]
-
+            last_seen_info = self.seen_entry(username_lower, channel)
+            if last_seen_info:
                 # Convert the timestamp to a datetime object
                 timestamp = datetime.datetime.strptime(last_seen_info['timestamp'], "%Y-%m-%d %H:%M:%S")
 
@@ -82,6 +92,10 @@ class Seenme:
         # Update or create the last_seen dictionary for the user and channel
         user = sender.lower()
 
+        if self.store:
+            self.store.record_seen(user, channel, timestamp, content)
+            return
+
         if user not in self.last_seen:
             self.last_seen[user] = {}
 
@@ -96,8 +110,6 @@ class Seenme:
 
     async def stats_command(self, channel, sender, content):
         # Extract the target user from the command
-        self.last_seen = {}
-        self.load_last_seen()
         target_user = content.split()[1].strip() if len(content.split()) > 1 else None
 
         if target_user:
@@ -105,8 +117,9 @@ class Seenme:
             target_user = target_user.lower()
 
             # Check if the target user has chat count information
-            if target_user in self.last_seen and channel in self.last_seen[target_user]:
-                chat_count = self.last_seen[target_user][channel].get('chat_count', 0)
+            last_seen_info = self.seen_entry(target_user, channel)
+            if last_seen_info:
+                chat_count = last_seen_info.get('chat_count', 0)
                 response = f"{sender}, I've seen {target_user} send {chat_count} messages"
                 return response
             else:
@@ -117,23 +130,26 @@ class Seenme:
             return response
 
     async def top_stats_command(self, channel, sender, content):
-        # Ensure last_seen is loaded
-        self.last_seen = {}
-        self.load_last_seen()
+        if self.store:
+            top_users = self.store.top_talkers(channel, 3)
+        else:
+            # Ensure last_seen is loaded
+            self.last_seen = {}
+            self.load_last_seen()
 
-        user_message_counts = []
+            user_message_counts = []
 
-        # Iterate over users and collect message counts for the given channel
-        for user, channels in self.last_seen.items():
-            if channel in channels:
-                chat_count = channels[channel].get('chat_count', 0)
-                user_message_counts.append((user, chat_count))
+            # Iterate over users and collect message counts for the given channel
+            for user, channels in self.last_seen.items():
+                if channel in channels:
+                    chat_count = channels[channel].get('chat_count', 0)
+                    user_message_counts.append((user, chat_count))
 
-        # Sort the users by message count in descending order
-        user_message_counts.sort(key=lambda x: x[1], reverse=True)
+            # Sort the users by message count in descending order
+            user_message_counts.sort(key=lambda x: x[1], reverse=True)
 
-        # Get the top 3 users (or fewer if there are less than 3)
-        top_users = user_message_counts[:3]
+            # Get the top 3 users (or fewer if there are less than 3)
+            top_users = user_message_counts[:3]
 
         # Build the response
         if top_users:
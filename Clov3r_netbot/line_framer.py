@@ -0,0 +1,44 @@
+class LineFramer:
+    """Incremental framer that turns raw socket reads into decoded IRC lines."""
+
+    def __init__(self, chunk_size=65536, max_buffer=1048576, encoding='UTF-8', errors='replace'):
+        self.chunk_size = chunk_size
+        self.max_buffer = max_buffer
+        self.encoding = encoding
+        self.errors = errors
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+
+        # Everything up to the last newline is complete, the rest waits for the next read
+        end = buffer.rfind(b'\n')
+        if end == -1:
+            if len(buffer) > self.max_buffer:
+                # A peer that never sends a newline should not be able to eat our memory
+                print(f"Dropping {len(buffer)} bytes of unterminated input")
+                buffer.clear()
+            return []
+
+        complete = bytes(buffer[:end])
+        del buffer[:end + 1]
+
+        # Split on bytes and decode each line on its own so a multibyte character
+        # straddling two reads is never cut in half
+        lines = []
+        for raw in complete.split(b'\n'):
+            raw = raw.strip()
+            if raw:
+                lines.append(raw.decode(self.encoding, errors=self.errors))
+        return lines
+
+    async def read_lines(self, reader):
+        # Returns None once the peer has closed the connection
+        data = await reader.read(self.chunk_size)
+        if not data:
+            return None
+        return self.feed(data)
+
+    def reset(self):
+        self.buffer.clear()
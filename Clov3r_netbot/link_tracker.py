@@ -1,18 +1,29 @@
 from datetime import datetime, timedelta
 import json
+from state_store import shared_store
+from persistence import persistence, read_json
 
 class TitleTracker:
     def __init__(self):
         self.last_time = datetime.now()
         self.handled_links = {}
-        self.load_from_json()
+        self.store = shared_store()
+        if not self.store:
+            self.load_from_json()
 
-    def reset_url_list(self, channel):
+    async def reset_url_list(self, channel):
         since_reset = self.time_since_reset()  # Added 'self' for method call
         if since_reset > timedelta(minutes=10):
-            self.handled_links[channel] = []
             self.last_time = datetime.now()
-            self.save_to_json()
+            if self.store:
+                self.store.reset_links(channel)
+                return True
+
+            def reset(handled_links):
+                handled_links[channel] = []
+                return True
+
+            await self.save_to_json(reset)
             return True
         return False
 
@@ -24,16 +35,34 @@ class TitleTracker:
         if channel not in self.handled_links:
             self.handled_links[channel] = []
 
-    def add_link(self, url, channel):
-        # Add the URL to the list for this channel
-        if url not in self.handled_links[channel]:
-            self.handled_links[channel].append(url)
-            self.save_to_json()
+    def handled(self, url, channel):
+        if self.store:
+            return self.store.link_handled(channel, url)
+        # get, another coroutine's save may have swapped in the file's copy since add_channel
+        return url in self.handled_links.get(channel, [])
+
+    async def add_link(self, url, channel):
+        if self.store:
+            self.store.add_link(channel, url)
+            return
+
+        def add(handled_links):
+            # Add the URL to the list for this channel
+            links = handled_links.setdefault(channel, [])
+            if url in links:
+                return False
+            links.append(url)
+            return True
+
+        if not self.handled(url, channel):
+            await self.save_to_json(add)
 
     # Save the handled links dictionary to a JSON file
-    def save_to_json(self):
-        with open('handled_links.json', 'w') as f:
-            json.dump(self.handled_links, f, indent=4)
+    async def save_to_json(self, change):
+        # Every parser worker has its own TitleTracker on the same file, so the change is made to the file as it is now
+        updated = await persistence.update('handled_links.json', lambda: read_json('handled_links.json', {}), change, lambda handled_links: json.dumps(handled_links, indent=4))
+        if updated is not None:
+            self.handled_links = updated[0]
 
     # Load the handled links dictionary from a JSON file
     def load_from_json(self):
@@ -41,6 +70,5 @@ class TitleTracker:
             with open('handled_links.json', 'r') as f:
                 self.handled_links = json.load(f)
         except FileNotFoundError:
-            # File doesn't exist, initialize as empty
-            self.handled_links = {}
-            self.save_to_json()
\ No newline at end of file
+            # File doesn't exist, initialize as empty; the first link added creates it
+            self.handled_links = {}
\ No newline at end of file
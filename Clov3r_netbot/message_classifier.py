@@ -0,0 +1,36 @@
+import re
+from sed import SED_SEPARATORS
+
+CHATTER = 0
+USER_COMMAND = 1
+ADMIN_COMMAND = 2
+SED = 3
+
+URL_REGEX = re.compile(r'https?://[^\s\x00-\x1F\x7F]+')
+
+
+def is_sed(content):
+    # s/old/new/ and friends: s or S, then a separator, then at least one more character
+    return len(content) > 2 and content[0] in 'sS' and content[1] in SED_SEPARATORS
+
+
+class MessageClassifier:
+    """Labels a PRIVMSG as user command, admin command, sed or chatter, and whether it carries a URL."""
+
+    def __init__(self, available_commands, admin_commands):
+        # Built once from the config and again on reload_config, never per message
+        self.kinds = {command.strip(): USER_COMMAND for command in available_commands if command.strip()}
+        self.kinds.update({command.strip(): ADMIN_COMMAND for command in admin_commands if command.strip()})
+
+    def classify(self, content):
+        """Returns (kind, verb, has_url)."""
+        has_url = 'http' in content and URL_REGEX.search(content) is not None
+        if not content:
+            return CHATTER, None, has_url
+        verb = content.split(None, 1)[0]
+        kind = self.kinds.get(verb)
+        if kind is not None:
+            return kind, verb, has_url
+        if is_sed(content):
+            return SED, None, has_url
+        return CHATTER, None, has_url
@@ -0,0 +1,143 @@
+import json
+import os
+from urllib.parse import quote, unquote
+
+SEGMENT_SUFFIX = '.log'
+
+
+class Segment:
+    __slots__ = ('file', 'number', 'lines')
+
+    def __init__(self, file, number, lines):
+        self.file = file
+        self.number = number
+        self.lines = lines
+
+
+class MessageLog:
+    """Channel history as an append-only log, a directory per channel of numbered segments holding one JSON message per line.
+
+    A message costs one appended line. When a segment reaches retain lines the next one is started and every segment
+    before the full one is deleted, so the last retain messages are always in the newest two."""
+
+    def __init__(self, directory, retain=200, fsync=False):
+        self.directory = directory
+        self.retain = retain
+        self.fsync = fsync
+        self.open = {}
+
+    def channel_dir(self, channel):
+        # '#' and friends are quoted so any channel name makes a valid directory name
+        return os.path.join(self.directory, quote(channel, safe=''))
+
+    def segment_path(self, path, number):
+        return os.path.join(path, f"{number:08d}{SEGMENT_SUFFIX}")
+
+    def segments(self, path):
+        try:
+            names = os.listdir(path)
+        except FileNotFoundError:
+            return []
+        stems = (name[:-len(SEGMENT_SUFFIX)] for name in names if name.endswith(SEGMENT_SUFFIX))
+        return sorted(int(stem) for stem in stems if stem.isdigit())
+
+    def create(self, path, number):
+        return Segment(open(self.segment_path(path, number), 'a', encoding='utf-8'), number, 0)
+
+    def resume(self, channel):
+        path = self.channel_dir(channel)
+        os.makedirs(path, exist_ok=True)
+        numbers = self.segments(path)
+        if not numbers:
+            return self.create(path, 1)
+        segment_path = self.segment_path(path, numbers[-1])
+        with open(segment_path, 'rb+') as file:
+            data = file.read()
+            if data and not data.endswith(b'\n'):
+                # A crash cut the last line short; drop it, or the next message would be glued onto it
+                data = data[:data.rfind(b'\n') + 1]
+                file.truncate(len(data))
+        return Segment(open(segment_path, 'a', encoding='utf-8'), numbers[-1], data.count(b'\n'))
+
+    def rotate(self, channel, segment):
+        segment.file.close()
+        path = self.channel_dir(channel)
+        # The full segment and the new one cover the retained window, anything older is compacted away
+        for number in self.segments(path):
+            if number < segment.number:
+                try:
+                    os.remove(self.segment_path(path, number))
+                except OSError as e:
+                    print(f"Error compacting history for {channel}: {e}")
+        return self.create(path, segment.number + 1)
+
+    def append(self, channel, message):
+        try:
+            segment = self.open.get(channel)
+            if segment is None:
+                segment = self.open[channel] = self.resume(channel)
+            elif segment.lines >= self.retain:
+                segment = self.open[channel] = self.rotate(channel, segment)
+            segment.file.write(json.dumps(message, separators=(',', ':')) + '\n')
+            # Out of the process straight away, so a crash of the bot loses nothing
+            segment.file.flush()
+            if self.fsync:
+                os.fsync(segment.file.fileno())
+            segment.lines += 1
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error logging message for {channel}: {e}")
+
+    def tail(self, path):
+        # Newest segment first, reading back only as far as the retained window needs
+        messages = []
+        for number in reversed(self.segments(path)):
+            with open(self.segment_path(path, number), 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+            lines = lines[-(self.retain - len(messages)):]
+            try:
+                # One decode for the lot is several times quicker than a json.loads per line
+                chunk = json.loads('[' + ','.join(lines) + ']')
+            except ValueError:
+                chunk = []
+                for line in lines:
+                    try:
+                        chunk.append(json.loads(line))
+                    except ValueError:
+                        # Cut short by a crash
+                        continue
+            messages[:0] = chunk
+            if len(messages) >= self.retain:
+                break
+        return messages[-self.retain:]
+
+    def replay(self):
+        """The last retain messages of each channel in the log."""
+        history = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return history
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                messages = self.tail(path)
+                if messages:
+                    history[unquote(name)] = messages
+        return history
+
+    def import_json(self, filename):
+        """Starts the log off from an old messages.json; does nothing once the log exists."""
+        if os.path.exists(self.directory) or not os.path.exists(filename):
+            return
+        with open(filename, 'r') as file:
+            history = json.load(file)
+        os.makedirs(self.directory, exist_ok=True)
+        for channel, messages in history.items():
+            for message in messages[-self.retain:]:
+                self.append(channel, message)
+        print(f"Imported message history for {len(history)} channels from {filename}")
+
+    def close(self):
+        for segment in self.open.values():
+            segment.file.close()
+        self.open.clear()
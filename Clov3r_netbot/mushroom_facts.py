@@ -1,6 +1,7 @@
 import asyncio
 import aiofiles
 import random
+from persistence import persistence
 
 
 class MushroomFacts:
@@ -16,16 +17,26 @@ class MushroomFacts:
         except FileNotFoundError:
             print("Mushroom facts file not found.")
 
-    def save_mushroom_facts(self):
-        with open("mushroom_facts.txt", "w") as file:
-            for fact in self.mushroom_facts:
-                file.write(f"{fact}\n")
+    @staticmethod
+    def read_mushroom_facts(filename="mushroom_facts.txt"):
+        try:
+            with open(filename, "r") as file:
+                return [line.strip() for line in file.readlines()]
+        except FileNotFoundError:
+            return []
 
-    def fact_add(self, args):
+    async def fact_add(self, args):
         new_fact = args.strip()
         if new_fact:
-            self.mushroom_facts.append(new_fact)
-            self.save_mushroom_facts()
+            def append(facts):
+                facts.append(new_fact)
+                return True
+
+            # Every parser worker has its own copy of the list, so the fact is appended to the file as it is now
+            updated = await persistence.update("mushroom_facts.txt", self.read_mushroom_facts, append, lambda facts: "".join(f"{fact}\n" for fact in facts))
+            if updated is None:
+                return "Unable to save the mushroom fact right now."
+            self.mushroom_facts = updated[0]
             response = f"New mushroom fact added: {new_fact}"
             return response
         else:
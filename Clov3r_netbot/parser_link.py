@@ -0,0 +1,210 @@
+import asyncio
+import configparser
+import itertools
+import json
+import os
+import socket
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Every frame is a codec byte and a 4 byte big-endian length, followed by that many bytes of body
+FRAME_HEADER = struct.Struct('>BI')
+MAX_FRAME = 16 * 1024 * 1024
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODEC_NAMES = {'json': CODEC_JSON, 'msgpack': CODEC_MSGPACK}
+
+
+def parser_settings(config_file='bot_config.ini'):
+    """Returns (socket_path, codec_name) for the bot to parser link; an empty socket path means TCP."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    socket_path = config.get('BotConfig', 'parser_socket', fallback='').strip()
+    codec = config.get('BotConfig', 'parser_codec', fallback='json').strip().lower()
+    return socket_path or None, codec
+
+
+def unix_sockets_supported():
+    return hasattr(socket, 'AF_UNIX') and hasattr(asyncio, 'open_unix_connection')
+
+
+def resolve_codec(name):
+    codec = CODEC_NAMES.get(name)
+    if codec is None:
+        print(f"Unknown parser codec {name!r}, using json.")
+        return CODEC_JSON
+    if codec == CODEC_MSGPACK and msgpack is None:
+        print("msgpack is not installed, using json for the command parser link.")
+        return CODEC_JSON
+    return codec
+
+
+def encode(message, codec):
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message).encode('utf-8')
+
+
+def decode(body, codec):
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ConnectionError("Received a msgpack frame but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if codec == CODEC_JSON:
+        return json.loads(body)
+    raise ConnectionError(f"Unknown frame codec {codec}")
+
+
+async def read_frame(reader):
+    """Returns (message, codec) so the parser can answer in whatever the bot spoke."""
+    header = await reader.readexactly(FRAME_HEADER.size)
+    codec, length = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ConnectionError(f"Frame of {length} bytes is over the {MAX_FRAME} byte limit")
+    return decode(await reader.readexactly(length), codec), codec
+
+
+def write_frame(writer, message, codec=CODEC_JSON):
+    body = encode(message, codec)
+    writer.write(FRAME_HEADER.pack(codec, len(body)) + body)
+
+
+async def start_parser_server(client_handler, host='127.0.0.1', port=8888, socket_path=None):
+    if socket_path and unix_sockets_supported():
+        # A socket file left behind by a crash would make the bind fail
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(client_handler, socket_path)
+        os.chmod(socket_path, 0o600)
+        print(f"Command parser listening on {socket_path}")
+        return server
+    server = await asyncio.start_server(client_handler, host, port)
+    print(f"Command parser listening on {host}:{port}")
+    return server
+
+
+class ParserLink:
+    """One long-lived connection to command_parser; requests carry an id so many can be in flight at once."""
+
+    def __init__(self, host='127.0.0.1', port=8888, timeout=30, connect_attempts=3, socket_path=None, codec='json', snapshot=None):
+        self.host = host
+        self.port = port
+        if socket_path and not unix_sockets_supported():
+            print("Unix sockets are not available here, using TCP for the command parser link.")
+            socket_path = None
+        self.socket_path = socket_path
+        self.codec = resolve_codec(codec)
+        self.snapshot = snapshot
+        self.timeout = timeout
+        self.connect_attempts = connect_attempts
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.ids = itertools.count(1)
+        self.waiting = {}
+        self.connect_lock = asyncio.Lock()
+
+    @property
+    def address(self):
+        return self.socket_path or f"{self.host}:{self.port}"
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        async with self.connect_lock:
+            if self.connected:
+                return
+            # The parser may be mid restart, give it a moment before giving up on this request
+            for attempt in range(self.connect_attempts):
+                try:
+                    if self.socket_path:
+                        self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+                    else:
+                        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                    break
+                except OSError:
+                    if attempt == self.connect_attempts - 1:
+                        raise
+                    await asyncio.sleep(0.5 * (attempt + 1))
+            if self.snapshot:
+                # A new connection may be a restarted parser, bring its copy of the bot's state up to date first
+                for event in self.snapshot():
+                    write_frame(self.writer, event, self.codec)
+                await self.writer.drain()
+            self.reader_task = asyncio.create_task(self.read_responses(self.reader))
+            print(f"Connected to command parser at {self.address}")
+
+    async def read_responses(self, reader):
+        try:
+            while True:
+                message, _ = await read_frame(reader)
+                queue = self.waiting.get(message.get('id'))
+                if queue is not None:
+                    queue.put_nowait(message)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError) as e:
+            print(f"Command parser connection lost: {e}")
+        finally:
+            # A reader left over from an older connection must not tear down the one that replaced it
+            if reader is self.reader:
+                self.drop()
+
+    def drop(self):
+        # The reader calls this itself when its connection ends, anyone else has to stop it
+        if self.reader_task is not None and self.reader_task is not asyncio.current_task():
+            self.reader_task.cancel()
+        self.reader_task = None
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+        # Wake everything still waiting so it fails now instead of at its timeout
+        for queue in self.waiting.values():
+            queue.put_nowait(None)
+
+    async def notify(self, event):
+        # Nothing to do while disconnected, the snapshot sent on the next connect carries it
+        if not self.connected:
+            return
+        try:
+            write_frame(self.writer, event, self.codec)
+            await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f"Could not send {event.get('event')} to the command parser: {e}")
+            self.drop()
+
+    async def request(self, data):
+        if not self.connected:
+            await self.connect()
+
+        request_id = next(self.ids)
+        queue = asyncio.Queue()
+        self.waiting[request_id] = queue
+        try:
+            write_frame(self.writer, {'id': request_id, 'data': data}, self.codec)
+            await self.writer.drain()
+            while True:
+                message = await asyncio.wait_for(queue.get(), self.timeout)
+                if message is None:
+                    raise ConnectionError("Command parser went away mid request")
+                if message.get('done'):
+                    return
+                yield message['response']
+        finally:
+            del self.waiting[request_id]
+
+    def stats(self):
+        return f"parser {'connected' if self.connected else 'not connected'} at {self.address}"
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+            self.reader_task = None
+        self.drop()
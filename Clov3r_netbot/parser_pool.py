@@ -0,0 +1,157 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import sys
+import time
+from parser_link import ParserLink, unix_sockets_supported
+
+PARSER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'command_parser.py')
+
+# Admin commands that change parser state have to reach every worker, not just the channel's own
+BROADCAST_COMMANDS = frozenset({'.reload', '.remod'})
+
+
+class HashRing:
+    """Consistent hash of channel names onto workers; virtual nodes keep the split even."""
+
+    def __init__(self, nodes, replicas=64):
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            for replica in range(replicas):
+                point = self.hash(f"{node}:{replica}")
+                self.points.append(point)
+                self.owners[point] = node
+        self.points.sort()
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def node_for(self, key):
+        index = bisect.bisect(self.points, self.hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+class ParserPool:
+    """Spawns and supervises command_parser worker processes; each channel always goes to the same worker."""
+
+    def __init__(self, workers=2, base_port=8888, socket_path=None, codec='json', script=PARSER_SCRIPT, script_args=(), restart_delay=1.0, max_restart_delay=60.0, snapshot=None):
+        self.workers = workers
+        self.script = script
+        self.script_args = list(script_args)
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        if socket_path and not unix_sockets_supported():
+            print("Unix sockets are not available here, parser workers will listen on TCP.")
+            socket_path = None
+        self.ring = HashRing(range(workers))
+        self.addresses = []
+        self.links = []
+        # Links retry for a while, a worker that is mid restart should make requests wait rather than fail
+        for index in range(workers):
+            worker_snapshot = self.worker_snapshot(index, snapshot) if snapshot else None
+            if socket_path:
+                worker_socket = f"{socket_path}.{index}"
+                self.addresses.append(['--socket', worker_socket])
+                link = ParserLink(socket_path=worker_socket, codec=codec, connect_attempts=10, snapshot=worker_snapshot)
+            else:
+                self.addresses.append(['--port', str(base_port + index)])
+                link = ParserLink(port=base_port + index, codec=codec, connect_attempts=10, snapshot=worker_snapshot)
+            self.links.append(link)
+        self.processes = [None] * workers
+        self.supervisors = []
+        self.restarts = [0] * workers
+        self.closing = False
+
+    async def spawn(self, index):
+        self.processes[index] = await asyncio.create_subprocess_exec(sys.executable, self.script, *self.script_args, *self.addresses[index])
+        print(f"Started command parser worker {index} (pid {self.processes[index].pid})")
+
+    async def start(self):
+        self.closing = False
+        for index in range(self.workers):
+            await self.spawn(index)
+            self.supervisors.append(asyncio.create_task(self.supervise(index)))
+
+    async def supervise(self, index):
+        delay = self.restart_delay
+        while not self.closing:
+            started = time.monotonic()
+            returncode = await self.processes[index].wait()
+            if self.closing:
+                return
+            print(f"Command parser worker {index} exited with code {returncode}, restarting in {delay:.1f}s")
+            # Waits out the dead worker's reader too, so it can't tear down the link to its replacement
+            await self.links[index].close()
+            self.restarts[index] += 1
+            # A worker that ran for a while gets a quick restart, one that keeps dying backs off
+            if time.monotonic() - started > 60:
+                delay = self.restart_delay
+            await asyncio.sleep(delay)
+            delay = min(self.max_restart_delay, delay * 2)
+            try:
+                await self.spawn(index)
+            except OSError as e:
+                print(f"Could not restart command parser worker {index}: {e}")
+
+    def worker_for(self, channel):
+        return self.ring.node_for(channel.lower())
+
+    def worker_snapshot(self, index, snapshot):
+        # Each worker only needs the history of the channels routed to it
+        return lambda: [event for event in snapshot() if 'channel' not in event or self.worker_for(event['channel']) == index]
+
+    async def notify(self, event):
+        if 'channel' in event:
+            await self.links[self.worker_for(event['channel'])].notify(event)
+        else:
+            await asyncio.gather(*(link.notify(event) for link in self.links))
+
+    async def request(self, data):
+        channel, content = data[1], data[2]
+        if content.split(' ', 1)[0] in BROADCAST_COMMANDS:
+            async for response in self.broadcast(data):
+                yield response
+            return
+        async for response in self.links[self.worker_for(channel)].request(data):
+            yield response
+
+    async def broadcast(self, data):
+        async def collect(link):
+            return [response async for response in link.request(data)]
+
+        results = await asyncio.gather(*(collect(link) for link in self.links), return_exceptions=True)
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"Command parser worker {index} failed a broadcast: {result}")
+        # Every worker answers the same thing, so the channel only needs to hear it once
+        for result in results:
+            if not isinstance(result, Exception):
+                for response in result:
+                    yield response
+                return
+
+    def stats(self):
+        alive = sum(1 for process in self.processes if process and process.returncode is None)
+        return f"{alive}/{self.workers} parser workers up, {sum(self.restarts)} restarts"
+
+    async def close(self):
+        self.closing = True
+        for task in self.supervisors:
+            task.cancel()
+        await asyncio.gather(*self.supervisors, return_exceptions=True)
+        self.supervisors = []
+        for link in self.links:
+            await link.close()
+        for process in self.processes:
+            if process and process.returncode is None:
+                process.terminate()
+        for process in self.processes:
+            if process and process.returncode is None:
+                try:
+                    await asyncio.wait_for(process.wait(), 5)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
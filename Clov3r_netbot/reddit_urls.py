@@ -4,14 +4,15 @@ import re
 import reddit_test
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+from executors import run_blocking
 
 
 async def process_reddit_url(url):
     headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:122.0) Gecko/20100101 Firefox/122.0', 'Accept-Encoding': 'identity'}
     try:
-        response = requests.get(url, headers=headers)
+        response = await run_blocking('reddit', requests.get, url, headers=headers, site='reddit.page')
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = await run_blocking('reddit', BeautifulSoup, response.text, 'html.parser', site='reddit.parse')
             title_tag = soup.find('title')
             if title_tag:
                 return f"[\x0303Reddit\x03] {title_tag.text}"
@@ -26,9 +27,9 @@ async def process_reddit_url(url):
 async def process_video_reddit_url(url):
     headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:122.0) Gecko/20100101 Firefox/122.0', 'Accept-Encoding': 'identity'}
     try:
-        response = requests.get(url, headers=headers)
+        response = await run_blocking('reddit', requests.get, url, headers=headers, site='reddit.page')
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = await run_blocking('reddit', BeautifulSoup, response.text, 'html.parser', site='reddit.parse')
             title_tag = soup.find('shreddit-title', {'title': True})
             if title_tag:
                 return f"[\x0303Reddit\x03] {title_tag['title']}"
@@ -58,9 +59,9 @@ async def parse_reddit_url(normalized_content):
                     return await process_video_reddit_url(url)
             if '/videos/' not in path:
                 if '/s/' in path:
-                    resolved_url = reddit_test.get_resolved_url(url)
+                    resolved_url = await run_blocking('reddit', reddit_test.get_resolved_url, url, site='reddit.resolve')
                     old_reddit_url = reddit_test.convert_to_old_reddit(resolved_url)
-                    title = reddit_test.fetch_title(old_reddit_url)
+                    title = await run_blocking('reddit', reddit_test.fetch_title, old_reddit_url, site='reddit.page')
                     return f"[\x0303Reddit\x03] {title}" 
                 if 'old.reddit.com' not in hostname:
                     old_reddit_url = url.replace(hostname, 'old.reddit.com')
@@ -1,12 +1,15 @@
 import datetime
 import asyncio
-import aiofiles
 import json
+from state_store import shared_store
+from persistence import persistence
 
 class ReportIn:
     def __init__(self):
         self.message_queue = {}
-        self.load_message_queue()
+        self.store = shared_store()
+        if not self.store:
+            self.load_message_queue()
 
     def load_message_queue(self, filename="message_queue.json"):
         try:
@@ -18,17 +21,24 @@ class ReportIn:
         except FileNotFoundError:
             print("Message queue file not found.")
 
-    async def save_message_queue(self, filename="message_queue.json"):
+    @staticmethod
+    def read_message_queue(filename="message_queue.json"):
         try:
-            # Convert tuple keys to strings for serialization
-            serialized_message_queue = {str(key): value for key, value in self.message_queue.items()}
-            
-            # Save the primary file
-            async with aiofiles.open(filename, "w") as file:
-                await file.write(json.dumps(serialized_message_queue, indent=2))
-        
-        except Exception as e:
-            print(f"Error saving message queue: {e}")
+            with open(filename, "r") as file:
+                serialized_message_queue = json.load(file)
+        except FileNotFoundError:
+            return {}
+        # Convert string keys back to tuples for deserialization
+        return {tuple(eval(key)): value for key, value in serialized_message_queue.items()}
+
+    async def save_message_queue(self, change, filename="message_queue.json"):
+        # Shared with Tell in every parser worker, so the change is made to the file as it is now
+        # Convert tuple keys to strings for serialization
+        updated = await persistence.update(filename, lambda: self.read_message_queue(filename), change,
+                                           lambda message_queue: json.dumps({str(key): value for key, value in message_queue.items()}, indent=2))
+        if updated is not None:
+            self.message_queue = updated[0]
+        return updated
 
     def format_timedelta(self, delta):
         days, seconds = delta.days, delta.seconds
@@ -36,14 +46,40 @@ class ReportIn:
         minutes, seconds = divmod(remainder, 60)
         return f"{days}d {hours}h {minutes}m {seconds}s"
 
+    def format_saved_message(self, sender, recipient, saved_message, timestamp):
+        # Get the current time as offset-aware
+        current_time = datetime.datetime.now(datetime.timezone.utc)
+
+        # Convert the timestamp to a datetime object and make it offset-aware
+        timestamp = timestamp.rstrip(" UTC")  # Remove ' UTC' suffix
+        message_time_naive = datetime.datetime.fromisoformat(timestamp)
+        # Make it offset-aware by specifying UTC timezone
+        message_time = message_time_naive.replace(tzinfo=datetime.timezone.utc)
+
+        # Calculate the time difference
+        time_difference = current_time - message_time
+
+        # Format the time difference as a human-readable string
+        formatted_time_difference = self.format_timedelta(time_difference)
+
+        return f"{sender}, {formatted_time_difference} ago <{recipient}> {saved_message} \r\n"
+
     async def send_saved_messages(self, sender, channel):
-        self.message_queue = {}
-        self.load_message_queue()
         # Convert the sender nickname to lowercase for case-insensitive comparison
         sender_lower = sender.lower()
 
+        if self.store:
+            # Runs on every message, an index lookup instead of rereading message_queue.json
+            for (username, recipient, saved_message, timestamp) in self.store.take_tells(channel, sender_lower):
+                yield self.format_saved_message(sender, recipient, saved_message, timestamp)
+            return
+
+        self.message_queue = {}
+        self.load_message_queue()
+
         # Iterate over keys in the message_queue and find matching recipients
-        for key, messages in list(self.message_queue.items()):
+        keys = []
+        for key in self.message_queue:
             try:
                 (saved_channel, saved_recipient) = key
             except ValueError:
@@ -55,27 +91,21 @@ class ReportIn:
 
             # Check if the lowercase nicknames match and the channels are the same
             if sender_lower == recipient_lower and channel == saved_channel:
-                # Get the current time as offset-aware
-                current_time = datetime.datetime.now(datetime.timezone.utc)
-
-                for (username, recipient, saved_message, timestamp) in messages:
-                    # Convert the timestamp to a datetime object and make it offset-aware
-                    timestamp = timestamp.rstrip(" UTC")  # Remove ' UTC' suffix
-                    message_time_naive = datetime.datetime.fromisoformat(timestamp)
-                    # Make it offset-aware by specifying UTC timezone
-                    message_time = message_time_naive.replace(tzinfo=datetime.timezone.utc)
-
-                    # Calculate the time difference
-                    time_difference = current_time - message_time
-
-                    # Format the time difference as a human-readable string
-                    formatted_time_difference = self.format_timedelta(time_difference)
+                keys.append(key)
 
-                    response = f"{sender}, {formatted_time_difference} ago <{recipient}> {saved_message} \r\n"
+        if not keys:
+            return
 
-                    # Yield the response for each message
-                    yield response
+        def take(message_queue):
+            # Delete the keys from the file as it is now; a tell the file no longer has was delivered already
+            taken = []
+            for key in keys:
+                taken.extend(message_queue.pop(key, []))
+            return taken
 
-                # Delete the key from the message_queue after processing all messages
-                del self.message_queue[key]
-                await self.save_message_queue()
+        updated = await self.save_message_queue(take)
+        if updated is None:
+            return
+        for (username, recipient, saved_message, timestamp) in updated[1]:
+            # Yield the response for each message
+            yield self.format_saved_message(sender, recipient, saved_message, timestamp)
@@ -1,6 +1,9 @@
 import re
 import asyncio
 
+# Characters that can follow s/S in a substitution, lets callers skip ordinary chatter cheaply
+SED_SEPARATORS = frozenset('/_-~.|@+!`;:><=)(*&^%#?[]{}$,\'"')
+
 async def handle_sed_command(channel, sender, content, last_messages):
     separator_list = ['/', '_', '-', '~', '.', '|', '@', '+', '!', '`', ';', ':', '>', '<', '=', ')', '(', '*', '&', '^', '%', '#', '?', '[', ']', '{', '}', '$', ',', "'", '"']
     try:
@@ -0,0 +1,267 @@
+import ast
+import configparser
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS last_seen (
+    user TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    message TEXT NOT NULL,
+    chat_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, channel)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS last_seen_by_count ON last_seen (channel, chat_count);
+CREATE TABLE IF NOT EXISTS tells (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    username TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tells_by_recipient ON tells (channel, recipient);
+CREATE TABLE IF NOT EXISTS quotes (
+    channel TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    recorded_by TEXT NOT NULL,
+    date TEXT NOT NULL,
+    lines TEXT NOT NULL,
+    PRIMARY KEY (channel, number)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    user TEXT NOT NULL,
+    note TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    time_delta_hours INTEGER NOT NULL,
+    UNIQUE (channel, user, note)
+);
+CREATE TABLE IF NOT EXISTS handled_links (
+    channel TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (channel, url)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    migrated TEXT NOT NULL
+);
+"""
+
+# The JSON files the bots kept their state in, by the name of the importer for each
+JSON_FILES = {
+    'last_seen': 'last_seen.json',
+    'message_queue': 'message_queue.json',
+    'quotes': 'quotes.json',
+    'notes': 'notes.json',
+    'handled_links': 'handled_links.json',
+    'snack_data': 'snack_data.json',
+}
+
+
+class StateStore:
+    """Bot state in one SQLite database in WAL mode: each change is an indexed write instead of a rewrite of a whole JSON file."""
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        # Autocommit, so a single statement is its own transaction and multi statement changes use transaction()
+        self.db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL can lose the last commits on power loss but never corrupts the database
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front, so another process can't slip in between a read and the write it depends on
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def close(self):
+        self.db.close()
+
+    # Last seen and message counts
+
+    def record_seen(self, user, channel, timestamp, message):
+        self.db.execute(
+            "INSERT INTO last_seen (user, channel, timestamp, message, chat_count) VALUES (?, ?, ?, ?, 1) "
+            "ON CONFLICT (user, channel) DO UPDATE SET timestamp = excluded.timestamp, message = excluded.message, chat_count = chat_count + 1",
+            (user, channel, timestamp, message))
+
+    def seen(self, user, channel):
+        row = self.db.execute("SELECT timestamp, message, chat_count FROM last_seen WHERE user = ? AND channel = ?", (user, channel)).fetchone()
+        if row is None:
+            return None
+        return {"timestamp": row[0], "message": row[1], "chat_count": row[2]}
+
+    def top_talkers(self, channel, limit=3):
+        return self.db.execute("SELECT user, chat_count FROM last_seen WHERE channel = ? ORDER BY chat_count DESC LIMIT ?", (channel, limit)).fetchall()
+
+    # .tell messages waiting for their recipient
+
+    def add_tell(self, channel, recipient, username, sender, message, timestamp):
+        self.db.execute("INSERT INTO tells (channel, recipient, username, sender, message, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                        (channel, recipient, username, sender, message, timestamp))
+
+    def take_tells(self, channel, recipient):
+        """Removes and returns the (username, sender, message, timestamp) waiting for recipient in channel, oldest first."""
+        # Checked on every message, so the common case of nothing waiting is a read that takes no write lock
+        if self.db.execute("SELECT 1 FROM tells WHERE channel = ? AND recipient = ? LIMIT 1", (channel, recipient)).fetchone() is None:
+            return []
+        rows = self.db.execute("DELETE FROM tells WHERE channel = ? AND recipient = ? RETURNING id, username, sender, message, timestamp",
+                               (channel, recipient)).fetchall()
+        return [tuple(row[1:]) for row in sorted(rows)]
+
+    def clear_tells(self):
+        self.db.execute("DELETE FROM tells")
+
+    # Quotes
+
+    def add_quote(self, channel, recorded_by, date, lines):
+        with self.transaction():
+            number = self.db.execute("SELECT COALESCE(MAX(number), 0) + 1 FROM quotes WHERE channel = ?", (channel,)).fetchone()[0]
+            self.db.execute("INSERT INTO quotes (channel, number, recorded_by, date, lines) VALUES (?, ?, ?, ?, ?)",
+                            (channel, number, recorded_by, date, json.dumps(lines)))
+        return number
+
+    def quote(self, channel, number):
+        row = self.db.execute("SELECT recorded_by, date, lines FROM quotes WHERE channel = ? AND number = ?", (channel, number)).fetchone()
+        if row is None:
+            return None
+        return {"recorded_by": row[0], "date": row[1], "quote": json.loads(row[2])}
+
+    # Notes and reminders
+
+    def notes(self, channel, user):
+        rows = self.db.execute("SELECT note, timestamp, time_delta_hours FROM notes WHERE channel = ? AND user = ? ORDER BY id", (channel, user)).fetchall()
+        return [{"note": note, "timestamp": timestamp, "time_delta_hours": delta} for note, timestamp, delta in rows]
+
+    def add_note(self, channel, user, note, timestamp, time_delta_hours):
+        """Returns False when the user already has the same note in the channel."""
+        cursor = self.db.execute("INSERT OR IGNORE INTO notes (channel, user, note, timestamp, time_delta_hours) VALUES (?, ?, ?, ?, ?)",
+                                 (channel, user, note, timestamp, time_delta_hours))
+        return cursor.rowcount == 1
+
+    def remove_note(self, channel, user, index):
+        """Removes the user's note at index, counted the way notes() lists them, and returns it or None."""
+        with self.transaction():
+            row = self.db.execute("SELECT id, note, timestamp, time_delta_hours FROM notes WHERE channel = ? AND user = ? ORDER BY id LIMIT 1 OFFSET ?",
+                                  (channel, user, index)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("DELETE FROM notes WHERE id = ?", (row[0],))
+        return {"note": row[1], "timestamp": row[2], "time_delta_hours": row[3]}
+
+    # Links already titled in a channel
+
+    def link_handled(self, channel, url):
+        return self.db.execute("SELECT 1 FROM handled_links WHERE channel = ? AND url = ?", (channel, url)).fetchone() is not None
+
+    def add_link(self, channel, url):
+        self.db.execute("INSERT OR IGNORE INTO handled_links (channel, url) VALUES (?, ?)", (channel, url))
+
+    def reset_links(self, channel):
+        self.db.execute("DELETE FROM handled_links WHERE channel = ?", (channel,))
+
+    # Small values that don't need a table of their own
+
+    def get_value(self, key, default=None):
+        row = self.db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_value(self, key, value):
+        self.db.execute("INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                        (key, json.dumps(value)))
+
+    # One shot import of the old JSON files
+
+    def migrate(self, files):
+        """Imports each existing file in files (importer name -> path) the first time the store sees it."""
+        for name, path in files.items():
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r') as file:
+                    data = json.load(file)
+                # The check is inside the transaction, so two processes starting together can't both import a file
+                with self.transaction():
+                    if self.db.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                        continue
+                    getattr(self, f"import_{name}")(data)
+                    self.db.execute("INSERT INTO migrations (name, source, migrated) VALUES (?, ?, datetime('now'))", (name, path))
+                print(f"Migrated {path} into {self.path}")
+            except Exception as e:
+                print(f"Error migrating {path}: {e}")
+
+    def import_last_seen(self, data):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO last_seen (user, channel, timestamp, message, chat_count) VALUES (?, ?, ?, ?, ?)",
+            [(user, channel, info.get('timestamp', ''), info.get('message', ''), info.get('chat_count', 0))
+             for user, channels in data.items() for channel, info in channels.items()])
+
+    def import_message_queue(self, data):
+        # Keys were written as str((channel, recipient))
+        for key, messages in data.items():
+            channel, recipient = ast.literal_eval(key)
+            for username, sender, message, timestamp in messages:
+                self.add_tell(channel, recipient, username, sender, message, timestamp)
+
+    def import_quotes(self, data):
+        for channel, quotes in data.items():
+            for number, quote in quotes.items():
+                self.db.execute("INSERT OR REPLACE INTO quotes (channel, number, recorded_by, date, lines) VALUES (?, ?, ?, ?, ?)",
+                                (channel, int(number), quote['recorded_by'], quote['date'], json.dumps(quote['quote'])))
+
+    def import_notes(self, data):
+        for channel, users in data.items():
+            for user, entries in users.items():
+                for entry in entries:
+                    self.add_note(channel, user, entry['note'], entry['timestamp'], int(entry['time_delta_hours']))
+
+    def import_handled_links(self, data):
+        self.db.executemany("INSERT OR IGNORE INTO handled_links (channel, url) VALUES (?, ?)",
+                            [(channel, url) for channel, urls in data.items() for url in urls])
+
+    def import_snack_data(self, data):
+        self.set_value('snacks', data)
+
+
+def migration_files(directory=''):
+    return {name: os.path.join(directory, filename) for name, filename in JSON_FILES.items()}
+
+
+def open_store(path, directory=''):
+    """Opens the store at path and pulls in any JSON state in directory that it hasn't imported yet."""
+    store = StateStore(path)
+    store.migrate(migration_files(directory))
+    return store
+
+
+shared = {}
+
+
+def shared_store(config_file=None):
+    """The process wide store named by state_db in the bot config, or None when the bot keeps its JSON files.
+
+    The first call opens it, so a caller with a specific config file has to come first."""
+    if 'store' not in shared:
+        config = configparser.ConfigParser()
+        config.read(config_file or 'bot_config.ini')
+        path = config.get('BotConfig', 'state_db', fallback='').strip()
+        shared['store'] = open_store(path) if path else None
+    return shared['store']
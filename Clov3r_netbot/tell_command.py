@@ -1,13 +1,16 @@
 import datetime
 import asyncio
-import aiofiles
 import json
 import re
+from state_store import shared_store
+from persistence import persistence
 
 class Tell:
     def __init__(self):
         self.message_queue = {}
-        self.load_message_queue()
+        self.store = shared_store()
+        if not self.store:
+            self.load_message_queue()
 
     def strip_irc_formatting(self, text):
         # Regular expression to match IRC color and formatting codes
@@ -15,8 +18,6 @@ class Tell:
         return irc_formatting_pattern.sub('', text)
 
     async def handle_tell_command(self, channel, sender, content):
-        self.message_queue = {}
-        self.load_message_queue()
         try:
             # Parse the command: !tell username message
             _, username, message = content.split(' ', 2)
@@ -28,40 +29,51 @@ class Tell:
             # Convert the recipient's nickname to lowercase
             username_lower = username.lower()
 
-            # Create a tuple key with the channel and recipient's lowercase nickname
-            key = (channel, username_lower)
-
-            # Check if the key exists in the message_queue
-            if key not in self.message_queue:
-                self.message_queue[key] = []
-
             # Get the current time in UTC without pytz
             utc_now = datetime.datetime.utcnow()
-
-            # Save the message for the user in the specific channel with a timestamp
             timestamp = utc_now.strftime("%Y-%m-%d %H:%M:%S UTC")
-            self.message_queue[key].append((username, sender, message, timestamp))
 
             # Notify the user that the message is saved
             response = f"{sender}, I'll tell {username} that when they return."
-            await self.save_message_queue()
+
+            if self.store:
+                self.store.add_tell(channel, username_lower, username, sender, message, timestamp)
+                return response
+
+            # Create a tuple key with the channel and recipient's lowercase nickname
+            key = (channel, username_lower)
+
+            def add(message_queue):
+                # Save the message for the user in the specific channel with a timestamp
+                message_queue.setdefault(key, []).append((username, sender, message, timestamp))
+                return True
+
+            if await self.save_message_queue(add) is None:
+                return f"{sender}, I couldn't save that message right now."
             print(self.message_queue)
             return response
         except ValueError:
             response = f"Invalid .tell command format. Use: .tell username message"
             return response
 
-    async def save_message_queue(self, filename="message_queue.json"):
+    async def save_message_queue(self, change, filename="message_queue.json"):
+        # Shared with ReportIn in the bot process and the other parser workers, so the change is made to the file as it is now
+        # Convert tuple keys to strings for serialization
+        updated = await persistence.update(filename, lambda: self.read_message_queue(filename), change,
+                                           lambda message_queue: json.dumps({str(key): value for key, value in message_queue.items()}, indent=2))
+        if updated is not None:
+            self.message_queue = updated[0]
+        return updated
+
+    @staticmethod
+    def read_message_queue(filename="message_queue.json"):
         try:
-            # Convert tuple keys to strings for serialization
-            serialized_message_queue = {str(key): value for key, value in self.message_queue.items()}
-            
-            # Save the primary file
-            async with aiofiles.open(filename, "w") as file:
-                await file.write(json.dumps(serialized_message_queue, indent=2))
-        
-        except Exception as e:
-            print(f"Error saving message queue: {e}")
+            with open(filename, "r") as file:
+                serialized_message_queue = json.load(file)
+        except FileNotFoundError:
+            return {}
+        # Convert string keys back to tuples for deserialization
+        return {tuple(eval(key)): value for key, value in serialized_message_queue.items()}
 
     def load_message_queue(self, filename="message_queue.json"):
         try:
@@ -4,7 +4,6 @@ import socket
 import re
 import requests
 import ipaddress
-import html
 import http.client
 import ssl
 import io
@@ -12,36 +11,36 @@ import os
 import magic
 import json
 from datetime import datetime, timedelta
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_clients import youtube_client
 from html import escape, unescape
 from requests.exceptions import HTTPError, Timeout, RequestException
 from urllib.parse import urlparse, urlunparse, parse_qs
 from bs4 import BeautifulSoup
+from irc_encoder import sanitize
 from PIL import Image
 from gentoo_bugs import get_bug_details
 from reddit_urls import parse_reddit_url
 from link_tracker import TitleTracker
+from executors import run_blocking
 
 
 class Titlescraper:
     def __init__(self):
         self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:122.0) Gecko/20100101 Firefox/122.0', 'Accept-Encoding': 'identity'}
         self.api_key = ""
-        self.youtube_service = build('youtube', 'v3', developerKey=self.api_key)
         self.tracker = TitleTracker()
 
+    @property
+    def youtube_service(self):
+        # Built on first use and shared with everything else in the process that talks to YouTube
+        return youtube_client(self.api_key)
+
     async def sanitize_input(self, malicious_input):
-        decoded_input = html.unescape(malicious_input)
-        # Allow Unicode characters through by checking if the character is not a control character,
-        # except for the whitelisted control codes ('\x03', '\x02', '\x0F', '\x16', '\x1D', '\x1F', '\x01').
-        # This version considers characters outside the basic ASCII control characters as allowed,
-        # including extended Unicode characters.
-        safe_output = ''.join(
-            char for char in decoded_input
-            if (ord(char) > 31 and ord(char) != 127) or char in '\x16\x03\x02\x0F\x16\x1E\x1D\x1F\x01'
-        )
-        return safe_output
+        # extract_webpage_title returns None when it gives up on a page
+        if malicious_input is None:
+            return None
+        return sanitize(malicious_input)
 
     async def extract_webpage_title(self, url, redirect_limit=25):
         REQUEST_TIMEOUT = 10
@@ -63,8 +62,7 @@ class Titlescraper:
                     else:
                         connection = http.client.HTTPSConnection(parsed_url.netloc, timeout=REQUEST_TIMEOUT)
                 
-                connection.request("GET", full_path or '/', headers=headers)  # Include the headers in the request
-                response = connection.getresponse()
+                response = await run_blocking('titles', self.open_page, connection, full_path or '/', headers, site='titles.page')
 
                 # Follow redirects if status code is 301 or 302, up to a limit
                 num_redirects = 0
@@ -77,8 +75,7 @@ class Titlescraper:
                     full_path = urlunparse(parsed_url)  # Reconstruct full URL for the new location
                     connection = http.client.HTTPConnection(parsed_url.netloc) if parsed_url.scheme == 'http' else http.client.HTTPSConnection(parsed_url.netloc)
                     # Include the headers again for the new request after redirect
-                    connection.request("GET", full_path or '/', headers=headers)
-                    response = connection.getresponse()
+                    response = await run_blocking('titles', self.open_page, connection, full_path or '/', headers, site='titles.page')
 
                 if response.status in [400, 404, 401, 405, 403]:
                     print(f"GET request failed with {response.status}")
@@ -86,7 +83,7 @@ class Titlescraper:
                     self.save_no_title(url, e)
                     return
                 elif response.status == 200:
-                    content_bytes = response.read(2048)
+                    content_bytes = await run_blocking('titles', response.read, 2048, site='titles.page')
                     content_type = magic.from_buffer(content_bytes, mime=True)
                     print(f"{content_type}")
                     
@@ -122,11 +119,11 @@ class Titlescraper:
                     elif content_type == 'application/x-iso9660-image':
                         return "ISO"
                     elif content_type.startswith('text/html'):
-                        remaining_content_bytes = response.read()
+                        remaining_content_bytes = await run_blocking('titles', response.read, site='titles.page')
                         full_content = content_bytes + remaining_content_bytes
                         
                         decoded_content = full_content.decode(charset, errors='ignore')
-                        soup = BeautifulSoup(decoded_content, 'html.parser')
+                        soup = await run_blocking('titles', BeautifulSoup, decoded_content, 'html.parser', site='titles.parse')
 
                         title_tag = soup.find('title')
                         title = title_tag.text.strip() if title_tag else None
@@ -186,6 +183,20 @@ class Titlescraper:
             finally:
                 connection.close()
 
+    def open_page(self, connection, path, headers):
+        # Connect, send and read the headers in one go, on the titles pool
+        connection.request("GET", path, headers=headers)
+        return connection.getresponse()
+
+    def write_chunks(self, response, file):
+        for chunk in response.iter_content(chunk_size=8192):
+            file.write(chunk)
+
+    def save_stream(self, url, path):
+        response = requests.get(url, stream=True)
+        with open(path, "wb") as file:
+            self.write_chunks(response, file)
+
     def format_file_size(self, size_in_bytes):
         for unit in ['B', 'KB', 'MB', 'GB']:
             if size_in_bytes < 1024.0:
@@ -200,12 +211,12 @@ class Titlescraper:
 
         self.tracker.add_channel(channel)
 
-        self.tracker.reset_url_list(channel)
+        await self.tracker.reset_url_list(channel)
 
-        if url in self.tracker.handled_links[channel]:
+        if self.tracker.handled(url, channel):
             return
 
-        self.tracker.add_link(url, channel)
+        await self.tracker.add_link(url, channel)
 
         if hostname == 'github.com':
             # Remove the fragment (#L42 part) from the URL
@@ -252,14 +263,13 @@ class Titlescraper:
             bug_number = last_part
 
         # Pass the extracted bug number/string to get_bug_details
-        response = get_bug_details(bug_number)
+        response = await run_blocking('gentoo', get_bug_details, bug_number)
         return response
 
     async def process_youtube_video(self, url):
-        loop = asyncio.get_event_loop()
         try:
             video_id = self.extract_video_id(url)
-            video_data = await loop.run_in_executor(None, self.fetch_youtube_video_data, video_id)
+            video_data = await run_blocking('youtube', self.fetch_youtube_video_data, video_id)
             return self.format_video_data(video_data)
         except Exception as e:
             print(f"Error processing YouTube video: {e}")
@@ -385,7 +395,7 @@ class Titlescraper:
             os.makedirs(pdfs_directory)
 
         # Make a HEAD request to get headers
-        head_response = requests.head(url)
+        head_response = await run_blocking('titles', requests.head, url, site='titles.pdf')
 
         # Extract the Content-Length header, which contains the file size in bytes
         pdf_size_bytes = head_response.headers.get('Content-Length')
@@ -396,14 +406,9 @@ class Titlescraper:
             formatted_size = self.format_file_size(pdf_size_bytes)
             
             try:
-                # Download the PDF content with a GET request
-                pdf_response = requests.get(url, stream=True)
-
                 # Save the PDF file to the pdfs directory
                 pdf_path = os.path.join(pdfs_directory, file_identifier)
-                with open(pdf_path, "wb") as pdf_file:
-                    for chunk in pdf_response.iter_content(chunk_size=8192):
-                        pdf_file.write(chunk)
+                await run_blocking('titles', self.save_stream, url, pdf_path, site='titles.pdf')
 
                 response = f"[\x0313PDF file\x03] {file_identifier}: {formatted_size}"
             except Exception as e:
@@ -417,7 +422,7 @@ class Titlescraper:
         site_name = url.split('/')[2]
         file_identifier = url.split('/')[-1]
         # Make a HEAD request to get headers
-        response = requests.head(url)
+        response = await run_blocking('titles', requests.head, url, site='titles.gzip')
         
         # Extract the Content-Length header, which contains the file size in bytes
         file_size_bytes = response.headers.get('Content-Length')
@@ -444,7 +449,7 @@ class Titlescraper:
             os.makedirs(video_files_directory)
 
         # Make a HEAD request to get headers
-        head_response = requests.head(url)
+        head_response = await run_blocking('titles', requests.head, url, site='titles.video')
 
         # Extract the Content-Length header, which contains the file size in bytes
         video_size_bytes = head_response.headers.get('Content-Length')
@@ -455,14 +460,9 @@ class Titlescraper:
             formatted_size = self.format_file_size(video_size_bytes)
             
             try:
-                # Download the video content with a GET request
-                video_response = requests.get(url, stream=True)
-
                 # Save the video file to the video_files directory
                 video_path = os.path.join(video_files_directory, paste_code)
-                with open(video_path, "wb") as video_file:
-                    for chunk in video_response.iter_content(chunk_size=8192):
-                        video_file.write(chunk)
+                await run_blocking('titles', self.save_stream, url, video_path, site='titles.video')
 
                 response = f"[\x0307Video file\x03] {paste_code}: {formatted_size}"
             except Exception as e:
@@ -488,12 +488,12 @@ class Titlescraper:
             os.makedirs(images_directory)
 
         try:
-            image_response = requests.get(url, headers=self.headers)
+            image_response = await run_blocking('titles', requests.get, url, headers=self.headers, site='titles.image')
             image_size_bytes = len(image_response.content)
             formatted_image_size = self.format_file_size(image_size_bytes)
 
             # Use Pillow to get image dimensions
-            image = Image.open(io.BytesIO(image_response.content))
+            image = await run_blocking('titles', Image.open, io.BytesIO(image_response.content), site='titles.image')
             width, height = image.size
             image_dimensions = f"{width}x{height}"
             
@@ -524,7 +524,7 @@ class Titlescraper:
         response = f"[\x0307Audio File\x03] {site_name} (Audio) {paste_code} - Size: unknown size"
 
         try:
-            audio_response = requests.get(url, headers=self.headers, stream=True)
+            audio_response = await run_blocking('titles', requests.get, url, headers=self.headers, stream=True, site='titles.audio')
             audio_size_bytes = int(audio_response.headers.get('Content-Length', 0))
 
             formatted_audio_size = self.format_file_size(audio_size_bytes)
@@ -532,8 +532,7 @@ class Titlescraper:
             # Save the audio file to the sounds directory
             audio_path = os.path.join(sounds_directory, paste_code)
             with open(audio_path, "wb") as audio_file:
-                for chunk in audio_response.iter_content(chunk_size=8192):
-                    audio_file.write(chunk)
+                await run_blocking('titles', self.write_chunks, audio_response, audio_file, site='titles.audio')
 
             response = f"[\x0307Audio File\x03] {paste_code} - Size: {formatted_audio_size}"
         except Exception as e:
@@ -554,7 +553,7 @@ class Titlescraper:
         response = f"[\x0313Text File\x03] {paste_code} - Size: unknown size"
 
         try:
-            text_response = requests.get(url, headers=self.headers)
+            text_response = await run_blocking('titles', requests.get, url, headers=self.headers, site='titles.text')
             text_size_bytes = len(text_response.content)
             formatted_text_size = self.format_file_size(text_size_bytes)
 
@@ -629,7 +628,7 @@ class Titlescraper:
 
         try:
             headers = self.headers
-            text_response = requests.get(url, headers=headers)
+            text_response = await run_blocking('titles', requests.get, url, headers=headers, site='titles.script')
             text_size_bytes = len(text_response.content)
             formatted_text_size = self.format_file_size(text_size_bytes)
 
@@ -1,6 +1,7 @@
 import requests
 import json
 import asyncio
+from executors import run_blocking
 
 class WeatherSnag:
     def __init__(self):
@@ -14,7 +15,7 @@ class WeatherSnag:
 
         try:
             # Make a request to retrieve the latitude and longitude for the location
-            response = requests.get(f"https://geocode.maps.co/search?q={location}&api_key={self.api_key}")
+            response = await run_blocking('weather', requests.get, f"https://geocode.maps.co/search?q={location}&api_key={self.api_key}", site='weather.geocode')
             print("Geocoding response status code:", response.status_code)
             print("Geocoding response content:", response.content)
             
@@ -50,7 +51,7 @@ class WeatherSnag:
         # Get the forecast data for the given latitude and longitude
         try:
             # Make a request to retrieve the weather forecast data
-            response = requests.get(f"https://api.met.no/weatherapi/locationforecast/2.0/compact?lat={lat}&lon={lon}", headers={"User-Agent": self.user_agent})
+            response = await run_blocking('weather', requests.get, f"https://api.met.no/weatherapi/locationforecast/2.0/compact?lat={lat}&lon={lon}", headers={"User-Agent": self.user_agent}, site='weather.forecast')
             print("Response status code:", response.status_code)
             print("Response content:", response.content)
             